@@ -101,6 +101,9 @@ fi
 echo "Creating all database tables for ecoControl..."
 python manage.py syncdb --noinput
 
+echo "Compiling the Holt Winters extension..."
+python manage.py build_holtwinters || echo "Compiling failed, the slower python version will be used"
+
 cat <<EOF
 
 ===============================================
@@ -14,6 +14,7 @@ from producers import CogenerationUnit, PeakLoadBoiler
 from storages import HeatStorage, PowerMeter
 from consumers import ThermalConsumer, ElectricalConsumer
 from server.models import Device, Configuration, DeviceConfiguration
+from server.functions import configuration_registry
 from server.settings import BASE_DIR
 
 logger = logging.getLogger('simulation')
@@ -33,6 +34,28 @@ def get_initialized_scenario():
                 devices.append(device_class(device.id, env))
     return (env, devices)
 
+def get_user_code(code=None):
+    """Returns the users code from the programming-interface.
+
+    :param code: `string` with the user-code, if ``None`` the stored user-code is read
+
+    :returns: `string` with the user-code
+    """
+    if code is None:
+        with open(os.path.join(BASE_DIR,'server','user_code.py'), "r") as code_file:
+            code = code_file.read()
+    return code
+
+
+def is_empty_user_code(code):
+    """Returns `True` if the code only consists of blank lines and comments."""
+    for line in code.split("\n"):
+        line = line.strip()
+        if line != '' and not line.startswith('#'):
+            return False
+    return True
+
+
 def get_user_function(devices, code=None):
     """Builds a method with the users code from the programming-interface.
 
@@ -42,9 +65,7 @@ def get_user_function(devices, code=None):
     :returns: callable user-function expecting a pointer to a systems list as argument
     """
     local_names = ['env', 'forecast'] + ['device_%s' % x.id for x in devices]
-    if code is None:
-        with open(os.path.join(BASE_DIR,'server','user_code.py'), "r") as code_file:
-            code = code_file.read()
+    code = get_user_code(code)
 
     lines = []
     lines.append("def user_function(%s):" %
@@ -122,4 +143,11 @@ def perform_configuration(data):
     if len(configurations) > 0:
         Configuration.objects.bulk_create(configurations)
     if len(device_configurations) > 0:
-        DeviceConfiguration.objects.bulk_create(device_configurations)
\ No newline at end of file
+        DeviceConfiguration.objects.bulk_create(device_configurations)
+
+    # bulk inserts don't send signals
+    configuration_registry.invalidate()
+
+    # imported here, because server.forecasting depends on this module
+    from server.forecasting.resultcache import invalidate_forecast_cache
+    invalidate_forecast_cache()
\ No newline at end of file
@@ -1,16 +1,25 @@
 import time
 import logging
+import math
 import calendar
 from datetime import datetime
-from threading import Thread
+from threading import Thread, Lock
+from multiprocessing import Pool, Manager
 from collections import namedtuple
 
-from server.models import Device, DeviceConfiguration, Configuration, Sensor, SensorValue
-from server.devices import get_user_function, execute_user_function
-from server.functions import get_configuration, parse_value
+from django.db import connection
+
+from server.models import Device, DeviceConfiguration, SensorLatestValue
+from server.devices import get_user_code, get_user_function, execute_user_function, is_empty_user_code
+from server.functions import get_configuration, get_devices_and_sensors, get_latest_sensor_values, parse_value, \
+    configuration_registry
 from server.helpers_thread import write_pidfile_or_fail
+from server.settings import VECTORIZED_FORECASTS, FORECAST_WORKERS, FORECAST_RESULT_TTL, ROLLING_FORECAST_TOLERANCE, \
+    COLUMNAR_MEASUREMENTS, MEASUREMENT_MMAP_DIRECTORY
 
-from server.forecasting.measurementstorage import MeasurementStorage
+from server.forecasting.measurementstorage import MeasurementStorage, ColumnarMeasurementStorage
+from server.forecasting.vectorized import VectorizedScenario, CompilationError
+from server.forecasting.resultcache import forecast_cache, get_forecast_key
 
 from server.devices.base import BaseEnvironment
 from server.forecasting.simulation.devices.producers import SimulatedCogenerationUnit, SimulatedPeakLoadBoiler
@@ -25,13 +34,74 @@ logger = logging.getLogger('simulation')
 """ Return the result of a forecast.
     For short-lived forecasts, call this. It will create a :class:`Forecast` 
     and block, until the forecast is finished. 
+    Results are cached, so a repeated forecast with the same inputs is returned immediately.
+    If `rolling` is set, the previous forecast is advanced to `initial_time` by :class:`RollingForecast`.
     For parameters see :class:`Forecast`"""
-def get_forecast(initial_time, configurations=None, code=None, forward=None):
-    forecast_object = Forecast(initial_time, configurations, code=code,
-                               forecast=True, forward=forward)
-    return forecast_object.run().get() #dont start in thread
+def get_forecast(initial_time, configurations=None, code=None, forward=None, rolling=False):
+    if configurations is None:
+        configurations = list(DeviceConfiguration.objects.all())
+    if forward is None:
+        forward = DEFAULT_FORECAST_INTERVAL
+
+    key = get_forecast_key(initial_time, configurations, get_user_code(code), forward,
+                           get_configuration('system_mode'), get_configuration('auto_optimization'))
+    result = forecast_cache.get(key)
+    if result is None:
+        if rolling:
+            result = rolling_forecast.get(initial_time, configurations, code, forward)
+        else:
+            forecast_object = Forecast(initial_time, configurations, code=code,
+                                       forecast=True, forward=forward)
+            result = forecast_object.run().get() #dont start in thread
+        forecast_cache.put(key, result)
+    return result
+
+def get_forecasts(initial_time, configurations_list, code=None, forward=None):
+    """ Return the results of several forecasts, which only differ in their configurations.
+    The database is only queried once and all variants share the same weather and demand timeline.
+    If possible, the variants are simulated side by side by the :class:`~server.forecasting.vectorized.VectorizedScenario`.
+
+    :param list configurations_list: a list of configurations (see :class:`Forecast`) per variant
+    :returns: a list with the result of every variant in the same order
+    """
+    if len(configurations_list) == 0:
+        return []
+
+    initial_state = get_initial_state()
+    forecasts = [Forecast(initial_time, configurations, code=code, forward=forward,
+                          initial_state=initial_state) for configurations in configurations_list]
+
+    if Forecast.run_batch(forecasts):
+        for forecast in forecasts:
+            forecast.store_result()
+    else:
+        for forecast in forecasts:
+            forecast.run()
+
+    return [forecast.get() for forecast in forecasts]
+
+def get_initial_state():
+    """ load the devices and the latest |SensorValue| of every sensor from the database.
+    The state can be passed to :func:`get_initialized_scenario` to initialize several scenarios at once.
+    The latest values of all sensors are fetched with a single query, the device and sensor metadata is cached.
+
+    :returns: a tuple of the |Device| list and a `dict` with the (|Sensor|, value) tuples per device id
+    """
+    devices, sensors = get_devices_and_sensors()
+    latest_values = get_latest_sensor_values()
+
+    sensor_values = dict((device.id, []) for device in devices)
+    for sensor in sensors:
+        if sensor.id in latest_values:
+            sensor_values.setdefault(sensor.device_id, []).append((sensor, latest_values[sensor.id]))
+        else:
+            logger.warning("Simulation: No sensor values \
+                found for sensor '%s' at device '%s'"
+                           % (sensor.name, sensor.device.name))
 
-def get_initialized_scenario(env, configurations):
+    return (devices, sensor_values)
+
+def get_initialized_scenario(env, configurations, initial_state=None):
         """ this function returns an initialized scenario. 
         It creates new simulated devices and connects the right devices.
 
@@ -41,10 +111,15 @@ def get_initialized_scenario(env, configurations):
         :param env: |env| for all Devices
         :param list configurations: the device configurations, which to set in the devices. 
             These are typically |DeviceConfiguration| objects.
+        :param tuple initial_state: devices and sensor values as returned by :func:`get_initial_state`.
+            If ``None``, they are loaded from the database.
 
         :returns: a :py:class:`namedtuple` of devices, with the acronym (f.e plb), as key
         """
-        devices = list(Device.objects.all())
+        if initial_state is None:
+            initial_state = get_initial_state()
+        devices, sensor_values = initial_state
+
         device_list = []
         for device in devices:
             for device_type, class_name in Device.DEVICE_TYPES:
@@ -69,25 +144,14 @@ def get_initialized_scenario(env, configurations):
                         device.config[configuration.key] = value
 
             # load latest sensor values
-            try:
-                for sensor in Sensor.objects.filter(device_id=device.id):
-                    value = SensorValue.objects.filter(
-                        sensor=sensor).latest('timestamp').value
-                    if sensor.setter != '':
-                        callback = getattr(device, sensor.setter, None)
-                        if callback is not None:
-                            if hasattr(callback, '__call__'):
-                                callback(value)
-                            else:
-                                setattr(device, sensor.setter, value)
-
-            except SensorValue.DoesNotExist:
-                logger.warning("Simulation: No sensor values \
-                    found for sensor '%s' at device '%s'"
-                               % (sensor.name, sensor.device.name))
-            except Sensor.DoesNotExist:
-                logger.warning(
-                    'Could not find any sensor values to configure simulation')
+            for sensor, value in sensor_values.get(device.id, []):
+                if sensor.setter != '':
+                    callback = getattr(device, sensor.setter, None)
+                    if callback is not None:
+                        if hasattr(callback, '__call__'):
+                            callback(value)
+                        else:
+                            setattr(device, sensor.setter, value)
 
             # re-calculate values
             device.calculate()
@@ -97,42 +161,234 @@ def get_initialized_scenario(env, configurations):
         return device_tuple
 
 
-class ForecastQueue():
+class RollingForecast(object):
+    """ Keeps the devices and measurements of the last forecast as checkpoint.
+    When the initial time of the next forecast moved forward by a few steps,
+    only the newly exposed tail of the forecast interval is simulated (see :meth:`Forecast.advance`).
+
+    The checkpoint is only used if the inputs of the forecast didn't change and
+    the latest |SensorValue| of every sensor is close to the value forecasted for this time.
+    Otherwise a complete forecast is computed.
+
+    :param float tolerance: allowed relative deviation between forecasted and measured values
+    """
+
+    def __init__(self, tolerance=None):
+        self.tolerance = tolerance if tolerance is not None else ROLLING_FORECAST_TOLERANCE
+        self.forecast = None
+        self.key = None
+        self.lock = Lock()
+
+    def get(self, initial_time, configurations, code, forward):
+        """ return the result of a forecast starting at `initial_time`.
+        For parameters see :class:`Forecast`"""
+        key = get_forecast_key(0, configurations, get_user_code(code), forward,
+                               get_configuration('system_mode'), get_configuration('auto_optimization'))
+        with self.lock:
+            forecast = self.forecast
+            if forecast is not None and self.key == key and forecast.can_advance(initial_time) \
+                    and self.reconcile(forecast, initial_time):
+                logger.debug("RollingForecast: advancing checkpoint to %s" % initial_time)
+                forecast.advance(initial_time)
+            else:
+                forecast = Forecast(initial_time, configurations, code=code,
+                                    forecast=True, forward=forward)
+                forecast.run()
+            self.forecast = forecast
+            self.key = key
+            return forecast.get()
+
+    def reconcile(self, forecast, initial_time):
+        """ ``Internal Method`` compare the latest |SensorValue|'s with the values forecasted for `initial_time`.
+
+        :returns: `True` if all deviations are within the tolerance,
+            `False` if a sensor deviates or no sensor could be compared
+        """
+        index = forecast.get_step_index(initial_time) - 1
+        if index < 0:
+            return True
+
+        devices, sensor_values = get_initial_state()
+        compared = 0
+        for device_id in sensor_values:
+            for sensor, value in sensor_values[device_id]:
+                if sensor.setter == '':
+                    continue
+                forecasted = forecast.measurements.get_value_at(sensor, index)
+                if forecasted is None:
+                    continue
+                if abs(forecasted - float(value)) > self.tolerance * max(1.0, abs(float(value))):
+                    logger.debug("RollingForecast: sensor %s deviates from checkpoint" % sensor.id)
+                    return False
+                compared += 1
+        if compared == 0:
+            logger.debug("RollingForecast: no measurements to compare with the checkpoint")
+            return False
+        return True
+
+
+rolling_forecast = RollingForecast()
+
+
+class ForecastCancelled(Exception):
+    """Raised inside a forecast, which was cancelled with :meth:`ForecastQueue.cancel`"""
+    pass
+
+
+def run_queued_forecast(forecast_id, initial_time, kwargs, progress, cancelled):
+    """ ``Internal Method`` runs a forecast in a worker process of the :class:`ForecastQueue`.
+    The progress is reported to and cancellations are read from the shared `dict` objects.
+    The configurations are reloaded first, changes in the web process don't reach the forked registry.
+
+    :returns: the result of the :class:`Forecast` or ``None`` if it was cancelled
+    """
+    if forecast_id in cancelled:
+        return None
+
+    configuration_registry.invalidate()
+    forecast = Forecast(initial_time, **kwargs)
+
+    def report_progress(value):
+        progress[forecast_id] = value
+        if forecast_id in cancelled:
+            raise ForecastCancelled()
+
+    forecast.progress_callback = report_progress
+    try:
+        return forecast.run().get()
+    except ForecastCancelled:
+        return None
+    except Exception as e:
+        logger.error("ForecastQueue: forecast %s failed: %s" % (forecast_id, e))
+        return None
+
+
+class ForecastQueue(object):
     """ A container, holding the running forecasts. Each forecast gets an id.
+    The forecasts are computed by a pool of worker processes, so at most `processes` forecasts run at once.
+    Finished results, which are not fetched within `ttl` seconds, are dropped.
+    Call :meth:`start_pool` at startup, before any threads are started, as it forks the worker processes.
 
     Usage::
 
         q = ForecastQueue()
         f_id = q.schedule_new(initial_time=time.time())
         #... do other stuff, then retrieve forecast
+        progress = q.get_progress(f_id)
         result = q.get_by_id(f_id)
 
+    :param int processes: number of worker processes, uses `FORECAST_WORKERS` if ``None``
+    :param int ttl: seconds to keep finished results, uses `FORECAST_RESULT_TTL` if ``None``
     """
-    forecasts = []
-    id = 0
+
+    def __init__(self, processes=None, ttl=None):
+        self.processes = processes if processes is not None else FORECAST_WORKERS
+        self.ttl = ttl if ttl is not None else FORECAST_RESULT_TTL
+        self.id = 0
+        self.jobs = {}
+        self.lock = Lock()
+
+        self.pool = None
+        self.manager = None
+        self.progress = None
+        self.cancelled = None
+
+    def start_pool(self):
+        """ start the worker processes, if not already running.
+        :meth:`schedule_new` starts them on the first call, if this wasn't called before."""
+        if self.pool is None:
+            # forked processes must not share the database connection
+            connection.close()
+            self.manager = Manager()
+            self.progress = self.manager.dict()
+            self.cancelled = self.manager.dict()
+            self.pool = Pool(self.processes)
 
     def schedule_new(self, initial_time, **kwargs):
         """ start a new forecast and return its id.
         :param dict kwargs: the parameters for the :class:`Forecast`
         """
-        self.id += 1
-        forecast = Forecast(initial_time, **kwargs)
-        self.forecasts.append((self.id,forecast))
-        forecast.start()
-        return self.id
+        with self.lock:
+            self.start_pool()
+            self.evict_expired()
+            self.id += 1
+            self.progress[self.id] = 0.0
+            result = self.pool.apply_async(run_queued_forecast,
+                (self.id, initial_time, kwargs, self.progress, self.cancelled),
+                callback=lambda value, forecast_id=self.id: self.set_finished(forecast_id))
+            self.jobs[self.id] = {'result': result, 'finished': None, 'cancelled': False}
+            return self.id
+
+    def set_finished(self, forecast_id):
+        """ ``Internal Method`` called by the pool, when the worker of a forecast is done"""
+        with self.lock:
+            job = self.jobs.get(forecast_id)
+            if job is not None:
+                job['finished'] = time.time()
 
     def get_by_id(self, forecast_id):
         """ get a forecast by its id. 
-        Will return ``None``, if forecast is not completed.
+        Will return ``None``, if forecast is not completed, failed, cancelled or expired.
         If the forecast is finished, the result is returned and deleted 
         from the ForecastQueue.
         """
-        for index, (_id, forecast) in enumerate(self.forecasts):
-            if _id == forecast_id:
-                result = forecast.get()
-                if result != None:
-                    del self.forecasts[index]
-                return result
+        with self.lock:
+            self.evict_expired()
+            job = self.jobs.get(forecast_id)
+            if job is None or job['cancelled'] or not job['result'].ready():
+                return None
+            self.remove(forecast_id)
+
+        try:
+            return job['result'].get()
+        except Exception as e:
+            logger.error("ForecastQueue: forecast %s failed: %s" % (forecast_id, e))
+            return None
+
+    def get_progress(self, forecast_id):
+        """ get the progress of a forecast in percent.
+        Will return ``None``, if there is no such forecast."""
+        with self.lock:
+            job = self.jobs.get(forecast_id)
+            if job is None or job['cancelled']:
+                return None
+            if job['result'].ready():
+                return 100.0
+            return self.progress.get(forecast_id, 0.0)
+
+    def cancel(self, forecast_id):
+        """ cancel a forecast. Waiting forecasts won't be started, running forecasts stop at their next progress report.
+
+        :returns: `True` if the forecast was found
+        """
+        with self.lock:
+            job = self.jobs.get(forecast_id)
+            if job is None or job['cancelled']:
+                return False
+            if job['result'].ready():
+                self.remove(forecast_id)
+            else:
+                job['cancelled'] = True
+                self.cancelled[forecast_id] = True
+            return True
+
+    def evict_expired(self):
+        """ ``Internal Method`` drop finished results, which were not fetched within `ttl` seconds.
+        Cancelled forecasts are dropped as soon as their worker is done."""
+        now = time.time()
+        for forecast_id, job in self.jobs.items():
+            if job['finished'] is not None:
+                if job['cancelled']:
+                    self.remove(forecast_id)
+                elif now - job['finished'] > self.ttl:
+                    logger.warning("ForecastQueue: dropped unfetched result of forecast %s" % forecast_id)
+                    self.remove(forecast_id)
+
+    def remove(self, forecast_id):
+        """ ``Internal Method`` forget a job"""
+        del self.jobs[forecast_id]
+        self.progress.pop(forecast_id, None)
+        self.cancelled.pop(forecast_id, None)
 
 
 class Forecast(Thread):
@@ -158,11 +414,12 @@ class Forecast(Thread):
     :param code: code to be executed
     :param int forward: Time to forecast. Uses `DEFAULT_FORECAST_INTERVAL` if ``None``
     :param boolean forecast: Passed to |env| forecast.
+    :param tuple initial_state: Passed to :func:`get_initialized_scenario`
     """
-    def __init__(self, initial_time, configurations=None, code=None, forward=None, forecast=True):
+    def __init__(self, initial_time, configurations=None, code=None, forward=None, forecast=True, initial_state=None):
         Thread.__init__(self)
         self.daemon = True
-        demomode = Configuration.objects.get(key='system_mode').value == "demo"
+        demomode = get_configuration('system_mode') == "demo"
 
         self.env = BaseEnvironment(initial_time=initial_time, forecast=forecast,
                               step_size=DEFAULT_FORECAST_STEP_SIZE,demomode=demomode) #get_forecast
@@ -170,17 +427,25 @@ class Forecast(Thread):
         if configurations is None:
             configurations = DeviceConfiguration.objects.all()
 
-        self.devices = get_initialized_scenario(self.env, configurations)
+        self.devices = get_initialized_scenario(self.env, configurations, initial_state)
 
-        self.measurements = MeasurementStorage(self.env, self.devices)
-        self.user_function = get_user_function(self.devices, code)
-        self.progress = 0.0
-        self.result = None
         self.forward = forward
-
         if forward == None:
             self.forward = DEFAULT_FORECAST_INTERVAL
 
+        if COLUMNAR_MEASUREMENTS and not self.env.is_demo_simulation():
+            steps = int(math.ceil(self.forward / self.env.step_size))
+            self.measurements = ColumnarMeasurementStorage(self.env, self.devices, steps,
+                                                           directory=MEASUREMENT_MMAP_DIRECTORY)
+        else:
+            self.measurements = MeasurementStorage(self.env, self.devices)
+        self.code = get_user_code(code)
+        self.user_function = get_user_function(self.devices, self.code)
+        self.progress = 0.0
+        #: called with the progress in percent, whenever it changes by at least one percent
+        self.progress_callback = None
+        self.result = None
+
         self.next_optimization = 0.0
         self.use_optimization = get_configuration('auto_optimization')
 
@@ -206,22 +471,127 @@ class Forecast(Thread):
 
     def run(self):
         """ run the main loop. Returns self after finishing.
-        Results are obtained with :meth:`get`"""
-        time_remaining = self.forward
-        while time_remaining > 0:
-            self.step()
+        Results are obtained with :meth:`get`
+
+        If possible, the devices are advanced by the :class:`~server.forecasting.vectorized.VectorizedScenario`,
+        otherwise every device is stepped with :meth:`step`."""
+        if not self.run_vectorized():
+            time_remaining = self.forward
+            while time_remaining > 0:
+                self.step()
+
+                self.report_progress((1.0 - time_remaining/float(self.forward)) * 100)
+                time_remaining -= self.env.step_size
+
+        self.store_result()
+        return self
 
-            self.progress = (1.0 - time_remaining/float(self.forward)) * 100
-            time_remaining -= self.env.step_size
+    def get_step_index(self, timestamp):
+        """ return the number of steps between the initial time and `timestamp`
+        or ``None`` if `timestamp` is not aligned to the step size"""
+        steps = (timestamp - self.env.initial_date) / float(self.env.step_size)
+        if steps != int(steps):
+            return None
+        return int(steps)
+
+    def can_advance(self, initial_time):
+        """ return if the finished forecast can be moved to start at `initial_time` (see :meth:`advance`)"""
+        steps = self.get_step_index(initial_time)
+        return self.result is not None and steps is not None and \
+            0 <= steps < int(math.ceil(self.forward / self.env.step_size))
+
+    def advance(self, initial_time):
+        """ move the start of a finished forecast to `initial_time`.
+        The devices continue from their final state, so only the newly exposed steps at the end
+        of the forecast interval are simulated. The values before `initial_time` are dropped.
+        Check :meth:`can_advance` first. Returns self after finishing.
+        """
+        steps = self.get_step_index(initial_time)
+        if steps > 0:
+            forward = self.forward
+            self.measurements.drop_first(steps)
+            self.env.initial_date = initial_time
+            self.forward = steps * self.env.step_size
+            try:
+                if not self.run_vectorized():
+                    for step in range(steps):
+                        self.step()
+            finally:
+                self.forward = forward
+        self.store_result()
+        return self
+
+    def report_progress(self, progress):
+        """ set the progress in percent and notify the `progress_callback`"""
+        last_progress = self.progress
+        self.progress = progress
+        if self.progress_callback is not None and int(progress) != int(last_progress):
+            self.progress_callback(progress)
 
+    def store_result(self):
+        """ store the cached measurements as result, see :meth:`get`"""
         self.result =  {
             'start': datetime.fromtimestamp(self.env.initial_date).isoformat(),
+            'start_timestamp': self.env.initial_date,
             'step': DEFAULT_FORECAST_STEP_SIZE,
             'end': datetime.fromtimestamp(self.env.now).isoformat(),
             'sensors': self.measurements.get_cached()
         }
 
-        return self
+    def run_vectorized(self):
+        """ advance all devices with the :class:`~server.forecasting.vectorized.VectorizedScenario`.
+        This is only possible without user code and auto optimization, because they need the device objects in every step.
+
+        :returns: `True` if the forecast was computed, `False` if :meth:`step` has to be used
+        """
+        return Forecast.run_batch([self])
+
+    @staticmethod
+    def run_batch(forecasts):
+        """ advance the devices of several forecasts side by side with one :class:`~server.forecasting.vectorized.VectorizedScenario`.
+        All forecasts need the same initial time, step size, forward time and sensors, only the configurations may differ.
+        Afterwards the results can be stored with :meth:`store_result`.
+
+        :param list forecasts: :class:`Forecast` objects, which are not started yet
+        :returns: `True` if the forecasts were computed, `False` if every forecast has to be run on its own
+        """
+        if len(forecasts) == 0:
+            return False
+
+        first = forecasts[0]
+        for forecast in forecasts:
+            if not VECTORIZED_FORECASTS or forecast.use_optimization or not is_empty_user_code(forecast.code):
+                return False
+            if forecast.env.now != first.env.now or forecast.env.step_size != first.env.step_size or \
+                    forecast.forward != first.forward or \
+                    forecast.measurements.sensors_in_diagram != first.measurements.sensors_in_diagram:
+                return False
+
+        try:
+            engine = VectorizedScenario([forecast.devices for forecast in forecasts], first.env)
+        except CompilationError as e:
+            logger.info("Forecast: falling back to device stepping (%s)" % e)
+            return False
+
+        steps = int(math.ceil(first.forward / first.env.step_size))
+        sensors = [(device.acronym, sensor.key) for (sensor, device) in first.measurements.device_map]
+
+        def update_progress(progress):
+            for forecast in forecasts:
+                forecast.report_progress(progress)
+
+        try:
+            records = engine.run(steps, sensors, progress=update_progress)
+        except CompilationError as e:
+            logger.info("Forecast: falling back to device stepping (%s)" % e)
+            return False
+
+        engine.write_back()
+        for forecast, forecast_records in zip(forecasts, records):
+            forecast.env.now = first.env.now
+            forecast.measurements.cache_records(forecast_records)
+            forecast.next_optimization -= steps * first.env.step_size
+        return True
 
     def store_values(self):
         """ sample device values"""
@@ -234,6 +604,7 @@ class Forecast(Thread):
         outputs a dict with::
 
             result = {start: datetime, 
+            start_timestamp: unix timestamp of start,
                        step: stepsize, 
                         end: datetime, 
                     sensors: list with values per sensor (see MeasurementStorage)}
@@ -277,8 +648,7 @@ class DemoSimulation(Forecast):
         :returns: :class:`DemoSimulation` or ``None`` if system not in demo mode.
         """
         # Start demo simulation if in demo mode
-        system_mode = Configuration.objects.get(key='system_mode')
-        if system_mode.value != 'demo':
+        if get_configuration('system_mode') != 'demo':
             return None
 
         if cls.stored_simulation == None:
@@ -306,6 +676,8 @@ class DemoSimulation(Forecast):
             else:
                 time.sleep(1.0 / self.steps_per_second)
 
+        self.measurements.stop_writer()
+
     def store_values(self):
         """stores values in database. Overwrites parents saving method.
         Values are only stored every (simulated) minute"""
@@ -314,15 +686,16 @@ class DemoSimulation(Forecast):
         self.measurements.take_and_save()
 
     def start(self):
-        "start the simulation in a seperate thread"
+        "start the simulation in a seperate thread, the values are written to the database in another one"
         self.running = True
+        self.measurements.start_writer()
         Thread.start(self)
 
 
 def get_initial_time():
     "Return the time of the newest |SensorValue| in the database"
     try:
-        latest_value = SensorValue.objects.latest('timestamp')
+        latest_value = SensorLatestValue.objects.latest('timestamp')
         return calendar.timegm(latest_value.timestamp.timetuple())
-    except SensorValue.DoesNotExist:
+    except SensorLatestValue.DoesNotExist:
         return 1356998400  # Tuesday 1st January 2013 12:00:00
\ No newline at end of file
@@ -1,12 +1,24 @@
 from datetime import datetime
 from io import BytesIO
+from threading import Thread
+from Queue import Queue, Empty
+from time import time
 import logging
 import array
+import struct
+import calendar
+import tempfile
+
+import numpy as np
 
 from django.utils.timezone import utc
-from django.db import connection
+from django.db import connection, transaction
 
 from server.models import Sensor, DeviceConfiguration
+from server.functions import get_devices_and_sensors, update_latest_sensor_values, live_snapshot
+from server.forecasting.resultcache import invalidate_forecast_cache
+from server.partitions import get_partition_name, ensure_partition, forget_partitions, is_missing_partition
+from server.settings import SENSOR_VALUE_BATCH_SIZE, SENSOR_VALUE_FLUSH_INTERVAL, SENSOR_VALUE_QUEUE_SIZE
 
 logger = logging.getLogger('simulation')
 
@@ -21,12 +33,13 @@ class MeasurementStorage():
     def __init__(self, env, devices):
         self.env = env
         self.devices = devices
-        self.sensors = list(Sensor.objects.filter(
-            device_id__in=[x.id for x in self.devices]))
-        self.sensors_in_diagram = list(Sensor.objects.filter(
-            device_id__in=[x.id for x in self.devices], in_diagram=True))
+        device_ids = [x.id for x in self.devices]
+        sensors = get_devices_and_sensors()[1]
+        self.sensors = [sensor for sensor in sensors if sensor.device_id in device_ids]
+        self.sensors_in_diagram = [sensor for sensor in self.sensors if sensor.in_diagram]
 
         self.device_map = []
+        self.writer = None
         if env.is_demo_simulation():
             # initialize for demo
             self.sensor_values = []
@@ -49,12 +62,12 @@ class MeasurementStorage():
     def take_and_save(self):
         """ saves the sensor values in the database. 
 
-        Note that this function will take quite long, because of costly database inserts.
-        Sensor values will be flushed to database after a cache is full."""
-
-
+        If a writer was started with :meth:`start_writer`, the values are handed over to it and written in the background.
+        Otherwise the values are flushed to database after a cache is full,
+        which will take quite long, because of costly database inserts."""
         timestamp = datetime.utcfromtimestamp(
             self.env.now).replace(tzinfo=utc)
+        sensor_values = []
         for (sensor, device) in self.device_map:
             value = getattr(device, sensor.key, None)
             if value is not None:
@@ -62,11 +75,31 @@ class MeasurementStorage():
                 if hasattr(value, '__call__'):
                     value = value()
 
-                self.sensor_values.append((sensor.id, value, timestamp))
+                sensor_values.append((sensor.id, value, timestamp))
 
+        if self.writer is not None:
+            self.writer.put(sensor_values)
+            return
+
+        self.sensor_values += sensor_values
         if len(self.sensor_values) > 1000:
             self.flush_data()
 
+    def start_writer(self):
+        """ write the values of :meth:`take_and_save` in a background thread, see :class:`SensorValueWriter`"""
+        if self.writer is None:
+            self.writer = SensorValueWriter()
+            self.writer.start()
+            if len(self.sensor_values) > 0:
+                self.writer.put(self.sensor_values)
+                self.sensor_values = []
+
+    def stop_writer(self):
+        """ write all pending values and stop the background writer"""
+        if self.writer is not None:
+            self.writer.stop()
+            self.writer = None
+
     def take_and_cache(self):
         """ cache values in `self.forecast_data` """
         for index, (sensor, device) in enumerate(self.device_map):
@@ -78,6 +111,16 @@ class MeasurementStorage():
                 self.forecast_data[index].append(float(value))
 
 
+    def cache_records(self, records):
+        """ cache complete value series in `self.forecast_data`.
+
+        :param list records: one float32 array per entry in `self.device_map` or ``None``,
+            if the device doesn't provide values for the sensor
+        """
+        for index, values in enumerate(records):
+            if values is not None:
+                self.forecast_data[index].fromstring(values.tostring())
+
     def get_cached(self,delete_after=False):
         output = []
         for index, sensor in enumerate(self.sensors_in_diagram):
@@ -94,6 +137,21 @@ class MeasurementStorage():
                 self.forecast_data[index] = []
         return output
 
+    def get_value_at(self, sensor, index):
+        """ return the cached value of a sensor at a step index or ``None``,
+        if the sensor isn't cached or the index is out of range"""
+        if sensor not in self.sensors_in_diagram:
+            return None
+        values = self.forecast_data[self.sensors_in_diagram.index(sensor)]
+        if 0 <= index < len(values):
+            return values[index]
+        return None
+
+    def drop_first(self, count):
+        """ remove the first `count` values of every sensor in `self.forecast_data`"""
+        for values in self.forecast_data:
+            del values[:count]
+
     def get_last(self, value):
         """ return newest item in `self.forecast_data`"""
         index = self.sensors.index(value)
@@ -102,27 +160,270 @@ class MeasurementStorage():
         return None
 
     def flush_data(self):
-        """ optimized flush of `self.sensor_values` to the database. 
-        This uses binary data csv table creation and insertion. 
-        Works for postgres, compatability with other databases not tested
-        """
+        """ write all pending sensor values to the database.
+        If a background writer is running, this blocks until it has written everything queued so far."""
+        if self.writer is not None:
+            self.writer.flush()
+        else:
+            write_sensor_values(self.sensor_values)
+            self.sensor_values = []
+
+
+POSTGRES_EPOCH = calendar.timegm((2000, 1, 1, 0, 0, 0))
+"""Unix timestamp of the epoch of postgres timestamps"""
+
+
+def encode_copy_binary(sensor_values):
+    """ encode (sensor_id, value, timestamp) tuples in the binary format of postgres' ``COPY``.
+    The columns are ``sensor_id`` (int4), ``value`` (float8) and ``timestamp`` (timestamptz),
+    timestamps must be timezone aware.
+    """
+    output = BytesIO()
+    # signature, flags and header extension length
+    output.write('PGCOPY\n\xff\r\n\x00' + struct.pack('>ii', 0, 0))
+    row = struct.Struct('>hiiidiq')
+    for sensor_id, value, timestamp in sensor_values:
+        # microseconds since the postgres epoch
+        microseconds = (calendar.timegm(timestamp.utctimetuple()) - POSTGRES_EPOCH) * 1000000 + timestamp.microsecond
+        output.write(row.pack(3, 4, sensor_id, 8, value, 8, microseconds))
+    output.write(struct.pack('>h', -1))
+    output.seek(0)
+    return output
+
+
+def write_sensor_values(sensor_values):
+    """ optimized insert of (sensor_id, value, timestamp) tuples into the database.
+    This uses a binary ``COPY`` into the monthly partitions, see :mod:`server.partitions`.
+    The ids are assigned by the sequence of the table.
+    Works for postgres, compatability with other databases not tested
+    """
+    if len(sensor_values) == 0:
+        return
+
+    partitions = {}
+    for row in sensor_values:
+        partitions.setdefault(get_partition_name(row[2]), []).append(row)
+    try:
+        latest = copy_sensor_values(partitions, sensor_values)
+    except Exception as e:
+        if not is_missing_partition(e):
+            raise
+        # another process dropped a partition, which this process still knew
+        forget_partitions(partitions.keys())
+        latest = copy_sensor_values(partitions, sensor_values)
+    # only show the values to readers, when they are committed
+    live_snapshot.update(latest)
+
+    # the latest sensor values changed, so cached forecasts are outdated
+    invalidate_forecast_cache()
+
+
+def copy_sensor_values(partitions, sensor_values):
+    """ ``Internal Method`` of :func:`write_sensor_values`, copies the values into their partitions
+    and updates the latest sensor values in one transaction.
+
+    :param dict partitions: the lists of (sensor_id, value, timestamp) tuples per partition name
+    :returns: the newest values, see :func:`~server.functions.update_latest_sensor_values`
+    """
+    # create missing partitions outside of the transaction, so they can be reused if it fails
+    for rows in partitions.values():
+        ensure_partition(rows[0][2])
+
+    with transaction.atomic():
         cursor = connection.cursor()
-        # Convert floating point numbers to text, write to COPY input
-        cpy = BytesIO()
-        for row in self.sensor_values:
-            vals = [
-                row[0], row[1], connection.ops.value_to_db_datetime(row[2])]
-            cpy.write('\t'.join([str(val) for val in vals]) + '\n')
+        for name, rows in partitions.items():
+            cursor.copy_expert('COPY %s (sensor_id, value, timestamp) FROM STDIN WITH BINARY' % name,
+                               encode_copy_binary(rows))
+        return update_latest_sensor_values(sensor_values)
+
+
+class SensorValueWriter(Thread):
+    """ A thread, which writes sensor values to the database,
+    so the simulation doesn't wait for database inserts.
+
+    Values are collected until `batch_size` values are pending or `flush_interval` seconds passed
+    and then written with :func:`write_sensor_values`.
+    The queue holds at most `queue_size` lists of values, if the database can't keep up,
+    :meth:`put` blocks until there is space again.
+
+    :param int batch_size: number of values, which are written at once
+    :param float flush_interval: seconds after which pending values are written
+    :param int queue_size: maximum number of pending lists of values
+    """
+    FLUSH = 'flush'
+    STOP = 'stop'
+
+    def __init__(self, batch_size=SENSOR_VALUE_BATCH_SIZE, flush_interval=SENSOR_VALUE_FLUSH_INTERVAL,
+                 queue_size=SENSOR_VALUE_QUEUE_SIZE):
+        Thread.__init__(self)
+        self.daemon = True
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = Queue(maxsize=queue_size)
+
+    def put(self, sensor_values):
+        """ queue a list of (sensor_id, value, timestamp) tuples"""
+        self.queue.put(sensor_values)
+
+    def flush(self):
+        """ block until all values queued so far are written"""
+        self.queue.put(self.FLUSH)
+        self.queue.join()
+
+    def stop(self):
+        """ write all pending values and end the thread"""
+        self.queue.put(self.STOP)
+        self.join()
+
+    def run(self):
+        pending = []
+        # queue items, which are done after `pending` is written
+        pending_items = 0
+        deadline = time() + self.flush_interval
+        running = True
+        while running:
+            write = False
+            try:
+                item = self.queue.get(timeout=max(deadline - time(), 0))
+                pending_items += 1
+                if item is self.FLUSH or item is self.STOP:
+                    write = True
+                    running = item is not self.STOP
+                else:
+                    pending += item
+                    write = len(pending) >= self.batch_size
+            except Empty:
+                write = True
 
-        # Insert forecast_data; database converts text back to floating point
-        # numbers
-        cpy.seek(0)
-        cursor.copy_from(cpy, 'server_sensorvalue',
-                         columns=('sensor_id', 'value', 'timestamp'))
-        connection.commit()
+            if write or time() >= deadline:
+                self.write(pending)
+                pending = []
+                for i in range(pending_items):
+                    self.queue.task_done()
+                pending_items = 0
+                deadline = time() + self.flush_interval
 
-        cursor.execute(
-            "SELECT setval('server_sensorvalue_id_seq',(select max(id) FROM server_sensorvalue)+1);")
+        connection.close()
 
-        self.sensor_values = []
+    def write(self, sensor_values):
+        """ ``Internal Method`` write values and keep running if the database fails"""
+        try:
+            write_sensor_values(sensor_values)
+        except Exception:
+            logger.exception("Couldn't write %d sensor values" % len(sensor_values))
+            connection.close()
 
+
+class ColumnarMeasurementStorage(MeasurementStorage):
+    """ A storage for forecasts, which keeps the values in one contiguous float32 buffer (sensors x steps).
+    The buffer is preallocated for `steps` values per sensor and only grows, if more values are cached.
+    If a `directory` is given, the buffer is a memory-mapped temporary file in this directory,
+    so long forecasts don't bloat the heap.
+
+    The values in :meth:`get_cached` and :meth:`get_values` are views of the buffer.
+    Cached values are never overwritten, so views stay valid after :meth:`drop_first` or growing.
+
+    :param int steps: expected number of values per sensor
+    :param string directory: directory for the memory-mapped buffer or ``None``
+    """
+    def __init__(self, env, devices, steps, directory=None):
+        MeasurementStorage.__init__(self, env, devices)
+        self.directory = directory
+        self.buffer_file = None
+        rows = len(self.sensors_in_diagram)
+        self.forecast_data = self.allocate(rows, max(int(steps), 1))
+        self.starts = np.zeros(rows, dtype=np.int64)
+        self.lengths = np.zeros(rows, dtype=np.int64)
+
+    def allocate(self, rows, capacity):
+        """ ``Internal Method`` create a new buffer on the heap or memory-mapped"""
+        if self.directory is None:
+            return np.zeros((rows, capacity), dtype=np.float32)
+        # the file is deleted, when the storage is garbage collected
+        self.buffer_file = tempfile.NamedTemporaryFile(dir=self.directory, prefix='forecast', suffix='.dat')
+        return np.memmap(self.buffer_file, dtype=np.float32, mode='w+', shape=(rows, max(capacity, 1)))
+
+    def reserve(self, count):
+        """ ``Internal Method`` make sure, that `count` more values fit into every row"""
+        capacity = self.forecast_data.shape[1]
+        if len(self.lengths) == 0 or (self.starts + self.lengths).max() + count <= capacity:
+            return
+
+        # copy into a new buffer, existing views keep the old one
+        needed = self.lengths.max() + count
+        old_data = self.forecast_data
+        self.forecast_data = self.allocate(old_data.shape[0], 2 * needed)
+        for index in range(len(self.lengths)):
+            start, length = self.starts[index], self.lengths[index]
+            self.forecast_data[index, :length] = old_data[index, start:start + length]
+        self.starts[:] = 0
+
+    def take_and_cache(self):
+        """ cache values in `self.forecast_data` """
+        self.reserve(1)
+        for index, (sensor, device) in enumerate(self.device_map):
+            value = getattr(device, sensor.key, None)
+            if value is not None:
+                # in case value is a function, call that function
+                if hasattr(value, '__call__'):
+                    value = value()
+                self.forecast_data[index, self.starts[index] + self.lengths[index]] = float(value)
+                self.lengths[index] += 1
+
+    def cache_records(self, records):
+        """ cache complete value series in `self.forecast_data`.
+
+        :param list records: one float32 array per entry in `self.device_map` or ``None``,
+            if the device doesn't provide values for the sensor
+        """
+        self.reserve(max([len(values) for values in records if values is not None] + [0]))
+        for index, values in enumerate(records):
+            if values is not None:
+                end = self.starts[index] + self.lengths[index]
+                self.forecast_data[index, end:end + len(values)] = values
+                self.lengths[index] += len(values)
+
+    def get_values(self, sensor):
+        """ return a view of the cached values of a sensor or ``None``, if the sensor isn't cached"""
+        if sensor not in self.sensors_in_diagram:
+            return None
+        index = self.sensors_in_diagram.index(sensor)
+        start = self.starts[index]
+        return self.forecast_data[index, start:start + self.lengths[index]]
+
+    def get_cached(self, delete_after=False):
+        output = []
+        for index, sensor in enumerate(self.sensors_in_diagram):
+            output.append({
+                'id': sensor.id,
+                'device_id': sensor.device_id,
+                'device': sensor.device.name,
+                'name': sensor.name,
+                'unit': sensor.unit,
+                'key': sensor.key,
+                'data': self.get_values(sensor)
+            })
+        if delete_after:
+            self.drop_first(self.lengths.max() if len(self.lengths) > 0 else 0)
+        return output
+
+    def get_value_at(self, sensor, index):
+        """ return the cached value of a sensor at a step index or ``None``,
+        if the sensor isn't cached or the index is out of range"""
+        values = self.get_values(sensor)
+        if values is not None and 0 <= index < len(values):
+            return float(values[index])
+        return None
+
+    def drop_first(self, count):
+        """ remove the first `count` values of every sensor in `self.forecast_data`"""
+        dropped = np.minimum(self.lengths, count)
+        self.starts += dropped
+        self.lengths -= dropped
+
+    def get_last(self, value):
+        """ return newest item in `self.forecast_data`"""
+        values = self.get_values(value)
+        if values is not None and len(values) > 0:
+            return float(values[-1])
+        return None
@@ -0,0 +1,88 @@
+"""
+This module caches the results of forecasts.
+
+A forecast only depends on its inputs (initial time, device configurations, user code, forecast interval and system mode),
+so a repeated request with unchanged inputs can be served from memory.
+The cache holds at most `FORECAST_CACHE_SIZE` results and drops the least recently used result first.
+
+The cache has to be invalidated with :func:`invalidate_forecast_cache`, whenever the inputs change
+in a way the key doesn't reflect, f.e. after storing a new configuration or user code.
+"""
+import json
+import hashlib
+import logging
+from threading import Lock
+from collections import OrderedDict
+
+from server.settings import FORECAST_CACHE_SIZE
+
+logger = logging.getLogger('simulation')
+
+
+class ForecastCache(object):
+    """ A bounded cache of forecast results with least recently used eviction.
+
+    :param int max_size: maximal number of cached results
+    """
+
+    def __init__(self, max_size=FORECAST_CACHE_SIZE):
+        self.max_size = max_size
+        self.results = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key):
+        """ return a copy of the cached result or ``None``, if there is no result for `key`"""
+        with self.lock:
+            result = self.results.pop(key, None)
+            if result is None:
+                return None
+            # move to the end, so it's the most recently used
+            self.results[key] = result
+        return copy_result(result)
+
+    def put(self, key, result):
+        """ cache a result and evict the least recently used results, if the cache is full"""
+        if self.max_size <= 0:
+            return
+        with self.lock:
+            self.results.pop(key, None)
+            self.results[key] = copy_result(result)
+            while len(self.results) > self.max_size:
+                self.results.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.results.clear()
+
+    def __len__(self):
+        return len(self.results)
+
+
+def copy_result(result):
+    """ ``Internal Method`` copy a forecast result, so callers can't change the cached result.
+    The value lists are shared, because they are never modified."""
+    output = dict(result)
+    output['sensors'] = [dict(sensor) for sensor in result['sensors']]
+    return output
+
+
+def get_forecast_key(initial_time, configurations, code, forward, system_mode, auto_optimization):
+    """ Return a canonical hash of all inputs of a forecast.
+
+    :param list configurations: |DeviceConfiguration| objects
+    :param string code: the user code
+    """
+    canonical_configurations = sorted((configuration.device_id, configuration.key,
+                                       configuration.value_type, unicode(configuration.value))
+                                      for configuration in configurations)
+    inputs = [float(initial_time), canonical_configurations, code, forward, system_mode, auto_optimization]
+    return hashlib.sha1(json.dumps(inputs, sort_keys=True)).hexdigest()
+
+
+forecast_cache = ForecastCache()
+
+
+def invalidate_forecast_cache():
+    """ drop all cached forecast results"""
+    logger.debug("ForecastCache: invalidated")
+    forecast_cache.clear()
@@ -1,18 +1,19 @@
-""" This module contains an optimized version of the holtwinters double seasonal and the multiplicative method.
+""" This module contains optimized versions of all holtwinters methods: linear, additive, multiplicative and double seasonal.
 
 
 The functions in this module should deliver the same results as the unoptimized version in holt_winters.py.
-Just import the :func:`double_seasonal` from this module instead of the one in holt_winters.py.
+Just import f.e. :func:`double_seasonal` from this module instead of the one in holt_winters.py.
 
 This module has to be compiled with cython, it introduces statically typed variables and optimizes array usage
 and can therefore get speedups up to 100x.
 
-Note that the optimizing function differs from the normal version, as it first searches the global boundaries and then
+Note that the optimizing function of double seasonal and multiplicative differs from the normal version, as it first searches the global boundaries and then
 does a extremly accurate local search. This leads results very close to the absolute optimum.
+Linear and additive are optimized like the normal version, so all their results are the same.
 
-To build this module, use the build_holtwinters_extension() function. If it suceeds,
- a .pyd extension is built, which can be used like a normal python module.
-An example for importing and building the extension can be seen in forecasting.forecasting.__init__.
+To build this module, run ``python manage.py build_holtwinters``. If it suceeds,
+ a .so (or .pyd) extension is built, which can be used like a normal python module.
+It is imported by server.forecasting.statistical.extension on first use.
 """
 # asdf cython: profile = True
 from __future__ import division
@@ -33,6 +34,8 @@ ctypedef np.float64_t DTYPE_t
 
 from scipy.optimize import fmin_l_bfgs_b
 
+from server.forecasting.statistical.objective import LinearObjective, AdditiveObjective
+
 def double_seasonal(x, m, m2, forecast,  alpha=None, beta=None, gamma=None, delta=None, autocorrelation=None):
     """ executes one run of the double_seasonal method. For very fast runs with the same initialisation data, 
     instantiate a HoltWinters Object and the repeatedly call HoltWinters.double_seasonal(alpha,beta,gamma,delta,autocorr)"""
@@ -55,6 +58,29 @@ def multiplicative(x, m, forecast,  alpha=None, beta=None, gamma=None):
     hw._multiplicative(alpha, beta, gamma)
     return hw.forecast_series.base.tolist(), (alpha, beta, gamma), hw.y[:-forecast - 1].base.tolist()
 
+def linear(x, forecast, alpha=None, beta=None):
+    """ executes one run of the linear method. For very fast runs with the same initialisation data,
+    instantiate a CLinear Object and the repeatedly call CLinear.linear(alpha,beta)"""
+
+    if (alpha == None or beta == None):
+        alpha, beta = CLinear.optimize_parameters(x)
+
+    hw = CLinear(x, forecast)
+    hw._linear(alpha, beta)
+    return hw.forecast_series.base.tolist(), (alpha, beta), hw.y.base[:len(x) + 1].tolist()
+
+def additive(x, m, forecast, alpha=None, beta=None, gamma=None,
+             initial_values_optimization=[0.002, 0.0, 0.0002], optimization_type="MSE"):
+    """ executes one run of the additive method. For very fast runs with the same initialisation data,
+    instantiate a CAdditive Object and the repeatedly call CAdditive.additive(alpha,beta,gamma)"""
+
+    if (alpha == None or beta == None or gamma == None):
+        alpha, beta, gamma = CAdditive.optimize_parameters(x, m, initial_values_optimization, optimization_type)
+
+    hw = CAdditive(x, m, forecast)
+    hw._additive(alpha, beta, gamma)
+    return hw.forecast_series.base.tolist(), (alpha, beta, gamma), hw.y.base[:len(x) + 1].tolist()
+
 
 cdef class CDoubleSeasonal:
 
@@ -71,6 +97,9 @@ cdef class CDoubleSeasonal:
     cdef DTYPE_t[:] y  # onestep forecasts
     cdef DTYPE_t[:] forecast_series  # forecasting
     cdef DTYPE_t[:] test_series  # test series to compare with forecasting
+    # derivatives of the seasonalities by alpha, gamma, delta and autocorrelation
+    cdef DTYPE_t[:, :] ds
+    cdef DTYPE_t[:, :] ds2
 
     def __init__(self, x, unsigned int m, unsigned int m2, int forecast, test_data=[]):
 
@@ -95,6 +124,9 @@ cdef class CDoubleSeasonal:
         self.y = y
         self.forecast_series = forecast_series
         self.test_series = test_series
+        # the initial seasonalities are constant, so their derivatives stay zero
+        self.ds = np.zeros([self.m + self.all_length, 4], dtype=DTYPE)
+        self.ds2 = np.zeros([int(self.m2 / self.m) + self.all_length, 4], dtype=DTYPE)
         
         s2_tmp = [x[i] / self.a_0 for i in range(0,m2,m)]
 
@@ -144,7 +176,7 @@ cdef class CDoubleSeasonal:
         cdef np.ndarray[DTYPE_t, ndim = 1] initial_values = np.array(found_parameters, dtype=DTYPE)
         cdef np.ndarray[DTYPE_t, ndim = 2] boundaries = np.array([(0, 1), (0, 0.0), (0, 1), (0, 1), (0, 1)], dtype=DTYPE)
         # set to search with very high accuracy.. optimum cant be far..
-        optimized_parameters = fmin_l_bfgs_b( holtwinters.MSE, x0=initial_values, bounds=boundaries, approx_grad=True, factr=10, epsilon=0.01, maxfun=2000)
+        optimized_parameters = fmin_l_bfgs_b( holtwinters.MSE_and_gradient, x0=initial_values, bounds=boundaries, factr=10, maxfun=2000)
 
         return optimized_parameters[0]
 
@@ -154,6 +186,106 @@ cdef class CDoubleSeasonal:
     def MSE(self, params):
         return self._MSE(params[0], params[1], params[2], params[3], params[4])
 
+    """returns the MSE and its gradient from one run. Pass this to fmin_l_bfgs_b instead of using approx_grad.
+        :params: DTYPE_t alpha,DTYPE_t beta,DTYPE_t gamma,DTYPE_t delta, DTYPE_t autocorrelation"""
+
+    def MSE_and_gradient(self, params):
+        cdef np.ndarray[DTYPE_t, ndim = 1] gradient = np.zeros([4], dtype=DTYPE)
+        mse = self._MSE_and_gradient(params[0], params[2], params[3], params[4], gradient)
+        # the trend is not used
+        return mse, np.array([gradient[0], 0.0, gradient[1], gradient[2], gradient[3]], dtype=DTYPE)
+
+    @cython.initializedcheck(False)
+    @cython.boundscheck(False)  # turn of bounds-checking for entire function
+    # disables checks for zerodivision and other division checks
+    @cython.cdivision(True)
+    @cython.wraparound(False)  # dont wrap around arrays
+    @cython.nonecheck(False)
+    cdef DTYPE_t _MSE_and_gradient(self, DTYPE_t alpha, DTYPE_t gamma, DTYPE_t delta, DTYPE_t autocorrelation,
+                                   np.ndarray[DTYPE_t, ndim = 1] gradient):
+        """ runs the double seasonal method like _double_seasonal and propagates the derivatives
+        by (alpha, gamma, delta, autocorrelation) of all states along (forward mode). The gradient is written to `gradient`."""
+        cdef DTYPE_t a_i, a_next, s_i, s2_i, Y_i, error
+        cdef DTYPE_t y_next, deviation, mse_insample = 0, mse_outofsample = 0
+        cdef DTYPE_t dY, de, da_next, dy_next
+        cdef DTYPE_t da[4]
+        cdef unsigned int i, d, i_s2, i_s, m, m2
+        cdef DTYPE_t[:] Y = self.Y
+        cdef DTYPE_t[:] s = self.s
+        cdef DTYPE_t[:] s2 = self.s2
+        cdef DTYPE_t[:, :] ds = self.ds
+        cdef DTYPE_t[:, :] ds2 = self.ds2
+        cdef DTYPE_t insample_weight = 2.0 / self.len_x
+        cdef DTYPE_t outofsample_weight = 3.0 / self.forecast
+
+        m = self.m
+        m2 = self.m2
+        a_i = self.a_0
+        i_s2 = int(m2 / m)
+        i_s = m
+        for d in range(4):
+            da[d] = 0
+            gradient[d] = 0
+
+        # the first forecast doesn't depend on the parameters
+        deviation = a_i + s[0] + s2[0] - Y[0]
+        mse_insample += deviation * deviation
+
+        i = 0
+        while i < self.all_length:
+            s_i = s[i]
+            s2_i = s2[i]
+            if i >= self.len_x:
+                Y_i = a_i + s[i_s - m] + s2[i_s2 - m2]
+                self.forecast_series[i - self.len_x] = Y_i
+                deviation = Y_i - self.test_series[i - self.len_x]
+                mse_outofsample += deviation * deviation
+            else:
+                Y_i = Y[i]
+
+            error = Y_i - (a_i + s_i + s2_i)
+            a_next = alpha * (Y_i - s2_i - s_i) + (1 - alpha) * a_i
+            s[i_s] = delta * (Y_i - a_i - s2_i) + (1 - delta) * s_i
+            s2[i_s2] = gamma * (Y_i - a_i - s_i) + (1 - gamma) * s2_i
+            y_next = a_next + s[i + 1] + s2[i + 1] + autocorrelation * error
+            if i + 1 < self.len_x:
+                deviation = y_next - Y[i + 1]
+                mse_insample += deviation * deviation
+
+            for d in range(4):
+                if i >= self.len_x:
+                    dY = da[d] + ds[i_s - m, d] + ds2[i_s2 - m2, d]
+                    gradient[d] += 2 * outofsample_weight * (Y_i - self.test_series[i - self.len_x]) * dY
+                else:
+                    dY = 0
+                de = dY - da[d] - ds[i, d] - ds2[i, d]
+
+                da_next = alpha * (dY - ds2[i, d] - ds[i, d]) + (1 - alpha) * da[d]
+                ds[i_s, d] = delta * (dY - da[d] - ds2[i, d]) + (1 - delta) * ds[i, d]
+                ds2[i_s2, d] = gamma * (dY - da[d] - ds[i, d]) + (1 - gamma) * ds2[i, d]
+                # the direct derivatives by the parameter of the direction
+                if d == 0:
+                    da_next += error
+                elif d == 1:
+                    ds2[i_s2, d] += error
+                elif d == 2:
+                    ds[i_s, d] += error
+
+                if i + 1 < self.len_x:
+                    dy_next = da_next + ds[i + 1, d] + ds2[i + 1, d] + autocorrelation * de
+                    if d == 3:
+                        dy_next += error
+                    gradient[d] += 2 * insample_weight * (y_next - Y[i + 1]) * dy_next
+                da[d] = da_next
+
+            i_s2 += 1
+            i_s += 1
+            i += 1
+            a_i = a_next
+
+        # weight out of sample more
+        return insample_weight * mse_insample + outofsample_weight * mse_outofsample
+
     @cython.initializedcheck(False)
     @cython.boundscheck(False)  # turn of bounds-checking for entire function
     # disables checks for zerodivision and other division checks
@@ -389,3 +521,173 @@ cdef class CMultiplicative:
             i += 1
             a_i = a_next
             b_i = b_next
+
+
+
+cdef class CLinear:
+
+    # type ALL variables
+    # these are declared as unsigned, to avoid negative check.
+    # We have to avoid negative indices now
+    cdef int forecast
+    cdef unsigned int all_length, len_x
+    cdef DTYPE_t a_0, b_0
+
+    cdef DTYPE_t[:] Y  # input
+    cdef DTYPE_t[:] y  # onestep forecasts
+    cdef DTYPE_t[:] forecast_series  # forecasting
+
+    def __init__(self, x, int forecast):
+
+        # init variables
+        self.forecast = forecast
+        self.len_x = len(x)
+        self.all_length = len(x) + forecast
+        self.a_0 = x[0]
+        self.b_0 = x[1] - x[0]
+        # alloc arrays, using cython numpy arrays for fast access, also typed
+        self.Y = np.array(x, dtype=DTYPE)
+        self.y = np.zeros([self.all_length + 1], dtype=DTYPE)
+        self.forecast_series = np.zeros([forecast], dtype=DTYPE)
+
+    """ optimize the MSE of the one-step-forecasts like holt_winters.linear"""
+    @staticmethod
+    def optimize_parameters(x):
+        objective = LinearObjective(x)
+        optimized_parameters = fmin_l_bfgs_b(objective.value_and_gradient, x0=np.array([0.3, 0.1]),
+            bounds=[(0, 1), (0, 1)])
+        return optimized_parameters[0]
+
+    # callable from python
+    def linear(self, DTYPE_t alpha, DTYPE_t beta):
+        self._linear(alpha, beta)
+        return self.forecast_series, self.y[:self.len_x + 1]
+
+    @cython.initializedcheck(False)
+    @cython.boundscheck(False)  # turn of bounds-checking for entire function
+    # disables checks for zerodivision and other division checks
+    @cython.cdivision(True)
+    @cython.wraparound(False)  # dont wrap around arrays
+    @cython.nonecheck(False)  # do not check for None values
+    cdef inline void _linear(self, DTYPE_t alpha, DTYPE_t beta):
+
+        cdef DTYPE_t a_i, a_next, b_i, b_next, Y_i
+        cdef unsigned int i
+        cdef DTYPE_t[:] Y = self.Y
+        cdef DTYPE_t[:] y = self.y
+
+        # reset variables
+        a_i = self.a_0
+        b_i = self.b_0
+
+        # first forecast
+        y[0] = a_i + b_i
+
+        i = 0
+        while i < self.all_length:
+
+            if i >= self.len_x:
+                Y_i = a_i + b_i
+                self.forecast_series[i - self.len_x] = Y_i
+            else:
+                Y_i = Y[i]
+
+            a_next = alpha * Y_i + (1 - alpha) * (a_i + b_i)
+            b_next = beta * (a_next - a_i) + (1 - beta) * b_i
+            y[i + 1] = a_next + b_next
+
+            i += 1
+            a_i = a_next
+            b_i = b_next
+
+
+
+cdef class CAdditive:
+
+    # type ALL variables
+    # these are declared as unsigned, to avoid negative check.
+    # We have to avoid negative indices now
+    cdef int forecast
+    cdef unsigned int all_length, len_x, m
+    cdef DTYPE_t a_0, b_0
+
+    cdef DTYPE_t[:] Y  # input
+    cdef DTYPE_t[:] s  # seasonality
+    cdef DTYPE_t[:] y  # onestep forecasts
+    cdef DTYPE_t[:] forecast_series  # forecasting
+
+    def __init__(self, x, unsigned int m, int forecast):
+
+        # init variables
+        self.m = m
+        self.forecast = forecast
+        self.len_x = len(x)
+        self.all_length = len(x) + forecast
+        self.a_0 = np.sum(x[0:m]) / float(m)
+        self.b_0 = (np.sum(x[m:2 * m]) - np.sum(x[0:m])) / (float(m) ** 2)
+        # alloc arrays, using cython numpy arrays for fast access, also typed
+        self.Y = np.array(x, dtype=DTYPE)
+        self.s = np.zeros([self.m + self.all_length], dtype=DTYPE)
+        self.y = np.zeros([self.all_length + 1], dtype=DTYPE)
+        self.forecast_series = np.zeros([forecast], dtype=DTYPE)
+
+        cdef unsigned int k
+        # init seasonal variables
+        for k in xrange(m):
+            self.s[k] = self.Y[k] - self.a_0
+
+    """ optimize the one-step-forecasts like holt_winters.additive"""
+    @staticmethod
+    def optimize_parameters(x, unsigned int m, initial_values_optimization=[0.002, 0.0, 0.0002], optimization_type="MSE"):
+        objective = AdditiveObjective(x, m)
+        optimized_parameters = fmin_l_bfgs_b(objective.value_and_gradient, x0=np.array(initial_values_optimization),
+            args=(optimization_type,), bounds=[(0, 1), (0, 1), (0, 1)], factr=10**6)
+        return optimized_parameters[0]
+
+    # callable from python
+    def additive(self, DTYPE_t alpha, DTYPE_t beta, DTYPE_t gamma):
+        self._additive(alpha, beta, gamma)
+        return self.forecast_series, self.y[:self.len_x + 1]
+
+    @cython.initializedcheck(False)
+    @cython.boundscheck(False)  # turn of bounds-checking for entire function
+    # disables checks for zerodivision and other division checks
+    @cython.cdivision(True)
+    @cython.wraparound(False)  # dont wrap around arrays
+    @cython.nonecheck(False)  # do not check for None values
+    cdef inline void _additive(self, DTYPE_t alpha, DTYPE_t beta, DTYPE_t gamma):
+
+        cdef DTYPE_t a_i, a_next, b_i, b_next, s_i, Y_i
+        cdef unsigned int i, i_s, m
+        cdef DTYPE_t[:] Y = self.Y
+        cdef DTYPE_t[:] s = self.s
+        cdef DTYPE_t[:] y = self.y
+
+        m = self.m
+
+        # reset variables
+        a_i = self.a_0
+        b_i = self.b_0
+        i_s = m
+
+        # first forecast
+        y[0] = a_i + b_i + s[0]
+
+        i = 0
+        while i < self.all_length:
+            s_i = s[i]
+            if i >= self.len_x:
+                Y_i = a_i + b_i + s_i
+                self.forecast_series[i - self.len_x] = Y_i
+            else:
+                Y_i = Y[i]
+
+            a_next = alpha * (Y_i - s_i) + (1 - alpha) * (a_i + b_i)
+            b_next = beta * (a_next - a_i) + (1 - beta) * b_i
+            s[i_s] = gamma * (Y_i - a_i - b_i) + (1 - gamma) * s_i
+            y[i + 1] = a_next + b_next + s[i + 1]
+
+            i_s += 1
+            i += 1
+            a_i = a_next
+            b_i = b_next
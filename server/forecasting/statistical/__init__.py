@@ -24,37 +24,12 @@ import logging
 
 from django.utils.timezone import utc
 
-from server.settings import BASE_DIR, CYTHON_SUPPORT
+from server.settings import BASE_DIR, DOUBLE_SEASONAL_STARTS
+from server.forecasting.statistical.multistart import fit_double_seasonal
    
 
-""""try to import compiled holtwinters (double seasonal) extension by building it. 
-if this fails, the standard holtwinters is used. """
-fast_hw = False
-if (CYTHON_SUPPORT):
-    try:
-        from server.forecasting.statistical.build_extension import build_holtwinters_extension
-        try:
-            t0 = time.time()
-            build_holtwinters_extension() #compile and link
-            #if function takes less than 8 seconds, the module was probably already built before
-            fresh_build = time.time() - t0 > 8 
-            from server.forecasting.statistical.holtwinters_fast import double_seasonal, multiplicative
-            fast_hw = True
-            if fresh_build:
-                print "cython extension built and imported"
-        except Exception as e:
-            print "error while building. ", e
-            print "check ecoControl.log"
-    except Exception as e:
-        print "cython probably not installed", e
-    
-if not fast_hw:
-    if (CYTHON_SUPPORT):
-        print "falling back to python holt-winters"
-    from server.forecasting.statistical.holt_winters import double_seasonal, multiplicative, additive
-else:
-    #!TODO: additive is not accelerated (yet)
-    from server.forecasting.statistical.holt_winters import additive
+# the compiled holtwinters extension is imported on the first call, if it is built
+from server.forecasting.statistical.extension import double_seasonal, multiplicative, additive, linear
 
 
 
@@ -256,10 +231,15 @@ class DSHWForecast(StatisticalForecast):
         demand = self.demands[0] #dshw demands only contains one dataset
         sph = self.samples_per_hour
         fc = self.output_weeks * 24 * 7 * self.samples_per_hour #forecast_length
+        m, m2 = int(24*sph), int(24*7*sph)
 
         (alpha, beta, gamma, delta, autocorr) = (None for i in range(5))
         t = time.time()
-        forecast_values, (alpha, beta, gamma, delta, autocorrelation),in_sample = double_seasonal(demand, m=int(24*sph), m2=int(24*7*sph),
+        if DOUBLE_SEASONAL_STARTS > 0 and len(demand) >= 2 * m2:
+            # search from many starting points, the forecast of the last week is tested
+            (alpha, beta, gamma, delta, autocorr) = fit_double_seasonal(demand[:-m2], demand[-m2:], m, m2,
+                                                                        samples=DOUBLE_SEASONAL_STARTS)
+        forecast_values, (alpha, beta, gamma, delta, autocorrelation),in_sample = double_seasonal(demand, m=m, m2=m2,
                                                                            forecast=int(fc), alpha=alpha, beta=beta, gamma=gamma, delta=delta,
                                                                            autocorrelation=autocorr)
                                                                             
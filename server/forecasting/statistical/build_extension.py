@@ -19,6 +19,12 @@ compiler = "mingw32"
 logger = logging.getLogger('ecocontrol')
 
 def build_holtwinters_extension():
+    """ Compiles ``Choltwinters.pyx`` to the extension ``holtwinters_fast`` with the running python interpreter.
+    This is done by ``python manage.py build_holtwinters``, the extension is loaded by
+    :mod:`~server.forecasting.statistical.extension`.
+
+    :returns: ``True``, if the build succeeded
+    """
     # vsstudio is default compiler for python extensions and should definitely be used on windows. 
     # Newer versions of msvc are sometimes not compatible, although I didnt experience any incompabilities
     # anyway: if vsstudio 2008 not installed,try to use other vs studio version
@@ -41,7 +47,8 @@ def build_holtwinters_extension():
     os.chdir(os.path.dirname(os.path.realpath(__file__)))
     #build extension and pass in modified envionment variables
     #filepath = os.path.realpath(os.path.join(BASE_DIR, "server.forecasting.statistical/build_extension.py"))
-    commandline_args = shlex.split("python build_extension.py build_ext --inplace" + extra_command,posix=(os.name == "posix"))
+    # build for the running interpreter, an extension built by another python can't be loaded
+    commandline_args = [sys.executable] + shlex.split("build_extension.py build_ext --inplace" + extra_command,posix=(os.name == "posix"))
     proc = subprocess.Popen(commandline_args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=dict(os.environ))
     out, err = proc.communicate()
     logger.debug(out)
@@ -49,6 +56,7 @@ def build_holtwinters_extension():
         logger.error(err)
   
     os.chdir(starting_directory)
+    return proc.returncode == 0
 
 
 
@@ -61,3 +69,7 @@ if __name__ == "__main__":
 	setup(ext_modules=[ext],
 	      cmdclass = {'build_ext': build_ext},)
 
+	# setup exits on errors, so the extension was built
+	from extension import write_build_info
+	write_build_info()
+
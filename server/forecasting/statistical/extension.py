@@ -0,0 +1,105 @@
+""" This module loads the compiled Holt-Winters methods of :mod:`Choltwinters`.
+
+The extension is built ahead of time with ``python manage.py build_holtwinters``
+(or ``python build_extension.py build_ext --inplace`` in this directory), nothing is compiled on import.
+The build records the source and the python and numpy versions it was built for. When one of the methods
+is called first, the extension is imported, if this record matches the current ``Choltwinters.pyx``
+and interpreter. Otherwise, the methods of :mod:`~server.forecasting.statistical.holt_winters` are used.
+
+This module doesn't import django, so it can also be used by ``build_extension.py``.
+"""
+import os
+import sys
+import json
+import hashlib
+import logging
+
+import numpy
+
+logger = logging.getLogger('ecocontrol')
+
+DIRECTORY = os.path.dirname(os.path.realpath(__file__))
+SOURCE_PATH = os.path.join(DIRECTORY, 'Choltwinters.pyx')
+BUILD_INFO_PATH = os.path.join(DIRECTORY, 'holtwinters_fast.json')
+
+_methods = None
+
+
+def get_build_info():
+    """Returns a `dict` with the hash of the source and the ABI, which the extension has to be built for."""
+    with open(SOURCE_PATH, 'rb') as source:
+        source_hash = hashlib.sha1(source.read()).hexdigest()
+    return {
+        'source': source_hash,
+        'python': '%d.%d' % sys.version_info[:2],
+        'numpy': numpy.__version__,
+        'platform': sys.platform,
+        'maxsize': sys.maxsize,
+    }
+
+
+def write_build_info():
+    """Records that the extension was built for the current source and ABI, call this after a successful build."""
+    with open(BUILD_INFO_PATH, 'w') as build_info:
+        json.dump(get_build_info(), build_info)
+
+
+def is_built():
+    """Returns ``True``, if the extension was built for the current source and ABI."""
+    try:
+        with open(BUILD_INFO_PATH) as build_info:
+            return json.load(build_info) == get_build_info()
+    except (IOError, ValueError):
+        return False
+
+
+def load_methods():
+    """Returns the compiled extension ``holtwinters_fast``, if it is built and ``CYTHON_SUPPORT`` is set.
+    Otherwise, :mod:`~server.forecasting.statistical.holt_winters` is returned."""
+    from server.settings import CYTHON_SUPPORT
+    if CYTHON_SUPPORT:
+        if is_built():
+            try:
+                from server.forecasting.statistical import holtwinters_fast
+                return holtwinters_fast
+            except ImportError as e:
+                logger.warning('could not import holtwinters_fast: %s' % e)
+        else:
+            logger.warning('holtwinters_fast is not built or outdated, run `python manage.py build_holtwinters`')
+        logger.warning('falling back to python holt-winters')
+
+    from server.forecasting.statistical import holt_winters
+    return holt_winters
+
+
+def get_methods():
+    """Returns the module with the Holt-Winters methods, see :func:`load_methods`. It is loaded on the first call."""
+    global _methods
+    if _methods is None:
+        _methods = load_methods()
+    return _methods
+
+
+def is_accelerated():
+    """Returns ``True``, if the compiled methods are used."""
+    return get_methods().__name__.endswith('holtwinters_fast')
+
+
+def linear(*args, **kwargs):
+    """See :func:`~server.forecasting.statistical.holt_winters.linear`"""
+    return get_methods().linear(*args, **kwargs)
+
+
+def additive(*args, **kwargs):
+    """See :func:`~server.forecasting.statistical.holt_winters.additive`"""
+    return get_methods().additive(*args, **kwargs)
+
+
+def multiplicative(*args, **kwargs):
+    """See :func:`~server.forecasting.statistical.holt_winters.multiplicative`"""
+    return get_methods().multiplicative(*args, **kwargs)
+
+
+def double_seasonal(*args, **kwargs):
+    """See :func:`~server.forecasting.statistical.holt_winters.double_seasonal`"""
+    return get_methods().double_seasonal(*args, **kwargs)
@@ -12,18 +12,18 @@ References:
  """
 
 """Original Gist: Andre Queiroz, modified and extended by Max Reimann"""
-from sys import exit
 from math import sqrt
-import numpy as np
 from numpy import array
 from collections import namedtuple
 from scipy.optimize import fmin_l_bfgs_b
 
+from server.forecasting.statistical.objective import LinearObjective, AdditiveObjective, MultiplicativeObjective, DoubleSeasonalObjective
+
 
  
 def linear(x, forecast, alpha = None, beta = None):
     """ Returns a forecast calculated with linear exponential smoothing.
-    If `alpha` or `beta` are ``None``, the method will optimize the :func:`MSE` and find the
+    If `alpha` or `beta` are ``None``, the method will optimize the :func:`MSE` of the one-step-forecasts and find the
     most suitable parameters. The method returns these optimized parameters and also the one-step-forecasts, 
     for each value of `x`.
 
@@ -41,9 +41,9 @@ def linear(x, forecast, alpha = None, beta = None):
  
         initial_values = array([0.3, 0.1])
         boundaries = [(0, 1), (0, 1)]
-        hw_type = 0#'linear'
+        objective = LinearObjective(Y)
  
-        parameters = fmin_l_bfgs_b(MSE, x0 = initial_values, args = (Y, hw_type), bounds = boundaries, approx_grad = True)
+        parameters = fmin_l_bfgs_b(objective.value_and_gradient, x0 = initial_values, bounds = boundaries)
         alpha, beta = parameters[0]
  
     a = [Y[0]]
@@ -57,7 +57,7 @@ def linear(x, forecast, alpha = None, beta = None):
         if i == len(Y):
             Y.append(a[-1] + b[-1])
             
-        __exponential_smoothing_step(Y, i, named_parameters, (a, b, None, y), 0)
+        __exponential_smoothing_step(Y, i, named_parameters, (y, a, b, None, None), 0)
  
     return Y[-forecast:], (alpha, beta), y[:-forecast]
  
@@ -91,10 +91,9 @@ def additive(x, m, forecast, alpha = None, beta = None, gamma = None,
  
         initial_values = array(initial_values_optimization)
         boundaries = [(0, 1), (0, 1), (0, 1)]
-        hw_type = 1#'additive'
-        optimization_criterion = MSE if optimization_type == "MSE" else MASE
+        objective = AdditiveObjective(Y, m)
  
-        parameters = fmin_l_bfgs_b(optimization_criterion, x0 = initial_values, args = (Y, hw_type, m), bounds = boundaries, approx_grad = True,factr=10**6)
+        parameters = fmin_l_bfgs_b(objective.value_and_gradient, x0 = initial_values, args = (optimization_type,), bounds = boundaries, factr=10**6)
         alpha, beta, gamma = parameters[0]
  
     a = [sum(Y[0:m]) / float(m)]
@@ -121,16 +120,15 @@ def multiplicative(x, m, forecast, alpha=None, beta=None, gamma=None, initial_va
  
         initial_values = array(initial_values_optimization)
         boundaries = [(0, 1), (0, 0.05), (0, 1)]
-        hw_type = 2 #'multiplicative'
-        optimization_criterion = MSE if optimization_type == "MSE" else MASE
         
         train_series = Y[:-m*2]
         test_series = Y[-m*2:]
         
         Y = train_series
+        objective = MultiplicativeObjective(train_series, m, test_series)
 
-        parameters = fmin_l_bfgs_b(optimization_criterion, x0 = initial_values, args = (train_series, hw_type, m, test_series), 
-                                   bounds = boundaries, approx_grad = True,factr=10**3)
+        parameters = fmin_l_bfgs_b(objective.value_and_gradient, x0 = initial_values, args = (optimization_type,), 
+                                   bounds = boundaries, factr=10**3)
         alpha, beta, gamma = parameters[0]
     
 
@@ -174,15 +172,14 @@ def double_seasonal(x, m, m2, forecast, alpha = None, beta = None, gamma = None,
  
         initial_values = array(initial_values_optimization)
         boundaries = [(0, 1), (0, 0), (0, 1), (0,1), (0,1)]
-        hw_type = 3 #'double seasonal
-        optimization_criterion = MSE if optimization_type == "MSE" else MASE
         
         train_series = Y[:-m2*1]
         test_series = Y[-m2*1:]
         Y = train_series
+        objective = DoubleSeasonalObjective(train_series, m, m2, test_series)
 
-        parameters = fmin_l_bfgs_b(optimization_criterion, x0 = initial_values, args = (train_series, hw_type, (m,m2), test_series), 
-                                   bounds = boundaries, approx_grad = True,factr=10**3)
+        parameters = fmin_l_bfgs_b(objective.value_and_gradient, x0 = initial_values, args = (optimization_type,), 
+                                   bounds = boundaries, factr=10**3)
         alpha, beta, gamma, delta, autocorrelation = parameters[0]
     
 
@@ -205,65 +202,31 @@ def double_seasonal(x, m, m2, forecast, alpha = None, beta = None, gamma = None,
 def MSE(params, *args):
     """ ``Internal Method``. Calculates the Mean Square Error of one run of holt-winters with the supplied arguments.
     The MSE is actually computed from the MSE of the one-step-forecast error and the error between the forecast and a testseries. 
+    The optimizations use the objectives in :mod:`~server.forecasting.statistical.objective` directly.
 
     :param list params: (alpha, ...) the parameters
-    :param list \*args: (input_series, hw type, m), with hwtype in [0:3] depicting hw method
+    :param list \*args: (input_series, hw type, m, test_series), with hwtype in [0:3] depicting hw method
     """
-    forecast, onestepfcs = _holt_winters(params,*args)
-    test_data = args[3]
-    train = args[0]
-    mse_outofsample = sum([(m - n) ** 2 for m, n in zip(test_data, forecast)]) / len(test_data)
-    mse_insample = sum([(m - n) ** 2 for m, n in zip(train, onestepfcs)]) / len(train)
-    
-    return mse_insample + mse_outofsample
+    return _objective(*args).MSE(params)
 
 def MASE(params, *args): 
     """ Calculates the Mean-Absolute Scaled Error (see :py:meth:`server.forecasting.forecasting.StatisticalForecast.MASE`). For parameters see :func:`MSE`.
     """
-    input = args[0]
-    forecast = _holt_winters(params,*args)
-    
-    training_series = np.array(input)
-    testing_series = np.array(args[3])
-    prediction_series = np.array(forecast)
-    n = training_series.shape[0]
-    d = np.abs(  np.diff(training_series) ).sum()/(n-1)
-    
-    errors = np.abs(testing_series - prediction_series )
-    return errors.mean()/d
-
+    return _objective(*args).MASE(params)
 
 
         
-def _holt_winters(params, *args):
-    """ ``Internal Method``. Calculates one holt-winters run. This method is used in calculating of MSE."""
-    train = args[0][:]
-    hw_type = args[1]
-    m = args[2]
-    test_data = args[3]
- 
+def _objective(train, hw_type, m=None, test_data=[]):
+    """ ``Internal Method``. Returns the objective of the holt-winters method `hw_type`. This method is used in calculating of MSE."""
     if hw_type == 0:
-
-        alpha, beta = params
-        linear(train, len(test_data), alpha, beta)
-
-    if hw_type == 1:
-        alpha, beta, gamma = params
-        forecast, params, onestepfcs = additive(train, m, len(test_data), alpha=alpha,beta=beta,gamma=gamma)
+        return LinearObjective(train, test_data)
+    elif hw_type == 1:
+        return AdditiveObjective(train, m, test_data)
     elif hw_type == 2:
-        alpha, beta, gamma = params
-        forecast, params, onestepfcs = multiplicative(train, m, len(test_data), alpha=alpha,beta=beta,gamma=gamma)
-
+        return MultiplicativeObjective(train, m, test_data)
     elif hw_type == 3:
-            alpha, beta, gamma, delta, autocorrelation = params
-            forecast, params, onestepfcs = double_seasonal(train, m[0],m[1], len(test_data), 
-                                                             alpha=alpha,beta=beta,gamma=gamma,delta=delta, 
-                                                             autocorrelation=autocorrelation)
-    else:
-    
-        exit('type must be either linear, additive, multiplicative or double seasonal')
-    
-    return forecast, onestepfcs
+        return DoubleSeasonalObjective(train, m[0], m[1], test_data)
+    raise ValueError('type must be either linear, additive, multiplicative or double seasonal')
         
 
 
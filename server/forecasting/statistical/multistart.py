@@ -0,0 +1,105 @@
+""" This module searches the parameters of the double seasonal method from many starting points.
+
+A single local search (as in :func:`~server.forecasting.statistical.holt_winters.double_seasonal`) often ends in a
+poor local minimum. :func:`fit_double_seasonal` evaluates a latin hypercube of (alpha, gamma, delta, autocorrelation)
+and refines the best candidates and the usual starting guess with ``fmin_l_bfgs_b``,
+so the result is never worse than the single search. Both steps are distributed to a pool of processes.
+The series is copied into shared memory once, every process creates its
+:class:`~server.forecasting.statistical.objective.DoubleSeasonalObjective` from it when it is started.
+"""
+import multiprocessing
+from multiprocessing.sharedctypes import RawArray
+
+import numpy as np
+from scipy.optimize import fmin_l_bfgs_b
+
+from server.forecasting.statistical.objective import DoubleSeasonalObjective, DTYPE
+
+BOUNDARIES = [(0, 1), (0, 0), (0, 1), (0, 1), (0, 1)]
+"""the boundaries of (alpha, beta, gamma, delta, autocorrelation), the trend beta is not used"""
+
+# the objective of the current process, see _initialize
+_objective = None
+_optimization_type = "MSE"
+
+
+def latin_hypercube(samples, dimensions, random):
+    """ Returns `samples` points in the unit cube of `dimensions` dimensions.
+    In every dimension, there is exactly one point in each of the `samples` intervals of equal length.
+
+    :param random: a ``numpy.random.RandomState``
+    """
+    points = (np.arange(samples)[:, None] + random.rand(samples, dimensions)) / samples
+    for column in points.T:
+        random.shuffle(column)
+    return points
+
+
+def _initialize(series, length, m, m2, optimization_type):
+    """ Creates the objective of a process from the shared `series`, the first `length` values are the training data."""
+    global _objective, _optimization_type
+    values = np.frombuffer(series, dtype=DTYPE)
+    _objective = DoubleSeasonalObjective(values[:length], m, m2, values[length:])
+    _optimization_type = optimization_type
+
+
+def _losses(parameters):
+    return _objective.losses(parameters, _optimization_type)
+
+
+def _refine(start):
+    parameters, loss, info = fmin_l_bfgs_b(_objective.value_and_gradient, x0=start, args=(_optimization_type,),
+                                           bounds=BOUNDARIES, factr=10 ** 3)
+    return loss, parameters
+
+
+def fit_double_seasonal(train, test, m, m2, samples=64, candidates=None, processes=None,
+                        initial_values=[0.1, 0.0, 0.2, 0.2, 0.9], optimization_type="MSE", seed=0):
+    """ Returns the parameters (alpha, beta, gamma, delta, autocorrelation) of the double seasonal method
+    with the lowest loss from `samples` starting points.
+
+    :param list train: the series, which is smoothed
+    :param list test: the series following `train`, which is compared with the forecast
+    :param int m: intraday seasonality
+    :param int m2: intraweek seasonality
+    :param int samples: the number of starting points
+    :param int candidates: the number of starting points with the lowest loss, which are refined.
+        By default, every process refines one of the candidates or the guess.
+    :param int processes: the number of processes, defaults to the number of cores.
+        Daemonic processes can't start a pool, they search alone.
+    :param list initial_values: a guess of the parameters, which is refined in addition to the candidates
+    :param string optimization_type: "MSE" or "MASE"
+    :param int seed: the seed of the starting points
+    """
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if multiprocessing.current_process().daemon:
+        processes = 1
+    if candidates is None:
+        candidates = processes - 1
+    candidates = max(1, min(candidates, samples))
+
+    starts = np.zeros((samples, 5), dtype=DTYPE)
+    starts[:, [0, 2, 3, 4]] = latin_hypercube(samples, 4, np.random.RandomState(seed))
+
+    series = RawArray('d', len(train) + len(test))
+    np.frombuffer(series, dtype=DTYPE)[:] = list(train) + list(test)
+    initargs = (series, len(train), m, m2, optimization_type)
+
+    if processes > 1:
+        pool = multiprocessing.Pool(processes, _initialize, initargs)
+        try:
+            losses = np.concatenate(pool.map(_losses, np.array_split(starts, processes)))
+            best = np.vstack((initial_values, starts[np.argsort(losses)[:candidates]]))
+            results = pool.map(_refine, best)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        _initialize(*initargs)
+        losses = _losses(starts)
+        best = np.vstack((initial_values, starts[np.argsort(losses)[:candidates]]))
+        results = map(_refine, best)
+
+    loss, parameters = min(results, key=lambda result: result[0])
+    return tuple(parameters)
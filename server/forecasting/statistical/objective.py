@@ -0,0 +1,652 @@
+""" This module contains the objective functions, which are minimized to find the parameters of the
+methods in :mod:`~server.forecasting.statistical.holt_winters`.
+
+An objective is created once per optimization and keeps the training and test series in preallocated float64 arrays.
+Every evaluation smoothes the series for a whole batch of parameter vectors at once and
+reduces the errors with array operations instead of python loops.
+
+The derivatives of all states by the parameters are propagated together with the states (forward mode),
+so :meth:`SmoothingObjective.value_and_gradient` returns the loss and its exact gradient from one pass.
+It can be passed to ``fmin_l_bfgs_b`` instead of using ``approx_grad=True``,
+which would run the smoothing method once more per parameter and only approximates the gradient.
+
+The recursions are written in error-correction form, f.e. ``a[i+1] = a[i] + alpha * e[i]`` for the level of
+the double seasonal method, where ``e[i]`` is the error of the one-step-forecast without autocorrelation.
+This is algebraically equal to the formulas in :mod:`~server.forecasting.statistical.holt_winters`.
+
+The linear, additive and double seasonal methods are linear filters of the input series. After the first steps,
+which depend on the initial level and seasons, the errors ``e`` satisfy a difference equation
+``Q(q) e = P(q) Y`` with the lag operator ``q``. For the double seasonal method f.e.
+
+    ``P = (1 - q)(1 - q^m)(1 - q^m2_days)``
+
+    ``Q = P + alpha q (1 - q^m)(1 - q^m2_days) + delta q^m (1 - q)(1 - q^m2_days) + gamma q^m2_days (1 - q)(1 - q^m)``
+
+The errors are therefore computed with ``scipy.signal.lfilter`` and the states at the end of the
+series are sums of the errors. The derivatives follow from differentiating the difference equation,
+f.e. ``Q(q) de/dalpha = -q (1 - q^m)(1 - q^m2_days) e``, and are filtered the same way. The multiplicative method is not linear, but its level and trend are,
+once the seasons are known. It steps through the series one season at a time.
+"""
+import numpy as np
+from scipy.signal import lfilter
+
+DTYPE = np.float64
+
+
+def lag_polynomial(*factors):
+    """ Returns the coefficients of a product of lag polynomials, f.e. ``lag_polynomial([1, -1], [0, 1])``
+    for ``(1 - q) q``.
+
+    :param list \*factors: coefficients of each factor, starting with ``q^0``
+    """
+    product = np.ones(1, dtype=DTYPE)
+    for factor in factors:
+        product = np.convolve(product, factor)
+    return product
+
+
+def seasonal_difference(lag):
+    """ Returns the coefficients of ``1 - q^lag``"""
+    return lag_polynomial(np.r_[1.0, np.zeros(lag - 1), -1.0])
+
+
+def shift(lag):
+    """ Returns the coefficients of ``q^lag``"""
+    return np.r_[np.zeros(lag), 1.0]
+
+
+def combine(base, terms, parameters):
+    """ Returns one polynomial per row of `parameters`: `base` + sum of ``parameters[:, i] * terms[i]``"""
+    length = max([len(base)] + [len(term) for term in terms])
+    polynomials = np.zeros((len(parameters), length), dtype=DTYPE)
+    polynomials[:, :len(base)] = base
+    for term, weights in zip(terms, parameters.T):
+        polynomials[:, :len(term)] += weights[:, None] * term
+    return polynomials
+
+
+def initial_state(numerator, denominator, outputs, inputs=()):
+    """ Returns the state of ``lfilter`` after the given past outputs and inputs, the latest first.
+    Like ``scipy.signal.lfiltic``, without a python loop over the order of the filter.
+    """
+    order = max(len(numerator), len(denominator)) - 1
+    b, a = np.zeros(order + 1, dtype=DTYPE), np.zeros(order + 1, dtype=DTYPE)
+    b[:len(numerator)] = numerator
+    a[:len(denominator)] = denominator
+    x, y = np.zeros(order, dtype=DTYPE), np.zeros(order, dtype=DTYPE)
+    x[:min(order, len(inputs))] = inputs[:order]
+    y[:min(order, len(outputs))] = outputs[:order]
+    # zi[k] = sum over t of b[k + 1 + t] x[t] - a[k + 1 + t] y[t]
+    return np.correlate(b[1:], x, 'full')[order - 1:] - np.correlate(a[1:], y, 'full')[order - 1:]
+
+
+def continue_filter(inputs, outputs, start, numerator, denominator):
+    """ Computes ``outputs[start:]`` from the difference equation ``denominator(q) outputs = numerator(q) inputs``,
+    continuing from the already known ``outputs[:start]``.
+    """
+    if 0 < start < len(inputs):
+        zi = initial_state(numerator, denominator, outputs[start - 1::-1], inputs[start - 1::-1])
+        outputs[start:] = lfilter(numerator, denominator, inputs[start:], zi=zi)[0]
+
+
+def lagged_sum(values, lag):
+    """ Returns the sums ``values[j - lag] + values[j - 2 * lag] + ...`` for every row j"""
+    return lfilter(shift(lag), seasonal_difference(lag), values, axis=0)
+
+
+def residue_sum(values, lag):
+    """ Returns the sums of all rows j of `values` with the same ``j % lag``, one row per residue"""
+    padded = np.zeros((-(-len(values) // lag) * lag,) + values.shape[1:], dtype=DTYPE)
+    padded[:len(values)] = values
+    return padded.reshape((-1, lag) + values.shape[1:]).sum(axis=0)
+
+
+def chain(derivatives, jacobian):
+    """ Returns the derivatives by the parameters from the derivatives by the filter weights.
+
+    :param derivatives: array (steps, weights, columns)
+    :param jacobian: the derivatives of the weights by the parameters, array (weights, parameters, columns)
+    """
+    return np.einsum('twk,wpk->tpk', derivatives, jacobian)
+
+
+def level_and_trend(a_0, b_0, alpha, alpha_beta, errors, d_errors=None):
+    """ Returns the level and trend after all `errors` of ``a[i+1] = a[i] + b[i] + alpha e[i]``
+    and ``b[i+1] = b[i] + alpha beta e[i]``, and their derivatives by the filter weights, if `d_errors` is given.
+    The first two weights have to be ``alpha`` and ``alpha beta``.
+
+    :returns: (a, b, da, db)
+    """
+    n = len(errors)
+    remaining = np.arange(n - 1, -1, -1, dtype=DTYPE)
+    total = errors.sum(axis=0)
+    weighted = np.dot(remaining, errors)
+    a = a_0 + n * b_0 + alpha_beta * weighted + alpha * total
+    b = b_0 + alpha_beta * total
+    if d_errors is None:
+        return a, b, None, None
+
+    d_total = d_errors.sum(axis=0)
+    d_a = alpha_beta * np.tensordot(remaining, d_errors, 1) + alpha * d_total
+    d_a[0] += total
+    d_a[1] += weighted
+    d_b = alpha_beta * d_total
+    d_b[1] += total
+    return a, b, d_a, d_b
+
+
+class SmoothingObjective(object):
+
+    """ The base class of all objectives. Subclasses implement :meth:`smooth` for one of the methods.
+
+    :param list train: the series, which is smoothed
+    :param list test: the series following `train`, which is compared with the forecast. If empty,
+        only the one-step-forecasts are evaluated.
+    """
+
+    parameter_count = 0
+    """the number of parameters of the method"""
+
+    def __init__(self, train, test=[]):
+        self.train = np.array(train, dtype=DTYPE)
+        self.test = np.array(test, dtype=DTYPE)
+        self.len_train = len(self.train)
+        self.len_test = len(self.test)
+
+        # denominator of the mean absolute scaled error
+        self.naive_error = np.abs(np.diff(self.train)).mean()
+
+    def smooth(self, parameters, derivatives=False):
+        """ Runs the smoothing method for every row of `parameters`.
+
+        :param parameters: array with one parameter vector per row
+        :param boolean derivatives: also return the derivatives by the parameters
+        :returns: (in-sample errors, forecasts), arrays with one column per parameter vector.
+            With `derivatives`, their derivatives follow as arrays (steps, parameters, columns).
+        """
+        raise NotImplementedError()
+
+    def losses(self, parameters, criterion="MSE", gradient=False):
+        """ Returns the loss of every row of `parameters`.
+
+        The MSE is the sum of the mean square one-step-forecast error and the mean square error between the forecast
+        and the test series. The MASE is the mean absolute error of the forecast (or the one-step-forecasts,
+        if there is no test series) scaled by the mean absolute error of the naive forecast.
+
+        :param string criterion: "MSE" or "MASE"
+        :param boolean gradient: also return the gradients, one row per parameter vector
+        """
+        parameters = np.atleast_2d(np.asarray(parameters, dtype=DTYPE))
+        if gradient:
+            errors, forecast, d_errors, d_forecast = self.smooth(parameters, derivatives=True)
+        else:
+            errors, forecast = self.smooth(parameters)
+
+        if criterion == "MSE":
+            loss = (errors ** 2).mean(axis=0)
+            if gradient:
+                d_loss = 2 * (errors[:, None] * d_errors).mean(axis=0)
+            if self.len_test > 0:
+                deviation = forecast - self.test[:, None]
+                loss += (deviation ** 2).mean(axis=0)
+                if gradient:
+                    d_loss += 2 * (deviation[:, None] * d_forecast).mean(axis=0)
+        else:
+            if self.len_test > 0:
+                errors = forecast - self.test[:, None]
+                if gradient:
+                    d_errors = d_forecast
+            loss = np.abs(errors).mean(axis=0) / self.naive_error
+            if gradient:
+                d_loss = (np.sign(errors)[:, None] * d_errors).mean(axis=0) / self.naive_error
+
+        if gradient:
+            return loss, d_loss.T
+        return loss
+
+    def MSE(self, parameters):
+        """ Returns the MSE of one parameter vector, see :meth:`losses`"""
+        return self.losses(parameters)[0]
+
+    def MASE(self, parameters):
+        """ Returns the MASE of one parameter vector, see :meth:`losses`"""
+        return self.losses(parameters, "MASE")[0]
+
+    def value_and_gradient(self, parameters, criterion="MSE"):
+        """ Returns the loss of one parameter vector and its gradient, see :meth:`losses`
+
+        :returns: (loss, gradient)
+        """
+        loss, gradient = self.losses(parameters, criterion, gradient=True)
+        return loss[0], gradient[0]
+
+
+class FilterObjective(SmoothingObjective):
+
+    """ The base class of the methods, which are linear filters of the series.
+    Subclasses define the lag polynomials `numerator` and `terms`, the denominator of the filter is
+    ``numerator + weights[0] * terms[0] + weights[1] * terms[1] + ...``
+    """
+
+    numerator = np.ones(1, dtype=DTYPE)
+    terms = ()
+
+    def weights(self, parameters):
+        """ Returns the weights of the `terms` for every row of `parameters`
+        and their derivatives by the parameters as array (weights, parameters, rows).
+        """
+        raise NotImplementedError()
+
+    def warm_up(self, weights, errors, d_errors=None):
+        """ Runs the recursion for the first rows of `errors`, which depend on the initial states.
+        `d_errors` receives the derivatives by the weights.
+        """
+        raise NotImplementedError()
+
+    def filter_errors(self, weights, derivatives=False):
+        """ Returns the errors ``e`` and their derivatives by the weights, if `derivatives` is set."""
+        count = len(weights)
+        start = min(len(self.numerator) - 1, self.len_train)
+        errors = np.empty((self.len_train, count), dtype=DTYPE)
+        d_errors = np.empty((self.len_train, len(self.terms), count), dtype=DTYPE) if derivatives else None
+        self.warm_up(weights, errors[:start], d_errors[:start] if derivatives else None)
+
+        for column, denominator in enumerate(combine(self.numerator, self.terms, weights)):
+            continue_filter(self.train, errors[:, column], start, self.numerator, denominator)
+            if derivatives:
+                # Q de/dw = -term e
+                for index, term in enumerate(self.terms):
+                    continue_filter(errors[:, column], d_errors[:, index, column], start, -term, denominator)
+        return errors, d_errors
+
+
+class LinearObjective(FilterObjective):
+
+    """ Objective of :func:`~server.forecasting.statistical.holt_winters.linear`, parameters (alpha, beta)"""
+
+    parameter_count = 2
+
+    # (1 - q)^2 e = (1 - q)^2 Y - alpha q (1 - q) e - alpha beta q e
+    numerator = lag_polynomial([1, -1], [1, -1])
+    terms = (lag_polynomial(shift(1), [1, -1]), shift(1))
+
+    def weights(self, parameters):
+        alpha, beta = parameters[:, 0], parameters[:, 1]
+        jacobian = np.zeros((2, 2, len(parameters)), dtype=DTYPE)
+        jacobian[0, 0] = 1
+        jacobian[1, 0] = beta
+        jacobian[1, 1] = alpha
+        return np.column_stack((alpha, alpha * beta)), jacobian
+
+    def warm_up(self, weights, errors, d_errors=None):
+        alpha, alpha_beta = weights[:, 0], weights[:, 1]
+        Y = self.train
+        a = np.zeros(len(weights), dtype=DTYPE) + Y[0]
+        b = np.zeros(len(weights), dtype=DTYPE) + Y[1] - Y[0]
+        d_a = np.zeros(weights.T.shape, dtype=DTYPE)
+        d_b = np.zeros(weights.T.shape, dtype=DTYPE)
+        for i, e in enumerate(errors):
+            e[:] = Y[i] - a - b
+            if d_errors is not None:
+                d_e = d_errors[i]
+                d_e[:] = -d_a - d_b
+                d_a += d_b + alpha * d_e
+                d_a[0] += e
+                d_b += alpha_beta * d_e
+                d_b[1] += e
+            a += b + alpha * e
+            b += alpha_beta * e
+
+    def smooth(self, parameters, derivatives=False):
+        weights, jacobian = self.weights(parameters)
+        errors, d_errors = self.filter_errors(weights, derivatives)
+        a, b, d_a, d_b = level_and_trend(self.train[0], self.train[1] - self.train[0],
+                                         weights[:, 0], weights[:, 1], errors, d_errors)
+
+        steps = np.arange(1, self.len_test + 1, dtype=DTYPE)
+        forecast = a + steps[:, None] * b
+        if not derivatives:
+            return errors, forecast
+
+        d_forecast = d_a + steps[:, None, None] * d_b
+        return errors, forecast, chain(d_errors, jacobian), chain(d_forecast, jacobian)
+
+
+class AdditiveObjective(FilterObjective):
+
+    """ Objective of :func:`~server.forecasting.statistical.holt_winters.additive`, parameters (alpha, beta, gamma)
+
+    :param int m: the seasonality
+    """
+
+    parameter_count = 3
+
+    def __init__(self, train, m, test=[]):
+        FilterObjective.__init__(self, train, test)
+        self.m = m
+        self.a_0 = self.train[0:m].sum() / float(m)
+        self.b_0 = (self.train[m:2 * m].sum() - self.train[0:m].sum()) / float(m) ** 2
+        self.s_0 = self.train[0:m] - self.a_0
+
+        # P = (1 - q)^2 (1 - q^m), Q = P + alpha q (1 - q)(1 - q^m) + alpha beta q (1 - q^m) + gamma q^m (1 - q)^2
+        self.numerator = lag_polynomial([1, -1], [1, -1], seasonal_difference(m))
+        self.terms = (lag_polynomial(shift(1), [1, -1], seasonal_difference(m)),
+                      lag_polynomial(shift(1), seasonal_difference(m)),
+                      lag_polynomial(shift(m), [1, -1], [1, -1]))
+
+    def weights(self, parameters):
+        alpha, beta = parameters[:, 0], parameters[:, 1]
+        jacobian = np.zeros((3, 3, len(parameters)), dtype=DTYPE)
+        jacobian[0, 0] = 1
+        jacobian[1, 0] = beta
+        jacobian[1, 1] = alpha
+        jacobian[2, 2] = 1
+        return np.column_stack((alpha, alpha * beta, parameters[:, 2])), jacobian
+
+    def warm_up(self, weights, errors, d_errors=None):
+        alpha, alpha_beta, gamma = weights[:, 0], weights[:, 1], weights[:, 2]
+        Y = self.train
+        m = self.m
+        s = np.empty((len(errors) + m, len(weights)), dtype=DTYPE)
+        s[:m] = self.s_0[:, None]
+        a = np.zeros(len(weights), dtype=DTYPE) + self.a_0
+        b = np.zeros(len(weights), dtype=DTYPE) + self.b_0
+        d_s = np.zeros((len(errors) + m,) + weights.T.shape, dtype=DTYPE)
+        d_a = np.zeros(weights.T.shape, dtype=DTYPE)
+        d_b = np.zeros(weights.T.shape, dtype=DTYPE)
+        for i, e in enumerate(errors):
+            e[:] = Y[i] - a - b - s[i]
+            if d_errors is not None:
+                d_e = d_errors[i]
+                d_e[:] = -d_a - d_b - d_s[i]
+                d_a += d_b + alpha * d_e
+                d_a[0] += e
+                d_b += alpha_beta * d_e
+                d_b[1] += e
+                d_s[i + m] = d_s[i] + gamma * d_e
+                d_s[i + m, 2] += e
+            a += b + alpha * e
+            b += alpha_beta * e
+            s[i + m] = s[i] + gamma * e
+
+    def smooth(self, parameters, derivatives=False):
+        weights, jacobian = self.weights(parameters)
+        gamma = weights[:, 2]
+        m, n = self.m, self.len_train
+
+        errors, d_errors = self.filter_errors(weights, derivatives)
+        a, b, d_a, d_b = level_and_trend(self.a_0, self.b_0, weights[:, 0], weights[:, 1], errors, d_errors)
+        # the seasons of the last m steps, s[j] = s[j - m] + gamma e[j - m]
+        residues = (n + np.arange(m)) % m
+        error_sums = residue_sum(errors, m)[residues]
+        seasons = self.s_0[residues][:, None] + gamma * error_sums
+
+        steps = np.arange(self.len_test)
+        forecast = a + (steps[:, None] + 1) * b + seasons[steps % m]
+        if not derivatives:
+            return errors, forecast
+
+        d_seasons = gamma * residue_sum(d_errors, m)[residues]
+        d_seasons[:, 2] += error_sums
+        d_forecast = d_a + (steps[:, None, None] + 1) * d_b + d_seasons[steps % m]
+        return errors, forecast, chain(d_errors, jacobian), chain(d_forecast, jacobian)
+
+
+class MultiplicativeObjective(SmoothingObjective):
+
+    """ Objective of :func:`~server.forecasting.statistical.holt_winters.multiplicative`,
+    parameters (alpha, beta, gamma)
+
+    :param int m: the seasonality
+    """
+
+    parameter_count = 3
+
+    def __init__(self, train, m, test=[]):
+        SmoothingObjective.__init__(self, train, test)
+        self.m = m
+        self.a_0 = self.train[0:m].sum() / float(m)
+        self.b_0 = (self.train[m:2 * m].sum() - self.train[0:m].sum()) / float(m) ** 2
+        self.s_0 = self.train[0:m] / self.a_0
+
+    def smooth(self, parameters, derivatives=False):
+        alpha, beta, gamma = parameters[:, 0], parameters[:, 1], parameters[:, 2]
+        Y = self.train
+        m, n = self.m, self.len_train
+        count = len(parameters)
+
+        # With u = Y / s, the state x = (a, b) follows the linear recursion x[i+1] = F x[i] + g u[i]
+        # and the level + trend is a[i] + b[i]. The seasons of m steps are known in advance,
+        # so every season is computed at once from the state at its start.
+        F = np.empty((count, 2, 2), dtype=DTYPE)
+        F[:, 0, 0] = F[:, 0, 1] = 1 - alpha
+        F[:, 1, 0] = -alpha * beta
+        F[:, 1, 1] = 1 - alpha * beta
+        g = np.column_stack((alpha, alpha * beta))
+        # derivatives by (alpha, beta, gamma)
+        d_F = np.zeros((3, count, 2, 2), dtype=DTYPE)
+        d_F[0, :, 0, 0] = d_F[0, :, 0, 1] = -1
+        d_F[0, :, 1, 0] = d_F[0, :, 1, 1] = -beta
+        d_F[1, :, 1, 0] = d_F[1, :, 1, 1] = -alpha
+        d_g = np.zeros((3, count, 2), dtype=DTYPE)
+        d_g[0, :, 0] = 1
+        d_g[0, :, 1] = beta
+        d_g[1, :, 1] = alpha
+
+        powers = np.empty((m + 1, count, 2, 2), dtype=DTYPE)  # F^k
+        powers[0] = np.eye(2)
+        d_powers = np.zeros((m + 1, 3, count, 2, 2), dtype=DTYPE)
+        for k in range(m):
+            powers[k + 1] = np.einsum('kij,kjl->kil', F, powers[k])
+            if derivatives:
+                d_powers[k + 1] = np.einsum('pkij,kjl->pkil', d_F, powers[k]) + \
+                    np.einsum('kij,pkjl->pkil', F, d_powers[k])
+        responses = np.einsum('tkij,kj->tki', powers[:m], g)  # F^k g
+        state_weights = powers[:m, :, 0, :] + powers[:m, :, 1, :]
+        impulses = np.zeros((m, count), dtype=DTYPE)
+        impulses[1:] = responses[:-1].sum(axis=2)
+        lags = np.subtract.outer(np.arange(m), np.arange(m))
+        input_weights = impulses[lags.clip(0)] * (lags > 0)[:, :, None]
+        if derivatives:
+            d_responses = np.einsum('tpkij,kj->tpki', d_powers[:m], g) + \
+                np.einsum('tkij,pkj->tpki', powers[:m], d_g)
+            d_state_weights = d_powers[:m, :, :, 0, :] + d_powers[:m, :, :, 1, :]
+            d_impulses = np.zeros((m, 3, count), dtype=DTYPE)
+            d_impulses[1:] = d_responses[:-1].sum(axis=3)
+            d_input_weights = d_impulses[lags.clip(0)] * (lags > 0)[:, :, None, None]
+
+        levels = np.empty((n, count), dtype=DTYPE)
+        s = np.empty((n + m, count), dtype=DTYPE)
+        s[:m] = self.s_0[:, None]
+        x = np.empty((count, 2), dtype=DTYPE)
+        x[:, 0] = self.a_0
+        x[:, 1] = self.b_0
+        d_levels = np.empty((n, 3, count), dtype=DTYPE)
+        d_s = np.zeros((n + m, 3, count), dtype=DTYPE)
+        d_x = np.zeros((3, count, 2), dtype=DTYPE)
+
+        for start in range(0, n, m):
+            length = min(m, n - start)
+            block = slice(start, start + length)
+            next_block = slice(start + m, start + m + length)
+            u = Y[block, None] / s[block]
+            levels[block] = np.einsum('tkj,kj->tk', state_weights[:length], x) + \
+                np.einsum('tjk,jk->tk', input_weights[:length, :length], u)
+            ratios = Y[block, None] / levels[block]
+            s[next_block] = s[block] + gamma * (ratios - s[block])
+
+            if derivatives:
+                d_u = -(u / s[block])[:, None] * d_s[block]
+                d_levels[block] = np.einsum('tpkj,kj->tpk', d_state_weights[:length], x) + \
+                    np.einsum('tkj,pkj->tpk', state_weights[:length], d_x) + \
+                    np.einsum('tjpk,jk->tpk', d_input_weights[:length, :length], u) + \
+                    np.einsum('tjk,jpk->tpk', input_weights[:length, :length], d_u)
+                d_x = np.einsum('pkij,kj->pki', d_powers[length], x) + \
+                    np.einsum('kij,pkj->pki', powers[length], d_x) + \
+                    np.einsum('tpki,tk->pki', d_responses[length - 1::-1], u) + \
+                    np.einsum('tki,tpk->pki', responses[length - 1::-1], d_u)
+                d_ratios = -(ratios / levels[block])[:, None] * d_levels[block]
+                d_s[next_block] = d_s[block] + gamma * (d_ratios - d_s[block])
+                d_s[next_block, 2] += ratios - s[block]
+
+            x = np.einsum('kij,kj->ki', powers[length], x) + \
+                np.einsum('tki,tk->ki', responses[length - 1::-1], u)
+
+        errors = Y[:, None] - levels * s[:n]
+
+        a, b = x[:, 0], x[:, 1]
+        steps = np.arange(self.len_test)
+        trend = a + (steps[:, None] + 1) * b
+        seasons = s[n + steps % m]
+        forecast = trend * seasons
+        if not derivatives:
+            return errors, forecast
+
+        d_errors = -(d_levels * s[:n, None] + levels[:, None] * d_s[:n])
+        d_trend = d_x[:, :, 0] + (steps[:, None, None] + 1) * d_x[:, :, 1]
+        d_forecast = d_trend * seasons[:, None] + trend[:, None] * d_s[n + steps % m]
+        return errors, forecast, d_errors, d_forecast
+
+
+class DoubleSeasonalObjective(FilterObjective):
+
+    """ Objective of :func:`~server.forecasting.statistical.holt_winters.double_seasonal`,
+    parameters (alpha, beta, gamma, delta, autocorrelation). The trend `beta` is not used.
+    `train` has to be at least one intraweek season long.
+
+    :param int m: intraday seasonality
+    :param int m2: intraweek seasonality
+    """
+
+    parameter_count = 5
+
+    def __init__(self, train, m, m2, test=[]):
+        FilterObjective.__init__(self, train, test)
+        self.m = m
+        self.m2 = m2
+        # the second seasonality has one value per day
+        self.days = int(m2 / m)
+        self.a_0 = self.train[0:m].sum() / float(m)
+        self.s_0 = self.train[0:m] / self.a_0
+        self.s2_0 = self.train[0:m2:m] / self.a_0
+
+        days = self.days
+        self.numerator = lag_polynomial([1, -1], seasonal_difference(m), seasonal_difference(days))
+        self.terms = (lag_polynomial(shift(1), seasonal_difference(m), seasonal_difference(days)),
+                      lag_polynomial(shift(days), [1, -1], seasonal_difference(m)),
+                      lag_polynomial(shift(m), [1, -1], seasonal_difference(days)))
+
+    def weights(self, parameters):
+        jacobian = np.zeros((3, 5, len(parameters)), dtype=DTYPE)
+        jacobian[0, 0] = jacobian[1, 2] = jacobian[2, 3] = 1
+        return parameters[:, [0, 2, 3]], jacobian
+
+    def warm_up(self, weights, errors, d_errors=None):
+        alpha, gamma, delta = weights[:, 0], weights[:, 1], weights[:, 2]
+        Y = self.train
+        m, days = self.m, self.days
+        s = np.empty((len(errors) + m, len(weights)), dtype=DTYPE)
+        s2 = np.empty((len(errors) + days, len(weights)), dtype=DTYPE)
+        s[:m] = self.s_0[:, None]
+        s2[:days] = self.s2_0[:, None]
+        a = np.zeros(len(weights), dtype=DTYPE) + self.a_0
+        d_s = np.zeros((len(errors) + m,) + weights.T.shape, dtype=DTYPE)
+        d_s2 = np.zeros((len(errors) + days,) + weights.T.shape, dtype=DTYPE)
+        d_a = np.zeros(weights.T.shape, dtype=DTYPE)
+        for i, e in enumerate(errors):
+            e[:] = Y[i] - a - s[i] - s2[i]
+            if d_errors is not None:
+                d_e = d_errors[i]
+                d_e[:] = -d_a - d_s[i] - d_s2[i]
+                d_a += alpha * d_e
+                d_a[0] += e
+                d_s[i + m] = d_s[i] + delta * d_e
+                d_s[i + m, 2] += e
+                d_s2[i + days] = d_s2[i] + gamma * d_e
+                d_s2[i + days, 1] += e
+            a += alpha * e
+            s[i + m] = s[i] + delta * e
+            s2[i + days] = s2[i] + gamma * e
+
+    def smooth(self, parameters, derivatives=False):
+        weights, jacobian = self.weights(parameters)
+        alpha, gamma, delta = weights[:, 0], weights[:, 1], weights[:, 2]
+        autocorrelation = parameters[:, 4]
+        m, m2, days = self.m, self.m2, self.days
+        n, h = self.len_train, self.len_test
+        count = len(parameters)
+
+        # e = Y - (a + s + s2), the one-step-forecast adds the autocorrelation of the previous e
+        e, d_e = self.filter_errors(weights, derivatives)
+        errors = e.copy()
+        errors[1:] -= autocorrelation * e[:-1]
+        if derivatives:
+            d_errors = chain(d_e, jacobian)
+            d_errors[1:] -= autocorrelation[:, None] * d_errors[:-1].copy()
+            d_errors[1:, 4] -= e[:-1]
+
+        forecast = np.empty((h, count), dtype=DTYPE)
+        d_forecast = np.empty((h, 3, count), dtype=DTYPE)
+        if h == 0:
+            if derivatives:
+                return errors, forecast, d_errors, chain(d_forecast, jacobian)
+            return errors, forecast
+
+        total = e.sum(axis=0)
+        a = self.a_0 + alpha * total
+        residues = (n + np.arange(m)) % m
+        error_sums = residue_sum(e, m)[residues]
+        seasons = self.s_0[residues][:, None] + delta * error_sums
+
+        # s2[j] = s2[j - days] + gamma e[j - days], known up to n + days
+        length = max(n + days, n + h)
+        extended = np.zeros((n + days, count), dtype=DTYPE)
+        extended[:n] = e
+        lagged_errors = lagged_sum(extended, days)
+        s2 = np.zeros((length, count), dtype=DTYPE)
+        s2[:n + days] = self.s2_0[np.arange(n + days) % days][:, None] + gamma * lagged_errors
+        if derivatives:
+            d_a = alpha * d_e.sum(axis=0)
+            d_a[0] += total
+            d_seasons = delta * residue_sum(d_e, m)[residues]
+            d_seasons[:, 2] += error_sums
+            d_extended = np.zeros((n + days, 3, count), dtype=DTYPE)
+            d_extended[:n] = d_e
+            d_s2 = np.zeros((length, 3, count), dtype=DTYPE)
+            d_s2[:n + days] = gamma * lagged_sum(d_extended, days)
+            d_s2[:n + days, 1] += lagged_errors
+
+        # forecasted values are smoothed, too. Then e[i] = s2[i + days - m2] - s2[i], which gives
+        # s2[j] = (1 - gamma) s2[j - days] + gamma s2[j - m2]
+        offset = n + days - m2
+        if h > days:
+            no_input = np.zeros(length - offset, dtype=DTYPE)
+            # derivative of the denominator by gamma
+            d_denominator = np.zeros(m2 + 1, dtype=DTYPE)
+            d_denominator[days] += 1
+            d_denominator[m2] -= 1
+            for column, weight in enumerate(gamma):
+                denominator = np.r_[1.0, np.zeros(m2)]
+                denominator[days] -= 1 - weight
+                denominator[m2] -= weight
+                continue_filter(no_input, s2[offset:, column], m2, [0.0], denominator)
+                if derivatives:
+                    continue_filter(no_input, d_s2[offset:, 0, column], m2, [0.0], denominator)
+                    continue_filter(s2[offset:, column], d_s2[offset:, 1, column], m2, -d_denominator, denominator)
+                    continue_filter(no_input, d_s2[offset:, 2, column], m2, [0.0], denominator)
+
+        lagged_seasons = s2[offset:offset + h]
+        e = lagged_seasons - s2[n:n + h]
+        level_changes = np.cumsum(e, axis=0) - e
+        season_changes = lagged_sum(e, m)
+        forecast = a + alpha * level_changes + seasons[np.arange(h) % m] + delta * season_changes + lagged_seasons
+        if not derivatives:
+            return errors, forecast
+
+        d_lagged_seasons = d_s2[offset:offset + h]
+        d_e = d_lagged_seasons - d_s2[n:n + h]
+        d_forecast = d_a + alpha * (np.cumsum(d_e, axis=0) - d_e) + d_seasons[np.arange(h) % m] + \
+            delta * lagged_sum(d_e, m) + d_lagged_seasons
+        d_forecast[:, 0] += level_changes
+        d_forecast[:, 2] += season_changes
+        return errors, forecast, d_errors, chain(d_forecast, jacobian)
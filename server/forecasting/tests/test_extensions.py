@@ -1,10 +1,14 @@
 import unittest
 import os
+import shutil
+import tempfile
 import numpy
+from mock import patch
 from server.forecasting.dataloader import DataLoader
 from server.settings import BASE_DIR, CYTHON_SUPPORT
 from server.forecasting.statistical import StatisticalForecast
-from server.forecasting.statistical.holt_winters import double_seasonal, multiplicative
+from server.forecasting.statistical import extension, holt_winters
+from server.forecasting.statistical.holt_winters import double_seasonal, multiplicative, additive, linear
 import time
 
 
@@ -13,6 +17,33 @@ DATA_PATH = BASE_DIR + sep + "server" + sep + \
     "forecasting" + sep + "simulation" + sep + "demodata"
 
 
+class ExtensionLoadingTest(unittest.TestCase):
+
+    """ Test that only an extension built for the current source and ABI is loaded"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.build_info = patch.object(extension, 'BUILD_INFO_PATH', os.path.join(self.directory, 'build.json'))
+        self.build_info.start()
+
+    def tearDown(self):
+        self.build_info.stop()
+        shutil.rmtree(self.directory)
+
+    def test_not_built(self):
+        self.assertFalse(extension.is_built())
+        self.assertIs(extension.load_methods(), holt_winters)
+
+    def test_outdated(self):
+        extension.write_build_info()
+        self.assertTrue(extension.is_built())
+
+        outdated = dict(extension.get_build_info(), source='0' * 40)
+        with patch.object(extension, 'get_build_info', return_value=outdated):
+            self.assertFalse(extension.is_built())
+            self.assertIs(extension.load_methods(), holt_winters)
+
+
 @unittest.skipIf(not CYTHON_SUPPORT, "cython support not activated")
 class ExtensionsTest(unittest.TestCase):
 
@@ -24,9 +55,11 @@ class ExtensionsTest(unittest.TestCase):
         # compile and link holtwinters_fast module
         build_holtwinters_extension()
         #make them accessible everywhere
-        global Cdouble_seasonal, Cmultiplicative
+        global Cdouble_seasonal, Cmultiplicative, Cadditive, Clinear
         from server.forecasting.statistical.holtwinters_fast import double_seasonal as Cdouble_seasonal
         from server.forecasting.statistical.holtwinters_fast import multiplicative as Cmultiplicative
+        from server.forecasting.statistical.holtwinters_fast import additive as Cadditive
+        from server.forecasting.statistical.holtwinters_fast import linear as Clinear
 
     def setUp(self):
         # dataset containing one year of data, sampled in 10 minute intervals
@@ -80,6 +113,70 @@ class ExtensionsTest(unittest.TestCase):
                     self.assertTrue(self.rmse(py_forecast, cy_forecast) < 0.5,
                                     "python and cython multiplicative-forecasts differ significantly.")
 
+    def test_additive(self):
+        input_length = 24 * 7 * 8
+        forecast = 24 * 7 * 4
+        for a in [0.0, 0.5, 1.0]:
+            for b in [0.0, 0.5, 1.0]:
+                py_forecast, p, py_insample = additive(
+                    self.dataset[:-input_length], 24, forecast,
+                    alpha=a, beta=b, gamma=b)
+                cy_forecast, p, cy_insample = Cadditive(
+                    self.dataset[:-input_length], 24, forecast,
+                    alpha=a, beta=b, gamma=b)
+
+                self.assertEqual(len(py_insample), len(cy_insample))
+                if abs(numpy.mean(py_forecast)) < 10 ** 9:
+                    self.assertTrue(self.rmse(py_forecast, cy_forecast) < 0.5,
+                                    "python and cython additive-forecasts differ significantly.")
+                    self.assertTrue(self.rmse(py_insample, cy_insample) < 0.5,
+                                    "python and cython additive one-step-forecasts differ significantly.")
+
+    def test_linear(self):
+        input_length = 24 * 7 * 8
+        forecast = 24 * 7 * 4
+        for a in [0.0, 0.5, 1.0]:
+            for b in [0.0, 0.5, 1.0]:
+                py_forecast, p, py_insample = linear(
+                    self.dataset[:-input_length], forecast, alpha=a, beta=b)
+                cy_forecast, p, cy_insample = Clinear(
+                    self.dataset[:-input_length], forecast, alpha=a, beta=b)
+
+                self.assertEqual(len(py_insample), len(cy_insample))
+                if abs(numpy.mean(py_forecast)) < 10 ** 9:
+                    self.assertTrue(self.rmse(py_forecast, cy_forecast) < 0.5,
+                                    "python and cython linear-forecasts differ significantly.")
+                    self.assertTrue(self.rmse(py_insample, cy_insample) < 0.5,
+                                    "python and cython linear one-step-forecasts differ significantly.")
+
+    def test_optimized_parameters(self):
+        train = self.dataset[:24 * 7 * 4]
+        py_forecast, py_parameters, insample = additive(train, 24, 24)
+        cy_forecast, cy_parameters, insample = Cadditive(train, 24, 24)
+        numpy.testing.assert_allclose(py_parameters, cy_parameters)
+
+        py_forecast, py_parameters, insample = linear(train, 24)
+        cy_forecast, cy_parameters, insample = Clinear(train, 24)
+        numpy.testing.assert_allclose(py_parameters, cy_parameters)
+
+    def test_double_seasonal_gradient(self):
+        from server.forecasting.statistical.holtwinters_fast import CDoubleSeasonal
+        train, test = self.dataset[:24 * 7 * 4], self.dataset[24 * 7 * 4:24 * 7 * 5]
+        holtwinters = CDoubleSeasonal(train, 24, 24 * 7, len(test), test_data=test)
+
+        for parameters in [(0.1, 0.0, 0.2, 0.2, 0.9), (0.5, 0.0, 0.3, 0.1, 0.3)]:
+            parameters = numpy.array(parameters)
+            mse, gradient = holtwinters.MSE_and_gradient(parameters)
+            self.assertAlmostEqual(mse, holtwinters.MSE(parameters))
+            # beta is not used by the double seasonal method
+            self.assertEqual(gradient[1], 0.0)
+            for i in [0, 2, 3, 4]:
+                step = numpy.zeros(len(parameters))
+                step[i] = 1e-6
+                central = (holtwinters.MSE(parameters + step) - holtwinters.MSE(parameters - step)) / 2e-6
+                self.assertAlmostEqual(gradient[i], central, delta=1e-4 * max(1.0, abs(central)),
+                                       msg="gradient %d differs from central differences" % i)
+
     def test_performance(self):
         input_length = 24 * 7 * 8
         forecast = 24 * 7 * 4
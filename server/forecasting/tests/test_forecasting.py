@@ -0,0 +1,215 @@
+import time
+import unittest
+from datetime import datetime
+
+from mock import patch
+from django.test import TestCase
+from django.utils.timezone import utc
+
+from server.models import DeviceConfiguration, SensorLatestValue
+from server.functions import configuration_registry
+from server.forecasting import Forecast, ForecastQueue, RollingForecast, get_forecasts, get_initial_state, \
+    run_queued_forecast
+from server.forecasting.simulation.devices.consumers import SimulatedThermalConsumer, SimulatedElectricalConsumer
+from server.forecasting.tests.test_vectorized import outside_temperature, electrical_consumption
+
+initial_time = 1356998400  # Tuesday 1st January 2013
+step_size = 15 * 60
+forward = 6 * 60 * 60
+
+
+def fake_forecast(forecast_id, initial_time, kwargs, progress, cancelled):
+    """ replaces :func:`server.forecasting.run_queued_forecast` in the worker processes.
+    Returns `initial_time` at once or, if `kwargs` contains ``wait``, when it is cancelled."""
+    if kwargs.get('wait'):
+        progress[forecast_id] = 50.0
+        timeout = time.time() + 10
+        while forecast_id not in cancelled and time.time() < timeout:
+            time.sleep(0.01)
+        return None
+    return initial_time
+
+
+def wait_until(condition, timeout=10):
+    timeout = time.time() + timeout
+    while not condition() and time.time() < timeout:
+        time.sleep(0.01)
+    return condition()
+
+
+class GetForecastsTests(unittest.TestCase):
+
+    def test_no_variants(self):
+        self.assertEqual(get_forecasts(0, []), [])
+        self.assertFalse(Forecast.run_batch([]))
+
+
+class RunQueuedForecastTests(unittest.TestCase):
+
+    @patch('server.forecasting.Forecast')
+    def test_configurations_are_reloaded(self, forecast):
+        versions = []
+
+        def create_forecast(*args, **kwargs):
+            versions.append(configuration_registry.version)
+            return forecast.return_value
+
+        forecast.side_effect = create_forecast
+        forecast.return_value.run.return_value.get.return_value = 'result'
+        version = configuration_registry.version
+        self.assertEqual(run_queued_forecast(1, initial_time, {}, {}, {}), 'result')
+        # the forecast reads the configurations changed after the worker was forked
+        self.assertEqual(versions, [version + 1])
+
+
+@patch('server.forecasting.run_queued_forecast', fake_forecast)
+class ForecastQueueTests(unittest.TestCase):
+
+    def setUp(self):
+        self.queue = ForecastQueue(processes=1, ttl=60)
+        self.queue.start_pool()
+
+    def tearDown(self):
+        self.queue.pool.terminate()
+        self.queue.pool.join()
+        self.queue.manager.shutdown()
+
+    def test_schedule(self):
+        forecast_id = self.queue.schedule_new(1234)
+        self.assertTrue(wait_until(lambda: self.queue.get_progress(forecast_id) == 100.0))
+        self.assertEqual(self.queue.get_by_id(forecast_id), 1234)
+        # results are only returned once
+        self.assertIsNone(self.queue.get_by_id(forecast_id))
+        self.assertIsNone(self.queue.get_progress(forecast_id))
+
+    def test_progress_and_cancel(self):
+        forecast_id = self.queue.schedule_new(0, wait=True)
+        self.assertTrue(wait_until(lambda: self.queue.get_progress(forecast_id) == 50.0))
+        self.assertIsNone(self.queue.get_by_id(forecast_id))
+
+        self.assertTrue(self.queue.cancel(forecast_id))
+        self.assertFalse(self.queue.cancel(forecast_id))
+        self.assertIsNone(self.queue.get_progress(forecast_id))
+        self.assertIsNone(self.queue.get_by_id(forecast_id))
+        # the cancelled job is dropped, when its worker is done
+        self.assertTrue(wait_until(lambda: self.queue.get_by_id(forecast_id) is None and
+                                   forecast_id not in self.queue.jobs))
+        self.assertNotIn(forecast_id, self.queue.cancelled)
+
+    def test_finish_time_is_recorded(self):
+        forecast_id = self.queue.schedule_new(0)
+        self.assertTrue(wait_until(lambda: self.queue.jobs[forecast_id]['finished'] is not None))
+        self.assertLessEqual(self.queue.jobs[forecast_id]['finished'], time.time())
+
+    def test_expired_results_are_dropped(self):
+        self.queue.ttl = 0
+        forecast_id = self.queue.schedule_new(0)
+        self.assertTrue(wait_until(lambda: self.queue.jobs[forecast_id]['finished'] is not None))
+        time.sleep(0.01)
+
+        self.assertIsNone(self.queue.get_by_id(forecast_id))
+        self.assertNotIn(forecast_id, self.queue.jobs)
+        self.assertNotIn(forecast_id, self.queue.progress)
+
+    def test_unexpired_results_are_kept(self):
+        forecast_id = self.queue.schedule_new(42)
+        self.assertTrue(wait_until(lambda: self.queue.jobs[forecast_id]['finished'] is not None))
+        with self.queue.lock:
+            self.queue.evict_expired()
+        self.assertEqual(self.queue.get_by_id(forecast_id), 42)
+
+
+def get_data(result):
+    return dict((sensor['id'], sensor['data']) for sensor in result['sensors'])
+
+
+class RollingForecastTests(TestCase):
+
+    def setUp(self):
+        for patcher in [patch.object(SimulatedThermalConsumer, 'get_outside_temperature', outside_temperature),
+                        patch.object(SimulatedElectricalConsumer, 'get_consumption_power', electrical_consumption)]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.configurations = list(DeviceConfiguration.objects.all())
+        # the latest values are the state after one step of a forecast from the default state
+        SensorLatestValue.objects.all().delete()
+        forecast = Forecast(initial_time, self.configurations, forward=step_size).run()
+        timestamp = datetime.utcfromtimestamp(initial_time).replace(tzinfo=utc)
+        for sensor in forecast.measurements.sensors_in_diagram:
+            value = forecast.measurements.get_value_at(sensor, 0)
+            if value is not None:
+                SensorLatestValue(sensor_id=sensor.id, value=value, timestamp=timestamp).save()
+
+    def test_advance(self):
+        forecast = Forecast(initial_time, self.configurations, forward=forward).run()
+        self.assertTrue(forecast.can_advance(initial_time + 4 * step_size))
+        self.assertFalse(forecast.can_advance(initial_time + 4 * step_size + 1))
+        self.assertFalse(forecast.can_advance(initial_time - step_size))
+        self.assertFalse(forecast.can_advance(initial_time + forward))
+
+        forecast.advance(initial_time + 4 * step_size)
+        # a longer fresh forecast contains the same values after the first four steps
+        expected = get_data(Forecast(initial_time, self.configurations, forward=forward + 4 * step_size).run().get())
+        result = forecast.get()
+        self.assertEqual(result['start_timestamp'], initial_time + 4 * step_size)
+        self.assertTrue(any(len(data) == forward / step_size for data in get_data(result).values()))
+        for sensor_id, data in get_data(result).items():
+            self.assertEqual(len(data), len(expected[sensor_id][4:]))
+            for value, expected_value in zip(data, expected[sensor_id][4:]):
+                self.assertAlmostEqual(value, expected_value, places=6)
+
+    def get_state(self, forecast, deviation):
+        """ returns the initial state with the values, which `forecast` computed for the step before
+        the fourth step, the values are multiplied by (1 + `deviation`) and increased by `deviation`"""
+        devices, sensor_values = get_initial_state()
+        index = forecast.get_step_index(initial_time + 4 * step_size) - 1
+        compared = 0
+        for device_id, values in sensor_values.items():
+            for position, (sensor, value) in enumerate(values):
+                forecasted = forecast.measurements.get_value_at(sensor, index)
+                if forecasted is not None:
+                    values[position] = (sensor, forecasted * (1 + deviation) + deviation)
+                    compared += sensor.setter != ''
+        self.assertTrue(compared > 0)
+        return (devices, sensor_values)
+
+    def get_rolling(self, deviation, configurations=None, code=None):
+        """ returns the first and the second forecast of a :class:`RollingForecast`,
+        the second starts four steps later"""
+        rolling = RollingForecast()
+        rolling.get(initial_time, self.configurations, None, forward)
+        first = rolling.forecast
+        with patch('server.forecasting.get_initial_state', return_value=self.get_state(first, deviation)):
+            rolling.get(initial_time + 4 * step_size,
+                        configurations if configurations is not None else self.configurations, code, forward)
+        return (first, rolling.forecast)
+
+    def test_advance_within_tolerance(self):
+        first, second = self.get_rolling(0.5 * RollingForecast().tolerance)
+        self.assertIs(first, second)
+        self.assertEqual(second.get()['start_timestamp'], initial_time + 4 * step_size)
+
+    def test_recompute_above_tolerance(self):
+        first, second = self.get_rolling(2 * RollingForecast().tolerance)
+        self.assertIsNot(first, second)
+        self.assertEqual(second.get()['start_timestamp'], initial_time + 4 * step_size)
+
+    def test_recompute_without_measurements(self):
+        rolling = RollingForecast()
+        rolling.get(initial_time, self.configurations, None, forward)
+        first = rolling.forecast
+        SensorLatestValue.objects.all().delete()
+        rolling.get(initial_time + 4 * step_size, self.configurations, None, forward)
+        self.assertIsNot(first, rolling.forecast)
+
+    def test_recompute_after_changes(self):
+        configurations = [DeviceConfiguration(device_id=configuration.device_id, key=configuration.key,
+                                              value=configuration.value, value_type=configuration.value_type)
+                          for configuration in self.configurations]
+        configurations[0].value = str(float(configurations[0].value) + 1)
+        first, second = self.get_rolling(0.0, configurations=configurations)
+        self.assertIsNot(first, second)
+
+        first, second = self.get_rolling(0.0, code='# changed')
+        self.assertIsNot(first, second)
+
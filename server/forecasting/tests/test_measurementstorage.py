@@ -0,0 +1,158 @@
+import unittest
+import tempfile
+import shutil
+import struct
+from datetime import datetime
+
+import numpy as np
+from mock import patch
+from django.utils.timezone import utc
+
+from server.models import Device, Sensor
+from server.devices.base import BaseEnvironment
+from server.forecasting.measurementstorage import ColumnarMeasurementStorage, SensorValueWriter, encode_copy_binary, \
+    write_sensor_values
+from server.forecasting.simulation.devices.storages import SimulatedHeatStorage, SimulatedPowerMeter
+
+
+def create_sensors():
+    hs = Device(id=1, name='Heat Storage', device_type=Device.HS)
+    pm = Device(id=2, name='Power Meter', device_type=Device.PM)
+    sensors = [Sensor(id=1, device=hs, key='get_temperature', in_diagram=True),
+               Sensor(id=2, device=pm, key='purchased', in_diagram=False),
+               Sensor(id=3, device=pm, key='total_purchased', in_diagram=True),
+               Sensor(id=4, device=pm, key='not_available', in_diagram=True)]
+    return ([hs, pm], sensors)
+
+
+class ColumnarMeasurementStorageTests(unittest.TestCase):
+
+    def setUp(self):
+        self.env = BaseEnvironment(forecast=True)
+        self.heat_storage = SimulatedHeatStorage(1, self.env)
+        self.power_meter = SimulatedPowerMeter(2, self.env)
+        self.devices = [self.heat_storage, self.power_meter]
+
+        patcher = patch('server.forecasting.measurementstorage.get_devices_and_sensors', create_sensors)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fill(self, storage, count):
+        for i in range(count):
+            self.heat_storage.set_temperature(20 + i)
+            self.power_meter.total_purchased = i
+            storage.take_and_cache()
+
+    def test_take_and_cache(self):
+        storage = ColumnarMeasurementStorage(self.env, self.devices, 4)
+        self.fill(storage, 4)
+
+        output = storage.get_cached()
+        self.assertEqual([sensor['id'] for sensor in output], [1, 3, 4])
+        self.assertEqual(output[0]['data'].tolist(), [20.0, 21.0, 22.0, 23.0])
+        self.assertEqual(output[1]['data'].tolist(), [0.0, 1.0, 2.0, 3.0])
+        self.assertEqual(output[2]['data'].tolist(), [])
+        # zero-copy views of the buffer
+        self.assertIs(output[0]['data'].base, storage.forecast_data)
+
+    def test_grows_and_keeps_views(self):
+        storage = ColumnarMeasurementStorage(self.env, self.devices, 2)
+        self.fill(storage, 2)
+        values = storage.get_cached()[1]['data']
+
+        storage.drop_first(1)
+        self.fill(storage, 5)
+
+        self.assertEqual(values.tolist(), [0.0, 1.0])
+        self.assertEqual(storage.get_cached()[1]['data'].tolist(), [1.0, 0.0, 1.0, 2.0, 3.0, 4.0])
+        self.assertEqual(storage.get_last(storage.sensors_in_diagram[1]), 4.0)
+        self.assertEqual(storage.get_value_at(storage.sensors_in_diagram[1], 0), 1.0)
+
+    def test_cache_records(self):
+        storage = ColumnarMeasurementStorage(self.env, self.devices, 3)
+        storage.cache_records([np.array([1, 2, 3], dtype=np.float32), np.array([4, 5, 6], dtype=np.float32), None])
+
+        output = storage.get_cached()
+        self.assertEqual(output[0]['data'].tolist(), [1.0, 2.0, 3.0])
+        self.assertEqual(output[1]['data'].tolist(), [4.0, 5.0, 6.0])
+        self.assertEqual(output[2]['data'].tolist(), [])
+
+    def test_memory_mapped(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        storage = ColumnarMeasurementStorage(self.env, self.devices, 8, directory=directory)
+        self.fill(storage, 3)
+
+        self.assertIsInstance(storage.forecast_data, np.memmap)
+        self.assertEqual(storage.get_cached()[0]['data'].tolist(), [20.0, 21.0, 22.0])
+
+
+class SensorValueWriterTests(unittest.TestCase):
+
+    def test_encode_copy_binary(self):
+        timestamp = datetime(2000, 1, 2, 0, 0, 0, 5).replace(tzinfo=utc)
+        content = encode_copy_binary([(7, 1.5, timestamp)]).read()
+
+        self.assertEqual(content[:11], 'PGCOPY\n\xff\r\n\x00')
+        self.assertEqual(struct.unpack('>hiiidiq', content[19:-2]), (3, 4, 7, 8, 1.5, 8, 24 * 3600 * 1000000 + 5))
+        self.assertEqual(content[-2:], struct.pack('>h', -1))
+
+    @patch('server.forecasting.measurementstorage.write_sensor_values')
+    def test_batches(self, write_sensor_values):
+        writer = SensorValueWriter(batch_size=4, flush_interval=60, queue_size=10)
+        writer.start()
+
+        writer.put([(1, 1.0, None), (2, 2.0, None)])
+        writer.put([(1, 3.0, None), (2, 4.0, None)])
+        writer.put([(1, 5.0, None)])
+        writer.flush()
+        writer.stop()
+
+        batches = [call[0][0] for call in write_sensor_values.call_args_list]
+        self.assertEqual(batches[0], [(1, 1.0, None), (2, 2.0, None), (1, 3.0, None), (2, 4.0, None)])
+        self.assertEqual(batches[1], [(1, 5.0, None)])
+        self.assertFalse(writer.is_alive())
+
+    @patch('server.forecasting.measurementstorage.write_sensor_values')
+    def test_flush_interval(self, write_sensor_values):
+        writer = SensorValueWriter(batch_size=1000, flush_interval=0.01, queue_size=10)
+        writer.start()
+        writer.put([(1, 1.0, None)])
+        writer.queue.join()
+        writer.stop()
+
+        write_sensor_values.assert_any_call([(1, 1.0, None)])
+
+
+@patch('server.forecasting.measurementstorage.invalidate_forecast_cache')
+@patch('server.forecasting.measurementstorage.ensure_partition')
+@patch('server.forecasting.measurementstorage.connection')
+class WriteSensorValuesTests(unittest.TestCase):
+
+    def setUp(self):
+        self.events = []
+        self.timestamp = datetime(2014, 6, 1).replace(tzinfo=utc)
+        for name in ['transaction', 'update_latest_sensor_values', 'live_snapshot']:
+            patcher = patch('server.forecasting.measurementstorage.%s' % name)
+            setattr(self, name, patcher.start())
+            self.addCleanup(patcher.stop)
+        self.transaction.atomic.return_value.__exit__.side_effect = \
+            lambda *args: self.events.append('commit' if args[0] is None else 'rollback')
+        self.live_snapshot.update.side_effect = lambda latest: self.events.append('snapshot')
+
+    def test_snapshot_updated_after_commit(self, *mocks):
+        latest = {1: (2.0, self.timestamp)}
+        self.update_latest_sensor_values.side_effect = lambda values: self.events.append('update') or latest
+
+        write_sensor_values([(1, 1.0, self.timestamp), (1, 2.0, self.timestamp)])
+        self.assertEqual(self.events, ['update', 'commit', 'snapshot'])
+        self.live_snapshot.update.assert_called_once_with(latest)
+
+    def test_snapshot_unchanged_after_rollback(self, *mocks):
+        self.update_latest_sensor_values.side_effect = ValueError()
+
+        self.assertRaises(ValueError, write_sensor_values, [(1, 1.0, self.timestamp)])
+        self.assertEqual(self.events, ['rollback'])
+        self.assertFalse(self.live_snapshot.update.called)
+
@@ -0,0 +1,43 @@
+import unittest
+import math
+
+import numpy as np
+from scipy.optimize import fmin_l_bfgs_b
+
+from server.forecasting.statistical.multistart import fit_double_seasonal, latin_hypercube, BOUNDARIES
+from server.forecasting.statistical.objective import DoubleSeasonalObjective
+
+m = 24
+m2 = 24 * 7
+
+
+class MultiStartTest(unittest.TestCase):
+
+    def setUp(self):
+        random = np.random.RandomState(1)
+        series = [10.0 + 3 * math.sin(i * 2 * math.pi / m) + math.sin(i * 2 * math.pi / m2) + random.rand()
+                  for i in range(m2 * 4)]
+        self.train, self.test = series[:-m2], series[-m2:]
+        self.objective = DoubleSeasonalObjective(self.train, m, m2, self.test)
+
+    def test_latin_hypercube(self):
+        points = latin_hypercube(10, 4, np.random.RandomState(0))
+        self.assertEqual(points.shape, (10, 4))
+        # one point per interval in every dimension
+        for column in points.T:
+            self.assertEqual(sorted((column * 10).astype(int)), range(10))
+
+    def test_fit(self):
+        parameters = fit_double_seasonal(self.train, self.test, m, m2, samples=16, candidates=2, processes=1)
+        for parameter, (lower, upper) in zip(parameters, BOUNDARIES):
+            self.assertTrue(lower <= parameter <= upper)
+
+        # not worse than the single search of double_seasonal
+        single = fmin_l_bfgs_b(self.objective.value_and_gradient, x0=[0.1, 0.0, 0.2, 0.2, 0.9],
+                               bounds=BOUNDARIES, factr=10 ** 3)[1]
+        self.assertLessEqual(self.objective.MSE(parameters), single + 1e-9)
+
+    def test_processes(self):
+        serial = fit_double_seasonal(self.train, self.test, m, m2, samples=16, candidates=2, processes=1)
+        parallel = fit_double_seasonal(self.train, self.test, m, m2, samples=16, candidates=2, processes=2)
+        np.testing.assert_allclose(serial, parallel)
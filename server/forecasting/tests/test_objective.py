@@ -0,0 +1,97 @@
+import unittest
+import math
+
+import numpy as np
+
+from server.forecasting.statistical.holt_winters import linear, additive, multiplicative, double_seasonal
+from server.forecasting.statistical.objective import LinearObjective, AdditiveObjective, MultiplicativeObjective,\
+    DoubleSeasonalObjective
+
+m = 24
+m2 = 24 * 7
+
+
+def reference_MSE(method, train, test, parameters, *seasons):
+    """ runs the smoothing method with fixed parameters and calculates the MSE from its results"""
+    forecast, p, onestepfcs = method(list(train), *(seasons + (len(test),) + tuple(parameters)))
+    mse_insample = np.mean((np.array(train) - np.array(onestepfcs[:len(train)])) ** 2)
+    return mse_insample + np.mean((np.array(test) - np.array(forecast)) ** 2)
+
+
+class ObjectiveTest(unittest.TestCase):
+
+    def setUp(self):
+        random = np.random.RandomState(0)
+        self.series = [10.0 + 3 * math.sin(i * 2 * math.pi / m) + math.sin(i * 2 * math.pi / m2) + random.rand()
+                       for i in range(m2 * 4)]
+
+    def assertEqualMSE(self, objective, method, train, test, parameters, *seasons):
+        self.assertAlmostEqual(objective.MSE(parameters),
+                               reference_MSE(method, train, test, parameters, *seasons), places=6)
+
+    def test_linear(self):
+        train, test = self.series[:-m], self.series[-m:]
+        objective = LinearObjective(train, test)
+        for parameters in [(0.3, 0.1), (0.9, 0.5), (0.0, 0.0)]:
+            self.assertEqualMSE(objective, linear, train, test, parameters)
+
+    def test_additive(self):
+        train, test = self.series[:-m], self.series[-m:]
+        objective = AdditiveObjective(train, m, test)
+        for parameters in [(0.3, 0.1, 0.2), (0.9, 0.5, 0.1), (0.0, 0.0, 1.0)]:
+            self.assertEqualMSE(objective, additive, train, test, parameters, m)
+
+    def test_multiplicative(self):
+        train, test = self.series[:-2 * m], self.series[-2 * m:]
+        objective = MultiplicativeObjective(train, m, test)
+        for parameters in [(0.1, 0.01, 0.2), (0.5, 0.05, 0.5), (1.0, 0.0, 0.0)]:
+            self.assertEqualMSE(objective, multiplicative, train, test, parameters, m)
+        # the last season is incomplete
+        objective = MultiplicativeObjective(train[:-5], m, test)
+        self.assertEqualMSE(objective, multiplicative, train[:-5], test, (0.5, 0.05, 0.5), m)
+
+    def test_double_seasonal(self):
+        train, test = self.series[:-m2], self.series[-m2:]
+        objective = DoubleSeasonalObjective(train, m, m2, test)
+        for parameters in [(0.1, 0.0, 0.2, 0.2, 0.9), (0.5, 0.0, 0.5, 0.1, 0.3), (0.9, 0.0, 0.05, 0.7, 0.0)]:
+            self.assertEqualMSE(objective, double_seasonal, train, test, parameters, m, m2)
+
+    def test_batch(self):
+        train, test = self.series[:-m2], self.series[-m2:]
+        objective = DoubleSeasonalObjective(train, m, m2, test)
+        batch = np.array([(0.1, 0.0, 0.2, 0.2, 0.9), (0.5, 0.0, 0.5, 0.1, 0.3)])
+        losses = objective.losses(batch)
+        for parameters, loss in zip(batch, losses):
+            self.assertAlmostEqual(objective.MSE(parameters), loss)
+
+    def assertGradient(self, objective, parameters, criterion="MSE"):
+        parameters = np.array(parameters)
+        loss, gradient = objective.value_and_gradient(parameters, criterion)
+        self.assertAlmostEqual(loss, objective.losses(parameters, criterion)[0])
+        for i in range(len(parameters)):
+            step = np.zeros(len(parameters))
+            step[i] = 1e-6
+            central = (objective.losses(parameters + step, criterion)[0] -
+                       objective.losses(parameters - step, criterion)[0]) / 2e-6
+            self.assertAlmostEqual(gradient[i], central, delta=1e-4 * max(1.0, abs(central)))
+
+    def test_gradient(self):
+        train, test = self.series[:-m], self.series[-m:]
+        self.assertGradient(LinearObjective(train, test), (0.3, 0.1))
+        self.assertGradient(AdditiveObjective(train, m, test), (0.3, 0.1, 0.2))
+        self.assertGradient(AdditiveObjective(train, m, test), (0.3, 0.1, 0.2), "MASE")
+
+        train, test = self.series[:-2 * m - 5], self.series[-2 * m:]
+        self.assertGradient(MultiplicativeObjective(train, m, test), (0.3, 0.02, 0.4))
+
+        objective = DoubleSeasonalObjective(self.series[:-m2], m, m2, self.series[-m2:])
+        self.assertGradient(objective, (0.1, 0.0, 0.2, 0.2, 0.9))
+        # beta is not used by the double seasonal method
+        loss, gradient = objective.value_and_gradient(np.array([0.1, 0.0, 0.2, 0.2, 0.9]))
+        self.assertEqual(gradient[1], 0.0)
+
+    def test_fit(self):
+        forecast, parameters, insample = double_seasonal(self.series, m, m2, m2)
+        self.assertEqual(len(forecast), m2)
+        for parameter in parameters:
+            self.assertTrue(0.0 <= parameter <= 1.0)
@@ -0,0 +1,67 @@
+import unittest
+
+from server.models import DeviceConfiguration
+from server.forecasting.resultcache import ForecastCache, get_forecast_key
+
+
+def create_result(value):
+    return {'start': 0, 'step': 900, 'end': 900, 'sensors': [{'id': 1, 'data': [value]}]}
+
+
+class ForecastCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = ForecastCache(max_size=2)
+
+    def test_get_put(self):
+        self.assertIsNone(self.cache.get('a'))
+        self.cache.put('a', create_result(1.0))
+        self.assertEqual(self.cache.get('a'), create_result(1.0))
+
+    def test_least_recently_used_is_evicted(self):
+        self.cache.put('a', create_result(1.0))
+        self.cache.put('b', create_result(2.0))
+        self.cache.get('a')
+        self.cache.put('c', create_result(3.0))
+
+        self.assertEqual(len(self.cache), 2)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertIsNotNone(self.cache.get('a'))
+        self.assertIsNotNone(self.cache.get('c'))
+
+    def test_cached_result_can_not_be_changed(self):
+        self.cache.put('a', create_result(1.0))
+        result = self.cache.get('a')
+        result['status'] = 'finished'
+        result['sensors'][0]['device'] = 'changed'
+
+        self.assertEqual(self.cache.get('a'), create_result(1.0))
+
+    def test_clear(self):
+        self.cache.put('a', create_result(1.0))
+        self.cache.clear()
+        self.assertIsNone(self.cache.get('a'))
+
+
+class ForecastKeyTests(unittest.TestCase):
+
+    def create_configurations(self, capacity):
+        return [DeviceConfiguration(device_id=1, key='capacity', value=capacity, value_type=DeviceConfiguration.INT),
+                DeviceConfiguration(device_id=2, key='max_gas_input', value='19.0', value_type=DeviceConfiguration.FLOAT)]
+
+    def get_key(self, initial_time=1356998400, capacity='2500', code=''):
+        return get_forecast_key(initial_time, self.create_configurations(capacity), code,
+                                14 * 24 * 3600.0, 'demo', False)
+
+    def test_order_independent(self):
+        configurations = self.create_configurations('2500')
+        key = get_forecast_key(1356998400, configurations, '', 14 * 24 * 3600.0, 'demo', False)
+        reversed_key = get_forecast_key(1356998400, configurations[::-1], '', 14 * 24 * 3600.0, 'demo', False)
+        self.assertEqual(key, reversed_key)
+
+    def test_inputs_change_key(self):
+        key = self.get_key()
+        self.assertEqual(key, self.get_key())
+        self.assertNotEqual(key, self.get_key(initial_time=1356998400 + 60))
+        self.assertNotEqual(key, self.get_key(capacity='3000'))
+        self.assertNotEqual(key, self.get_key(code='pass'))
@@ -0,0 +1,139 @@
+import unittest
+import math
+from collections import namedtuple
+
+from mock import patch
+
+from server.devices.base import BaseEnvironment
+from server.forecasting.simulation.devices.producers import SimulatedCogenerationUnit, SimulatedPeakLoadBoiler
+from server.forecasting.simulation.devices.storages import SimulatedHeatStorage, SimulatedPowerMeter
+from server.forecasting.simulation.devices.consumers import SimulatedThermalConsumer, SimulatedElectricalConsumer
+from server.forecasting.vectorized import VectorizedScenario, CompilationError
+
+initial_time = 1356998400  # Tuesday 1st January 2013
+step_size = 15 * 60.0
+steps = 3 * 24 * 4  # three days
+
+sensors = [('hs', 'get_temperature'), ('pm', 'purchased'), ('pm', 'fed_in_electricity'),
+           ('cu', 'workload'), ('cu', 'current_gas_consumption'), ('plb', 'workload'),
+           ('plb', 'current_gas_consumption'), ('tc', 'get_consumption_power'),
+           ('tc', 'get_warmwater_consumption_power'), ('tc', 'temperature_room'),
+           ('tc', 'get_outside_temperature'), ('ec', 'get_consumption_power')]
+
+
+def outside_temperature(self):
+    return 2.0 + 6.0 * math.sin(self.env.now / 86400.0 * 2 * math.pi)
+
+
+def electrical_consumption(self):
+    return 4.0 + 3.0 * math.cos(self.env.now / 43200.0 * 2 * math.pi)
+
+
+def create_scenario(env):
+    device_list = [SimulatedHeatStorage(0, env), SimulatedPowerMeter(1, env),
+                   SimulatedCogenerationUnit(2, env), SimulatedPeakLoadBoiler(3, env),
+                   SimulatedThermalConsumer(4, env), SimulatedElectricalConsumer(5, env)]
+    for device in device_list:
+        device.attach_dependent_devices_in(device_list)
+    device_list[0].set_temperature(60.0)
+    return namedtuple("Devices", [dev.acronym for dev in device_list])(*device_list)
+
+
+def sample(devices, acronym, key):
+    value = getattr(getattr(devices, acronym), key, None)
+    if value is not None and hasattr(value, '__call__'):
+        value = value()
+    return value
+
+
+@patch.object(SimulatedThermalConsumer, 'get_outside_temperature', outside_temperature)
+@patch.object(SimulatedElectricalConsumer, 'get_consumption_power', electrical_consumption)
+class VectorizedScenarioTests(unittest.TestCase):
+
+    def create_env(self):
+        return BaseEnvironment(initial_time=initial_time, step_size=step_size, demomode=True)
+
+    def test_matches_device_stepping(self):
+        env = self.create_env()
+        devices = create_scenario(env)
+        expected = [[] for sensor in sensors]
+        for step in range(steps):
+            for device in devices:
+                device.step()
+            for index, (acronym, key) in enumerate(sensors):
+                value = sample(devices, acronym, key)
+                if value is not None:
+                    expected[index].append(float(value))
+            env.now += env.step_size
+
+        vectorized_env = self.create_env()
+        vectorized_devices = create_scenario(vectorized_env)
+        engine = VectorizedScenario([vectorized_devices], vectorized_env)
+        records = engine.run(steps, sensors)[0]
+        engine.write_back()
+
+        for index, (acronym, key) in enumerate(sensors):
+            if expected[index] == []:
+                self.assertIsNone(records[index])
+                continue
+            self.assertEqual(len(records[index]), steps)
+            for expected_value, value in zip(expected[index], records[index]):
+                self.assertAlmostEqual(expected_value, value, places=2,
+                                       msg="%s.%s differs" % (acronym, key))
+
+        self.assertEqual(vectorized_env.now, env.now)
+        self.assertAlmostEqual(vectorized_devices.hs.get_temperature(), devices.hs.get_temperature())
+        self.assertAlmostEqual(vectorized_devices.cu.total_gas_consumption, devices.cu.total_gas_consumption)
+        self.assertAlmostEqual(vectorized_devices.pm.total_purchased, devices.pm.total_purchased)
+        self.assertAlmostEqual(vectorized_devices.tc.total_consumed, devices.tc.total_consumed)
+        self.assertEqual(vectorized_devices.cu.power_on_count, devices.cu.power_on_count)
+        self.assertEqual(vectorized_devices.plb.power_on_count, devices.plb.power_on_count)
+
+    def test_overwrite_workload(self):
+        env = self.create_env()
+        devices = create_scenario(env)
+        devices.cu.overwrite_workload = 0.5
+
+        engine = VectorizedScenario([devices], env)
+        records = engine.run(8, [('cu', 'workload')])[0]
+
+        self.assertTrue(all(value == 50.0 for value in records[0]))
+
+    def test_electrical_driven_not_supported(self):
+        env = self.create_env()
+        devices = create_scenario(env)
+        devices.cu.thermal_driven = False
+
+        self.assertRaises(CompilationError, VectorizedScenario, [devices], env)
+
+    def test_unknown_sensor_not_supported(self):
+        env = self.create_env()
+        engine = VectorizedScenario([create_scenario(env)], env)
+
+        self.assertRaises(CompilationError, engine.run, 8, [('hs', 'get_energy_capacity')])
+        self.assertEqual(env.now, initial_time)
+
+    def test_variants_match_single_scenarios(self):
+        capacities = [1500, 2500, 4000]
+        expected = []
+        for capacity in capacities:
+            env = self.create_env()
+            devices = create_scenario(env)
+            devices.hs.config['capacity'] = capacity
+            expected.append(VectorizedScenario([devices], env).run(steps, sensors)[0])
+
+        env = self.create_env()
+        scenarios = []
+        for capacity in capacities:
+            devices = create_scenario(env)
+            devices.hs.config['capacity'] = capacity
+            scenarios.append(devices)
+        records = VectorizedScenario(scenarios, env).run(steps, sensors)
+
+        self.assertEqual(len(records), len(capacities))
+        for expected_records, variant_records in zip(expected, records):
+            for expected_values, values in zip(expected_records, variant_records):
+                if expected_values is None:
+                    self.assertIsNone(values)
+                else:
+                    self.assertEqual(expected_values.tolist(), values.tolist())
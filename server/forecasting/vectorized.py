@@ -0,0 +1,497 @@
+"""
+This module contains a vectorized engine for forecasts.
+
+Instead of calling ``step()`` on every device object, the device graph of a scenario
+(see :func:`server.forecasting.get_initialized_scenario`) is compiled into flat NumPy state arrays.
+All values, which only depend on the simulated time (outside temperatures, warm water
+and electrical demands, target room temperatures), are computed once for the whole horizon.
+Afterwards the remaining recursion only consists of a few array operations per step.
+
+The state arrays have one entry per scenario, so several variants of the same
+scenario can be advanced side by side.
+
+The engine reproduces the behaviour of the simulated devices in
+:mod:`server.forecasting.simulation.devices`. Scenarios, which can not be expressed
+with state arrays (f.e. devices switched to electrical driven mode), raise a
+:class:`CompilationError`. In this case the scalar :meth:`server.forecasting.Forecast.step` has to be used.
+"""
+import logging
+from datetime import datetime
+
+import numpy as np
+
+from server.forecasting.simulation.demodata.old_demands import warm_water_demand_workday, warm_water_demand_weekend
+from server.forecasting.helpers import linear_interpolation
+
+logger = logging.getLogger('simulation')
+
+#: specific heat capacity of water in kWh/(kg*K), see :class:`SimulatedThermalConsumer`
+SPECIFIC_HEAT_CAPACITY_WATER = 0.001163708
+#: specific heat capacity of air in kWh/(m^3*K), see :class:`SimulatedThermalConsumer`
+SPECIFIC_HEAT_CAPACITY_AIR = 1000.0 / 3600.0
+#: off time of the peak load boiler after switching off, see :class:`SimulatedPeakLoadBoiler`
+PLB_OFF_TIME = 3 * 60.0
+
+
+class CompilationError(Exception):
+    """Raised if a scenario can not be compiled into state arrays."""
+    pass
+
+
+class VectorizedScenario(object):
+    """ Compiles one or more scenarios into state arrays and advances them.
+
+    Usage::
+
+        engine = VectorizedScenario([devices], env)
+        records = engine.run(steps, [('hs', 'get_temperature'), ('cu', 'workload')])
+        engine.write_back()
+
+    :param list scenarios: device tuples as returned by :func:`~server.forecasting.get_initialized_scenario`.
+        All scenarios have to share the same device layout.
+    :param env: the |env| shared by all scenarios
+    """
+
+    def __init__(self, scenarios, env):
+        if len(scenarios) == 0:
+            raise CompilationError("no scenarios to compile")
+
+        self.env = env
+        self.scenarios = scenarios
+        self.size = len(scenarios)
+        self.order = [device.acronym for device in scenarios[0]]
+
+        for devices in scenarios:
+            if [device.acronym for device in devices] != self.order:
+                raise CompilationError("scenarios differ in their device layout")
+
+        self.kernels = []
+        for acronym in self.order:
+            compile_function = getattr(self, '_compile_%s' % acronym, None)
+            if compile_function is None:
+                raise CompilationError("device '%s' is not supported" % acronym)
+            devices = [getattr(scenario, acronym) for scenario in scenarios]
+            compile_function(devices)
+            self.kernels.append(getattr(self, '_step_%s' % acronym))
+
+        self.dt_hours = self.env.step_size / 3600.0
+
+    def run(self, steps, sensors, progress=None):
+        """ advance all scenarios by `steps` steps of ``env.step_size``.
+        Afterwards ``env.now`` points to the end of the forecast, like after the scalar loop.
+
+        :param int steps: number of steps
+        :param list sensors: (device acronym, sensor key) tuples, which are sampled after every step
+        :param function progress: optional callback, which receives the progress in percent
+
+        :returns: one list per scenario, holding a float32 array per sensor or ``None``,
+            if the device does not provide a value for this sensor
+        """
+        getters = [self._get_sensor_getter(acronym, key) for acronym, key in sensors]
+
+        timeline = self.env.now + self.env.step_size * np.arange(steps, dtype=np.float64)
+        self._prepare_timeline(timeline)
+
+        records = np.zeros((self.size, len(sensors), steps), dtype=np.float32)
+        report_interval = max(steps / 100, 1)
+
+        with np.errstate(all='ignore'):
+            for index in xrange(steps):
+                self.index = index
+                self.now = timeline[index]
+                for kernel in self.kernels:
+                    kernel()
+
+                for sensor_index, getter in enumerate(getters):
+                    if getter is not None:
+                        records[:, sensor_index, index] = getter()
+
+                if progress is not None and index % report_interval == 0:
+                    progress(100.0 * index / steps)
+
+        self.env.now = self.env.now + steps * self.env.step_size
+
+        output = []
+        for scenario_index in range(self.size):
+            output.append([records[scenario_index, sensor_index] if getter is not None else None
+                           for sensor_index, getter in enumerate(getters)])
+        return output
+
+    def write_back(self):
+        """ store the state arrays in the device objects of all scenarios,
+        so they look like being stepped by the scalar forecast."""
+        for index, devices in enumerate(self.scenarios):
+            for acronym in self.order:
+                getattr(self, '_write_back_%s' % acronym)(getattr(devices, acronym), index)
+
+    def _prepare_timeline(self, timeline):
+        """ ``Internal Method`` computes all time dependent inputs for the whole horizon at once."""
+        self.timeline = timeline
+        first = self.scenarios[0]
+
+        if 'tc' in self.order:
+            seconds = timeline.astype(np.int64)
+            hours = (seconds // 3600) % 24
+            weekdays = (seconds // 86400 + 3) % 7  # 01.01.1970 was a thursday
+            weights = ((seconds // 60) % 60) / 60.0
+
+            workday = np.array(warm_water_demand_workday, dtype=np.float64)
+            weekend = np.array(warm_water_demand_weekend, dtype=np.float64)
+            self.warmwater_liters = np.where(weekdays >= 5,
+                linear_interpolation(weekend[hours], weekend[(hours + 1) % 24], weights),
+                linear_interpolation(workday[hours], workday[(hours + 1) % 24], weights))
+
+            self.local_hours = np.array([datetime.fromtimestamp(t).hour for t in timeline])
+            self.outside_temperatures = self._sample(first.tc.get_outside_temperature)
+
+        if 'ec' in self.order:
+            self.electrical_demands = self._sample(first.ec.get_consumption_power)
+
+    def _sample(self, function):
+        """ ``Internal Method`` evaluates a function of ``env.now`` for every step of the timeline."""
+        now = self.env.now
+        try:
+            values = np.zeros(len(self.timeline), dtype=np.float64)
+            for index, timestamp in enumerate(self.timeline):
+                self.env.now = timestamp
+                values[index] = function()
+        finally:
+            self.env.now = now
+        return values
+
+    def _get_sensor_getter(self, acronym, key):
+        """ ``Internal Method`` returns a function, which returns the sensor values of all scenarios,
+        or ``None`` if the devices do not provide the value (like in :meth:`MeasurementStorage.take_and_cache`)."""
+        getter = self.sensor_getters.get((acronym, key))
+        if getter is not None:
+            return getter
+        if getattr(getattr(self.scenarios[0], acronym), key, None) is None:
+            return None
+        raise CompilationError("sensor '%s' of device '%s' is not supported" % (key, acronym))
+
+    @property
+    def sensor_getters(self):
+        return {
+            ('hs', 'get_temperature'): self._hs_temperature,
+            ('hs', 'energy_stored'): lambda: self.hs_input - self.hs_output,
+            ('pm', 'purchased'): lambda: self.pm_purchased,
+            ('pm', 'fed_in_electricity'): lambda: self.pm_fed_in,
+            ('pm', 'total_purchased'): lambda: self.pm_total_purchased,
+            ('pm', 'total_fed_in_electricity'): lambda: self.pm_total_fed_in,
+            ('cu', 'workload'): lambda: self.cu_workload * 100.0,
+            ('cu', 'current_gas_consumption'): lambda: self.cu_gas,
+            ('cu', 'current_thermal_production'): lambda: self.cu_thermal,
+            ('cu', 'current_electrical_production'): lambda: self.cu_electrical,
+            ('plb', 'workload_percent'): lambda: self.plb_workload * 100.0,
+            ('plb', 'current_gas_consumption'): lambda: self.plb_gas,
+            ('plb', 'current_thermal_production'): lambda: self.plb_thermal,
+            ('tc', 'get_consumption_power'): lambda: self.tc_power / 1000.0,
+            ('tc', 'get_warmwater_consumption_power'): self._tc_warmwater_power,
+            ('tc', 'get_outside_temperature'): lambda: np.repeat(self.outside_temperatures[self.index], self.size),
+            ('tc', 'temperature_room'): lambda: self.tc_room_temperature,
+            ('ec', 'get_consumption_power'): lambda: np.repeat(self.electrical_demands[self.index], self.size),
+            ('ec', 'total_consumption'): lambda: self.ec_total_consumption,
+        }
+
+    ####################################
+    ########## heat storage ############
+    ####################################
+
+    def _compile_hs(self, devices):
+        self.hs_capacity = _gather(devices, lambda d: d.config['capacity'])
+        self.hs_min_temperature = _gather(devices, lambda d: d.config['min_temperature'])
+        self.hs_target_temperature = _gather(devices, lambda d: d.config['target_temperature'])
+        self.hs_specific_heat_capacity = _gather(devices, lambda d: d.specific_heat_capacity)
+        self.hs_base_temperature = _gather(devices, lambda d: d.base_temperature)
+        self.hs_temperature_loss = _gather(devices, lambda d: d.temperature_loss)
+        self.hs_input = _gather(devices, lambda d: d.input_energy)
+        self.hs_output = _gather(devices, lambda d: d.output_energy)
+        self.hs_empty_count = _gather(devices, lambda d: d.empty_count)
+
+    def _step_hs(self):
+        hourly_energy_loss = (self.hs_capacity * self.hs_specific_heat_capacity) * \
+            self.hs_temperature_loss
+        self.hs_output = self.hs_output + hourly_energy_loss * self.dt_hours
+
+    def _hs_temperature(self):
+        return self.hs_base_temperature + (self.hs_input - self.hs_output) / \
+            (self.hs_capacity * self.hs_specific_heat_capacity)
+
+    def _hs_required_energy(self):
+        target_energy = self.hs_specific_heat_capacity * self.hs_capacity * \
+            (self.hs_target_temperature - self.hs_base_temperature)
+        return target_energy - (self.hs_input - self.hs_output)
+
+    def _hs_consume_energy(self, energy):
+        stored = self.hs_input - self.hs_output
+        sufficient = stored - energy >= 0
+        self.hs_output = np.where(sufficient, self.hs_output + energy, self.hs_output + stored)
+        self.hs_empty_count = self.hs_empty_count + ~sufficient
+
+    def _write_back_hs(self, device, index):
+        device.input_energy = float(self.hs_input[index])
+        device.output_energy = float(self.hs_output[index])
+        device.empty_count = int(self.hs_empty_count[index])
+
+    ####################################
+    ########### power meter ############
+    ####################################
+
+    def _compile_pm(self, devices):
+        self.pm_produced = _gather(devices, lambda d: d.energy_produced)
+        self.pm_consumed = _gather(devices, lambda d: d.energy_consumed)
+        self.pm_purchased = _gather(devices, lambda d: d.purchased)
+        self.pm_fed_in = _gather(devices, lambda d: d.fed_in_electricity)
+        self.pm_total_purchased = _gather(devices, lambda d: d.total_purchased)
+        self.pm_total_fed_in = _gather(devices, lambda d: d.total_fed_in_electricity)
+        self.pm_power_consumption = _gather(devices, lambda d: getattr(d, 'current_power_consum', np.nan))
+
+    def _step_pm(self):
+        balance = self.pm_produced - self.pm_consumed
+        purchase = balance < 0
+        self.pm_purchased = np.where(purchase, -balance, self.pm_purchased)
+        self.pm_total_purchased = np.where(purchase, self.pm_total_purchased - balance, self.pm_total_purchased)
+        self.pm_fed_in = np.where(purchase, self.pm_fed_in, balance)
+        self.pm_total_fed_in = np.where(purchase, self.pm_total_fed_in, self.pm_total_fed_in + balance)
+        self.pm_produced = np.zeros(self.size)
+        self.pm_consumed = np.zeros(self.size)
+
+    def _write_back_pm(self, device, index):
+        device.energy_produced = float(self.pm_produced[index])
+        device.energy_consumed = float(self.pm_consumed[index])
+        device.purchased = float(self.pm_purchased[index])
+        device.fed_in_electricity = float(self.pm_fed_in[index])
+        device.total_purchased = float(self.pm_total_purchased[index])
+        device.total_fed_in_electricity = float(self.pm_total_fed_in[index])
+        if not np.isnan(self.pm_power_consumption[index]):
+            device.current_power_consum = float(self.pm_power_consumption[index])
+
+    ####################################
+    ######## cogeneration unit #########
+    ####################################
+
+    def _compile_cu(self, devices):
+        if not all(device.thermal_driven for device in devices):
+            raise CompilationError("electrical driven cogeneration units are not supported")
+
+        self.cu_max_gas_input = _gather(devices, lambda d: d.config['max_gas_input'])
+        self.cu_thermal_efficiency = _gather(devices, lambda d: d.config['thermal_efficiency'])
+        self.cu_electrical_efficiency = _gather(devices, lambda d: d.config['electrical_efficiency'])
+        self.cu_minimal_workload = _gather(devices, lambda d: d.config['minimal_workload'])
+        self.cu_minimal_off_time = _gather(devices, lambda d: d.config['minimal_off_time'])
+        self.cu_max_efficiency_loss = _gather(devices, lambda d: d.max_efficiency_loss)
+        self.cu_overwrite_workload = _gather(devices, lambda d: np.nan if d.overwrite_workload is None else d.overwrite_workload)
+        self.cu_running = np.array([bool(device.running) for device in devices])
+
+        self.cu_workload = _gather(devices, lambda d: d._workload)
+        self.cu_off_time = _gather(devices, lambda d: d.off_time)
+        self.cu_gas = _gather(devices, lambda d: d.current_gas_consumption)
+        self.cu_thermal = _gather(devices, lambda d: d.current_thermal_production)
+        self.cu_electrical = _gather(devices, lambda d: d.current_electrical_production)
+        self.cu_total_gas = _gather(devices, lambda d: d.total_gas_consumption)
+        self.cu_total_thermal = _gather(devices, lambda d: d.total_thermal_production)
+        self.cu_total_electrical = _gather(devices, lambda d: d.total_electrical_production)
+        self.cu_hours_of_operation = _gather(devices, lambda d: d.total_hours_of_operation)
+        self.cu_power_on_count = _gather(devices, lambda d: d.power_on_count)
+
+    def _step_cu(self):
+        running = self.cu_running
+        now = self.now
+
+        # calculate_new_workload in thermal driven mode
+        max_thermal_power = self.cu_thermal_efficiency * self.cu_max_gas_input
+        min_thermal_power = max_thermal_power * self.cu_minimal_workload \
+            * (1.0 - self.cu_max_efficiency_loss)
+        relative_demand = np.maximum(self._hs_required_energy(), min_thermal_power) / max_thermal_power
+        calculated_workload = np.where(~np.isnan(self.cu_overwrite_workload), self.cu_overwrite_workload,
+            np.where(self.cu_off_time > now, 0.0, np.minimum(relative_demand, 1.0)))
+
+        # set_workload
+        turned_on = running & (calculated_workload >= self.cu_minimal_workload)
+        turned_off = running & ~turned_on
+        self.cu_power_on_count = self.cu_power_on_count + (turned_on & (self.cu_workload == 0))
+        self.cu_hours_of_operation = np.where(turned_on, self.cu_hours_of_operation + self.dt_hours,
+                                              self.cu_hours_of_operation)
+        self.cu_off_time = np.where(turned_off & (self.cu_off_time <= now),
+                                    now + self.cu_minimal_off_time, self.cu_off_time)
+        self.cu_workload = np.where(turned_on, np.maximum(np.minimum(calculated_workload, 1.0), 0.0), 0.0)
+
+        # consume_and_produce_energy
+        workload = self.cu_workload
+        relative_workload = (workload - self.cu_minimal_workload) / (1.0 - self.cu_minimal_workload)
+        efficiency_loss_factor = np.where(workload == self.cu_minimal_workload,
+            1.0 - self.cu_max_efficiency_loss,
+            1.0 - self.cu_max_efficiency_loss * (1.0 - relative_workload))
+        gas = workload * self.cu_max_gas_input
+        electrical = gas * self.cu_electrical_efficiency * efficiency_loss_factor
+        thermal = gas * self.cu_thermal_efficiency * efficiency_loss_factor
+
+        self.cu_gas = np.where(running, gas, self.cu_gas)
+        self.cu_electrical = np.where(running, electrical, self.cu_electrical)
+        self.cu_thermal = np.where(running, thermal, self.cu_thermal)
+        self.cu_total_gas = np.where(running, self.cu_total_gas + gas * self.dt_hours, self.cu_total_gas)
+        self.cu_total_thermal = np.where(running, self.cu_total_thermal + thermal * self.dt_hours,
+                                         self.cu_total_thermal)
+        self.cu_total_electrical = np.where(running, self.cu_total_electrical + electrical * self.dt_hours,
+                                            self.cu_total_electrical)
+
+        self.pm_produced = np.where(running, self.pm_produced + electrical * self.dt_hours, self.pm_produced)
+        self.hs_input = np.where(running, self.hs_input + thermal * self.dt_hours, self.hs_input)
+
+    def _write_back_cu(self, device, index):
+        device._workload = float(self.cu_workload[index])
+        device.off_time = float(self.cu_off_time[index])
+        device.current_gas_consumption = float(self.cu_gas[index])
+        device.current_thermal_production = float(self.cu_thermal[index])
+        device.current_electrical_production = float(self.cu_electrical[index])
+        device.total_gas_consumption = float(self.cu_total_gas[index])
+        device.total_thermal_production = float(self.cu_total_thermal[index])
+        device.total_electrical_production = float(self.cu_total_electrical[index])
+        device.total_hours_of_operation = float(self.cu_hours_of_operation[index])
+        device.power_on_count = int(self.cu_power_on_count[index])
+
+    ####################################
+    ######### peak load boiler #########
+    ####################################
+
+    def _compile_plb(self, devices):
+        self.plb_max_gas_input = _gather(devices, lambda d: d.config['max_gas_input'])
+        self.plb_thermal_efficiency = _gather(devices, lambda d: d.config['thermal_efficiency'])
+        self.plb_overwrite_workload = _gather(devices, lambda d: np.nan if d.overwrite_workload is None else d.overwrite_workload)
+        self.plb_running = np.array([bool(device.running) for device in devices])
+
+        self.plb_workload = _gather(devices, lambda d: d._workload)
+        self.plb_off_time = _gather(devices, lambda d: d.off_time)
+        self.plb_gas = _gather(devices, lambda d: d.current_gas_consumption)
+        self.plb_thermal = _gather(devices, lambda d: d.current_thermal_production)
+        self.plb_total_gas = _gather(devices, lambda d: d.total_gas_consumption)
+        self.plb_total_thermal = _gather(devices, lambda d: d.total_thermal_production)
+        self.plb_hours_of_operation = _gather(devices, lambda d: d.total_hours_of_operation)
+        self.plb_power_on_count = _gather(devices, lambda d: d.power_on_count)
+
+    def _step_plb(self):
+        running = self.plb_running
+        now = self.now
+
+        # calculate_workload
+        overwritten = running & ~np.isnan(self.plb_overwrite_workload)
+        turned_on = running & ~overwritten & (self._hs_temperature() < self.hs_min_temperature) & \
+            (self.plb_off_time <= now)
+        turned_off = running & ~overwritten & ~turned_on & \
+            (self.plb_thermal >= self._hs_required_energy())
+
+        self.plb_power_on_count = self.plb_power_on_count + (turned_on & (self.plb_workload == 0.0))
+        self.plb_hours_of_operation = np.where(overwritten | turned_on,
+            self.plb_hours_of_operation + self.dt_hours, self.plb_hours_of_operation)
+        self.plb_off_time = np.where(turned_off & (self.plb_off_time <= now), now + PLB_OFF_TIME, self.plb_off_time)
+        workload = np.where(overwritten, self.plb_overwrite_workload, self.plb_workload)
+        workload = np.where(turned_on, 1.0, workload)
+        workload = np.where(turned_off, 0.0, workload)
+        self.plb_workload = np.where(running, workload, 0.0)
+
+        # consume_and_produce_energy
+        gas = self.plb_workload * self.plb_max_gas_input
+        thermal = gas * self.plb_thermal_efficiency
+
+        self.plb_gas = np.where(running, gas, self.plb_gas)
+        self.plb_thermal = np.where(running, thermal, self.plb_thermal)
+        self.plb_total_gas = np.where(running, self.plb_total_gas + gas * self.dt_hours, self.plb_total_gas)
+        self.plb_total_thermal = np.where(running, self.plb_total_thermal + thermal * self.dt_hours,
+                                          self.plb_total_thermal)
+
+        self.hs_input = np.where(running, self.hs_input + thermal * self.dt_hours, self.hs_input)
+
+    def _write_back_plb(self, device, index):
+        device._workload = float(self.plb_workload[index])
+        device.off_time = float(self.plb_off_time[index])
+        device.current_gas_consumption = float(self.plb_gas[index])
+        device.current_thermal_production = float(self.plb_thermal[index])
+        device.total_gas_consumption = float(self.plb_total_gas[index])
+        device.total_thermal_production = float(self.plb_total_thermal[index])
+        device.total_hours_of_operation = float(self.plb_hours_of_operation[index])
+        device.power_on_count = int(self.plb_power_on_count[index])
+
+    ####################################
+    ######### thermal consumer #########
+    ####################################
+
+    def _compile_tc(self, devices):
+        self.tc_daily_demand = np.array([device.daily_demand for device in devices], dtype=np.float64)
+        if self.tc_daily_demand.shape != (self.size, 24):
+            raise CompilationError("daily demand of thermal consumer must contain 24 values")
+
+        self.tc_target_temperature = _gather(devices, lambda d: d.config['target_temperature'])
+        self.tc_residents = _gather(devices, lambda d: d.config['residents'])
+        self.tc_room_volume = _gather(devices, lambda d: d.config['avg_room_volume'])
+        self.tc_max_power = _gather(devices, lambda d: d.max_power)
+        self.tc_window_surface = _gather(devices, lambda d: d.window_surface)
+        self.tc_wall_surface = _gather(devices, lambda d: d.outer_wall_surface)
+        self.tc_heat_transfer_window = _gather(devices, lambda d: d.heat_transfer_window)
+        self.tc_heat_transfer_wall = _gather(devices, lambda d: d.heat_transfer_wall)
+        self.tc_warmwater_temperature = _gather(devices, lambda d: d.temperature_warmwater)
+
+        self.tc_power = _gather(devices, lambda d: d.current_power)
+        self.tc_room_temperature = _gather(devices, lambda d: d.temperature_room)
+        self.tc_total_consumed = _gather(devices, lambda d: d.total_consumed)
+
+    def _step_tc(self):
+        # simulate_consumption
+        self.tc_target_temperature = self.tc_daily_demand[:, self.local_hours[self.index]]
+
+        # heat_apartments
+        temperature_delta = self.tc_room_temperature - self.outside_temperatures[self.index]
+        heat_flow_window = self.tc_window_surface * self.tc_heat_transfer_window * temperature_delta
+        heat_flow_wall = self.tc_wall_surface * self.tc_heat_transfer_wall * temperature_delta
+        room_power = self.tc_power / 1000.0 - (heat_flow_wall + heat_flow_window) / 1000.0
+        room_energy = room_power * self.dt_hours
+        self.tc_room_temperature = self.tc_room_temperature + room_energy / \
+            (self.tc_room_volume * SPECIFIC_HEAT_CAPACITY_AIR)
+
+        slope = self.tc_max_power * self.dt_hours
+        power = np.where(self.tc_room_temperature > self.tc_target_temperature,
+                         self.tc_power - slope, self.tc_power + slope)
+        self.tc_power = np.maximum(np.minimum(power, self.tc_max_power), 0.0)
+
+        consumption = (self.tc_power / 1000.0) * self.dt_hours + \
+            self._tc_warmwater_power() * self.dt_hours
+        self.tc_total_consumed = self.tc_total_consumed + consumption
+        self._hs_consume_energy(consumption)
+
+    def _tc_warmwater_power(self):
+        power_demand = self.warmwater_liters[self.index] * \
+            (self.tc_warmwater_temperature - self.hs_base_temperature) * \
+            SPECIFIC_HEAT_CAPACITY_WATER
+        return power_demand * self.tc_residents
+
+    def _write_back_tc(self, device, index):
+        device.config['target_temperature'] = float(self.tc_target_temperature[index])
+        device.current_power = float(self.tc_power[index])
+        device.temperature_room = float(self.tc_room_temperature[index])
+        device.total_consumed = float(self.tc_total_consumed[index])
+
+    ####################################
+    ####### electrical consumer ########
+    ####################################
+
+    def _compile_ec(self, devices):
+        for device in devices:
+            if not self.env.is_demo_simulation() and \
+                    device.start_timestamp - device.last_forecast_update > device.new_data_interval:
+                raise CompilationError("electrical consumer needs to update its forecast")
+
+        self.ec_total_consumption = _gather(devices, lambda d: d.total_consumption)
+
+    def _step_ec(self):
+        power = self.electrical_demands[self.index]
+        consumption = power * self.dt_hours
+        self.ec_total_consumption = self.ec_total_consumption + consumption
+        self.pm_consumed = self.pm_consumed + consumption
+        self.pm_power_consumption = np.repeat(power, self.size)
+
+    def _write_back_ec(self, device, index):
+        device.total_consumption = float(self.ec_total_consumption[index])
+
+
+def _gather(devices, getter):
+    """ ``Internal Method`` collects one value of every device into a float array"""
+    return np.array([getter(device) for device in devices], dtype=np.float64)
@@ -1,48 +1,237 @@
 import logging
+import itertools
+import uuid
+from time import time
+from threading import Lock, Condition
 from datetime import datetime
 import dateutil.relativedelta
 
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.cache import cache
 from django.utils.timezone import utc
+from django.db import connection
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 
-from models import Device, Configuration, DeviceConfiguration, Sensor, SensorValue, SensorValueDaily
+from models import Device, Configuration, DeviceConfiguration, Sensor, SensorValue, SensorLatestValue, SensorValueDaily, SensorValueRollup
 
 
 logger = logging.getLogger('django')
 CACHE_TIMEOUT = 120  # seconds
+ROLLUP_RESOLUTIONS = [60, 15 * 60, 60 * 60, 24 * 60 * 60]  # seconds, each divides a day
 
 
 def get_latest_value(device, key):
     sensor = Sensor.objects.get(device=device, key=key)
-    sensor_value = SensorValue.objects.filter(
-        sensor=sensor).latest('timestamp')
-    return sensor_value.value
+    return get_latest_sensor_value(sensor.id).value
 
 
 def get_latest_value_with_unit(device, key):
     sensor = Sensor.objects.get(device=device, key=key)
-    sensor_value = SensorValue.objects.filter(
-        sensor=sensor).latest('timestamp')
+    sensor_value = get_latest_sensor_value(sensor.id)
     return '%s %s' % (round(sensor_value.value, 2), sensor.unit)
 
 
+def get_latest_sensor_value(sensor_id):
+    """Returns the |SensorLatestValue| of a sensor.
+    Raises ``SensorValue.DoesNotExist`` if there are no values for the sensor."""
+    try:
+        return SensorLatestValue.objects.get(sensor_id=sensor_id)
+    except SensorLatestValue.DoesNotExist:
+        # values stored before the latest values were maintained
+        sensor_value = SensorValue.objects.filter(
+            sensor_id=sensor_id).latest('timestamp')
+        live_snapshot.update(update_latest_sensor_values(
+            [(sensor_id, sensor_value.value, sensor_value.timestamp)]))
+        return SensorLatestValue(sensor_id=sensor_id, value=sensor_value.value, timestamp=sensor_value.timestamp)
+
+
+def get_latest_sensor_values():
+    """Returns a `dict` with the latest value of every sensor."""
+    return dict(SensorLatestValue.objects.values_list('sensor_id', 'value'))
+
+
+def update_latest_sensor_values(sensor_values):
+    """Stores the newest of the given values per sensor in |SensorLatestValue|.
+    This has to be called whenever |SensorValue|'s are inserted without the ORM.
+    Pass the result to :meth:`LiveSnapshot.update` of :data:`live_snapshot` after the transaction is committed,
+    so readers don't see values, which might be rolled back.
+
+    :param list sensor_values: (sensor_id, value, timestamp) tuples
+    :returns: a `dict` with the newest (value, timestamp) tuple per sensor id
+    """
+    latest = {}
+    for sensor_id, value, timestamp in sensor_values:
+        if sensor_id not in latest or latest[sensor_id][1] <= timestamp:
+            latest[sensor_id] = (value, timestamp)
+    if len(latest) == 0:
+        return latest
+
+    # update and insert in one statement each, so concurrent writers can't store an older value
+    rows = ', '.join(['(%s, %s::double precision, %s::timestamp with time zone)'] * len(latest))
+    params = list(itertools.chain.from_iterable(
+        (sensor_id, value, timestamp) for sensor_id, (value, timestamp) in latest.items()))
+    cursor = connection.cursor()
+    cursor.execute('''UPDATE server_sensorlatestvalue SET value = new.value, timestamp = new.timestamp
+        FROM (VALUES %s) AS new (sensor_id, value, timestamp)
+        WHERE server_sensorlatestvalue.sensor_id = new.sensor_id
+            AND server_sensorlatestvalue.timestamp <= new.timestamp''' % rows, params)
+    cursor.execute('''INSERT INTO server_sensorlatestvalue (sensor_id, value, timestamp)
+        SELECT new.sensor_id, new.value, new.timestamp FROM (VALUES %s) AS new (sensor_id, value, timestamp)
+        WHERE NOT EXISTS (SELECT 1 FROM server_sensorlatestvalue
+            WHERE server_sensorlatestvalue.sensor_id = new.sensor_id)''' % rows, params)
+    return latest
+
+
+class LiveSnapshot(object):
+
+    """Keeps the latest value of every sensor in memory.
+    It is updated whenever values stored with :func:`update_latest_sensor_values` are committed,
+    every update increments `version` and wakes up the threads in :meth:`wait`.
+    The values are reloaded from |SensorLatestValue| after `timeout` seconds without an update,
+    so values stored by other processes are picked up, too.
+    """
+
+    def __init__(self, timeout=CACHE_TIMEOUT):
+        self.timeout = timeout
+        self.condition = Condition()
+        self.version = 0
+        self.values = None
+        self.updated_at = 0
+
+    def update(self, latest):
+        """Stores new values.
+
+        :param dict latest: (value, timestamp) tuples per sensor id
+        """
+        with self.condition:
+            if self.values is not None:
+                for sensor_id, (value, timestamp) in latest.items():
+                    if sensor_id not in self.values or self.values[sensor_id][1] <= timestamp:
+                        self.values[sensor_id] = (value, timestamp)
+            self.version += 1
+            self.updated_at = time()
+            self.condition.notify_all()
+
+    def get(self):
+        """Returns the version and a `dict` with the latest (value, timestamp) per sensor id"""
+        with self.condition:
+            if self.values is None or time() - self.updated_at > self.timeout:
+                values = dict((sensor_id, (value, timestamp)) for sensor_id, value, timestamp in
+                              SensorLatestValue.objects.values_list('sensor_id', 'value', 'timestamp'))
+                if self.values is not None and values != self.values:
+                    self.version += 1
+                self.values = values
+                self.updated_at = time()
+            return (self.version, dict(self.values))
+
+    def wait(self, version, timeout):
+        """Blocks until the snapshot is newer than `version` or `timeout` seconds passed.
+
+        :returns: the current version
+        """
+        end = time() + timeout
+        with self.condition:
+            while self.version <= version and time() < end:
+                self.condition.wait(end - time())
+            return self.version
+
+
+live_snapshot = LiveSnapshot()
+
+
+@receiver(post_save, sender=SensorValue)
+def sensor_value_saved(sender, instance, created, **kwargs):
+    live_snapshot.update(update_latest_sensor_values(
+        [(instance.sensor_id, instance.value, instance.timestamp)]))
+
+
+def get_devices_and_sensors(cached=True):
+    """Returns a tuple with the list of all devices and the list of all sensors.
+    The metadata rarely changes, so it is cached."""
+    metadata = cache.get('devices_and_sensors')
+    if metadata is None or not cached:
+        devices = list(Device.objects.all())
+        sensors = list(Sensor.objects.select_related('device').order_by('id'))
+        metadata = (devices, sensors)
+        cache.set('devices_and_sensors', metadata, CACHE_TIMEOUT)
+    return metadata
+
+
+class ConfigurationRegistry(object):
+
+    """Keeps the parsed values of all |Configuration|'s and |DeviceConfiguration|'s in memory.
+    All values are loaded with two queries on the first lookup after an invalidation,
+    further lookups are plain `dict` accesses.
+
+    Every write to the configurations has to call :meth:`invalidate`, which increments `version`.
+    ORM saves and deletes do this automatically, bulk inserts don't.
+    Values are reloaded after `timeout` seconds, so changes of other processes are picked up, too.
+    """
+
+    def __init__(self, timeout=CACHE_TIMEOUT):
+        self.timeout = timeout
+        self.lock = Lock()
+        self.version = 0
+        self.loaded_version = None
+        self.loaded_at = 0
+        self.configurations = {}
+        self.device_configurations = {}
+
+    def load(self):
+        """``Internal Method`` load all configurations, if they were invalidated or timed out"""
+        with self.lock:
+            if self.loaded_version == self.version and time() - self.loaded_at < self.timeout:
+                return
+            version = self.version
+            self.configurations = dict((config.key, parse_value(config))
+                                       for config in Configuration.objects.all())
+            device_configurations = {}
+            for config in DeviceConfiguration.objects.all():
+                device_configurations[(config.device_id, config.key)] = parse_value(config)
+            self.device_configurations = device_configurations
+            self.loaded_version = version
+            self.loaded_at = time()
+
+    def get(self, key):
+        """Returns the value of a |Configuration|.
+        Raises ``Configuration.DoesNotExist``, if there is no configuration with this key."""
+        self.load()
+        try:
+            return self.configurations[key]
+        except KeyError:
+            raise Configuration.DoesNotExist("Configuration %s does not exist" % key)
+
+    def get_device(self, device_id, key):
+        """Returns the value of a |DeviceConfiguration| or ``None``"""
+        self.load()
+        return self.device_configurations.get((device_id, key))
+
+    def invalidate(self):
+        """Discard all values, they are reloaded on the next lookup"""
+        with self.lock:
+            self.version += 1
+
+
+configuration_registry = ConfigurationRegistry()
+
+
+@receiver(post_save, sender=Configuration)
+@receiver(post_delete, sender=Configuration)
+@receiver(post_save, sender=DeviceConfiguration)
+@receiver(post_delete, sender=DeviceConfiguration)
+def configuration_changed(sender, **kwargs):
+    configuration_registry.invalidate()
+
+
 def get_configuration(key, cached=True):
-    config = cache.get(key)
-    if config is None or not cached:
-        config = Configuration.objects.get(key=key)
-        cache.set(key, config, CACHE_TIMEOUT)
-    return parse_value(config)
+    if not cached:
+        return parse_value(Configuration.objects.get(key=key))
+    return configuration_registry.get(key)
 
 
 def get_device_configuration(device, key):
-    configs = cache.get(key + str(device.id))
-    if configs is None:
-        configs = DeviceConfiguration.objects.filter(device=device)
-        cache.set(key + str(device.id), configs, CACHE_TIMEOUT)
-    for config in configs:
-        if config.key == key:
-            return parse_value(config)
+    return configuration_registry.get_device(device.id, key)
 
 
 def get_configurations():
@@ -85,7 +274,7 @@ def get_past_time(years=0, months=0, days=0, use_view=False):
     if use_view:
         _class = SensorValueDaily
     else:
-        _class = SensorValue
+        _class = SensorLatestValue
 
     try:
         output_time = _class.objects.latest('timestamp').timestamp
@@ -96,6 +285,58 @@ def get_past_time(years=0, months=0, days=0, use_view=False):
     return output_time.replace(tzinfo=utc)
 
 
+def iterate_sensor_values(model, sensor_ids, start=None, chunk_size=2000):
+    """Yields (sensor_id, values) per sensor, where values is a list of (timestamp, value) tuples ordered by time.
+    The rows are fetched with a server-side cursor in chunks of `chunk_size`,
+    so only the values of one sensor are held in memory at a time.
+
+    :param model: |SensorValue| or one of the aggregated views with ``sensor_id``, ``timestamp`` and ``value`` columns
+    :param list sensor_ids: the sensors to fetch
+    :param datetime start: only fetch values after this time
+    """
+    if len(sensor_ids) == 0:
+        return
+
+    query = 'SELECT sensor_id, timestamp, value FROM ' + model._meta.db_table + ' WHERE sensor_id IN %s'
+    params = [tuple(sensor_ids)]
+    if start is not None:
+        query += ' AND timestamp >= %s'
+        params.append(start)
+    query += ' ORDER BY sensor_id, timestamp'
+
+    # make sure the database connection is established
+    connection.cursor()
+    # named cursors are server-side cursors in psycopg2,
+    # withhold allows using them outside of a transaction
+    cursor = connection.connection.cursor(name='sensor_values_%s' % uuid.uuid4().hex, withhold=True)
+    cursor.itersize = chunk_size
+    try:
+        cursor.execute(query, params)
+        for sensor_id, rows in itertools.groupby(cursor, key=lambda row: row[0]):
+            yield (sensor_id, [(timestamp, value) for _, timestamp, value in rows])
+    finally:
+        cursor.close()
+
+
+def get_sensor_series(sensor_id, start, end, points=500):
+    """Returns aggregated values of a sensor between `start` and `end`.
+    The coarsest resolution of |SensorValueRollup| is used,
+    which still yields at least `points` buckets for the time range.
+
+    :returns: (resolution, values) with (timestamp, min, max, avg, sum) tuples as values
+    """
+    span = (end - start).total_seconds()
+    resolution = ROLLUP_RESOLUTIONS[0]
+    for level in ROLLUP_RESOLUTIONS:
+        if span / level >= points:
+            resolution = level
+
+    values = SensorValueRollup.objects.filter(
+        sensor_id=sensor_id, resolution=resolution, timestamp__gte=start, timestamp__lt=end).\
+        order_by('timestamp').values_list('timestamp', 'min', 'max', 'avg', 'sum')
+    return (resolution, list(values))
+
+
 def parse_value(config):
     try:
         if config.value_type == DeviceConfiguration.STR:
@@ -1,8 +1,11 @@
 import json
+import struct
 import logging
 import datetime
 import calendar
-from django.http import HttpResponse
+
+import numpy as np
+from django.http import HttpResponse, StreamingHttpResponse
 
 from server.worker import Worker
 from server.models import Configuration, DeviceConfiguration, SensorValue
@@ -18,14 +21,139 @@ class WebAPIEncoder(json.JSONEncoder):
         # Support datetime and date instances
         if isinstance(obj, datetime.datetime) or isinstance(obj, datetime.date):
             return obj.isoformat()
+        # Support numpy arrays, f.e. forecast values
+        if isinstance(obj, np.ndarray):
+            return obj.tolist()
 
         return json.JSONEncoder.default(self, obj)
 
 
 def create_json_response(data, request):
-    indent = None if request.is_ajax() else 2
-    return HttpResponse(
-        json.dumps(data, cls=WebAPIEncoder, sort_keys=True, indent=indent), content_type='application/json')
+    """Serializes `data` to JSON. Requests from scripts (AJAX or ``?format=compact``) get compact JSON,
+    everyone else a sorted and indented document."""
+    if request.is_ajax() or request.GET.get('format') == 'compact':
+        content = json.dumps(data, cls=WebAPIEncoder, separators=(',', ':'))
+    else:
+        content = json.dumps(data, cls=WebAPIEncoder, sort_keys=True, indent=2)
+    return HttpResponse(content, content_type='application/json')
+
+
+def create_streaming_json_response(items, request):
+    """Serializes the iterable `items` to a JSON list, which is sent one item at a time.
+    Use this for long listings, which shouldn't be held in memory at once."""
+    if request.is_ajax() or request.GET.get('format') == 'compact':
+        options = {'separators': (',', ':')}
+    else:
+        options = {'sort_keys': True, 'indent': 2}
+
+    def stream():
+        yield '['
+        for index, item in enumerate(items):
+            if index > 0:
+                yield ','
+            yield json.dumps(item, cls=WebAPIEncoder, **options)
+        yield ']'
+
+    return StreamingHttpResponse(stream(), content_type='application/json')
+
+
+SERIES_CONTENT_TYPE = 'application/x-ecocontrol-series'
+"""Content type of the binary encoding of series, see :func:`encode_series`"""
+
+
+def accepts_series(request):
+    """Returns `True` if the client requested the binary encoding of series,
+    either with the ``Accept`` header or with ``?format=binary``."""
+    return SERIES_CONTENT_TYPE in request.META.get('HTTP_ACCEPT', '') or \
+        request.GET.get('format') == 'binary'
+
+
+def encode_series(series):
+    """Encodes a list of equidistant series into a compact binary format:
+
+    ======  ============================================================
+    bytes   content
+    ======  ============================================================
+    4       length n of the header as little-endian unsigned int
+    n       UTF-8 encoded JSON header with a list of series
+    ...     little-endian float32 values of all series, one after another
+    ======  ============================================================
+
+    Every series in the header keeps its metadata (f.e. ``id``, ``name``, ``unit``) and
+    gets ``start`` (unix timestamp), ``step`` (seconds), ``offset`` and ``length`` (both in values).
+    Missing values are encoded as NaN.
+
+    :param list series: `dict` objects with the keys ``start``, ``step``, ``data`` and arbitrary metadata
+    """
+    header = []
+    arrays = []
+    offset = 0
+    for entry in series:
+        values = np.asarray(entry['data'], dtype='<f4')
+        meta = dict((key, value) for key, value in entry.items() if key != 'data')
+        meta['offset'] = offset
+        meta['length'] = len(values)
+        header.append(meta)
+        arrays.append(values)
+        offset += len(values)
+
+    header = json.dumps(header, cls=WebAPIEncoder, separators=(',', ':')).encode('utf-8')
+    return struct.pack('<I', len(header)) + header + ''.join(values.tostring() for values in arrays)
+
+
+def create_series_response(series, request):
+    """Returns the binary encoding of equidistant series, see :func:`encode_series`"""
+    return HttpResponse(encode_series(series), content_type=SERIES_CONTENT_TYPE)
+
+
+def to_equidistant_series(values, step):
+    """Converts (timestamp, value) tuples into a start timestamp and a list of equidistant values.
+    Gaps are filled with NaN.
+
+    :param list values: (datetime, value) tuples ordered by time
+    :param int step: seconds between two values
+    :returns: (start, values)
+    """
+    if len(values) == 0:
+        return (0, [])
+    timestamps = np.array([calendar.timegm(timestamp.utctimetuple()) for timestamp, value in values], dtype=np.int64)
+    start = timestamps[0]
+    output = np.empty((timestamps[-1] - start) // step + 1, dtype=np.float32)
+    output.fill(np.nan)
+    output[(timestamps - start) // step] = [value for timestamp, value in values]
+    return (int(start), output)
+
+
+def downsample_lttb(values, points):
+    """Reduces (timestamp, value) tuples to `points` tuples with the Largest-Triangle-Three-Buckets algorithm.
+    The first and the last value are kept, from every bucket in between the value
+    spanning the largest triangle with the previously selected value and the average of the next bucket is chosen.
+    This keeps peaks and the shape of the series.
+
+    :param list values: (datetime, value) tuples ordered by time
+    :param int points: maximal number of returned values, ``None`` keeps all values
+    """
+    if points is None or points < 3 or len(values) <= points:
+        return values
+
+    x = np.array([calendar.timegm(timestamp.utctimetuple()) for timestamp, value in values], dtype=np.float64)
+    y = np.array([value for timestamp, value in values], dtype=np.float64)
+    # the inner values are split into points - 2 buckets, the last bound is the last value
+    bounds = list(np.linspace(1, len(values) - 1, points - 1).astype(int)) + [len(values)]
+
+    selected = [0]
+    for i in range(points - 2):
+        start, end = bounds[i], bounds[i + 1]
+        next_x = x[bounds[i + 1]:bounds[i + 2]].mean()
+        next_y = y[bounds[i + 1]:bounds[i + 2]].mean()
+
+        previous = selected[-1]
+        areas = np.abs((x[previous] - next_x) * (y[start:end] - y[previous]) -
+                       (x[previous] - x[start:end]) * (next_y - y[previous]))
+        selected.append(start + int(areas.argmax()))
+    selected.append(len(values) - 1)
+
+    return [values[index] for index in selected]
 
 
 def start_worker():
@@ -4,6 +4,8 @@ import logging
 from django.db.models.signals import post_syncdb
 
 from server.management import defaults
+from server.partitions import initialize_partitions
+from server.functions import configuration_registry
 
 logger = logging.getLogger('ecocontrol')
 
@@ -11,7 +13,12 @@ def initialize_defaults(**kwargs):
     # keep in mind that this function can be called multiple times
     defaults.initialize_default_user()
     defaults.initialize_default_scenario()
+    defaults.initialize_indexes()
+    initialize_partitions()
     defaults.initialize_views()
+    defaults.initialize_latest_values()
     defaults.initialize_weathervalues()
+    # the defaults are bulk inserted
+    configuration_registry.invalidate()
 
 post_syncdb.connect(initialize_defaults)
\ No newline at end of file
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from server.forecasting.statistical.extension import is_built
+
+
+class Command(BaseCommand):
+    help = 'Compile the Holt-Winters extension holtwinters_fast, which is used by the statistical forecasts'
+
+    def handle(self, *args, **options):
+        try:
+            from server.forecasting.statistical.build_extension import build_holtwinters_extension
+        except Exception as e:
+            raise CommandError(e)
+
+        if not build_holtwinters_extension() or not is_built():
+            raise CommandError('Building holtwinters_fast failed, check ecoControl.log')
+        self.stdout.write('Built holtwinters_fast')
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from server.functions import get_past_time
+from server.partitions import drop_partitions
+
+
+class Command(BaseCommand):
+    args = '<months>'
+    help = 'Drop the sensor values of all months, which ended more than <months> months before the latest value'
+
+    def handle(self, *args, **options):
+        if len(args) != 1 or not args[0].isdigit():
+            raise CommandError('Usage: manage.py drop_partitions <months>')
+
+        before = get_past_time(months=int(args[0]))
+        for name in drop_partitions(before):
+            self.stdout.write('Dropped %s' % name)
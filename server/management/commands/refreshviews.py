@@ -4,7 +4,7 @@ from django.db import connection
 from server.worker.functions import refresh_views
 
 class Command(BaseCommand):
-    help = 'Refresh materialized views for aggregated sensorvalues in the database'
+    help = 'Aggregate new sensorvalues into the daily and monthly tables in the database'
 
     def handle(self, *args, **options):
         refresh_views()
@@ -9,8 +9,9 @@ from django.core.management import call_command
 from django import db
 
 from server.forecasting.simulation.demodata.old_demands import outside_temperatures_2013, outside_temperatures_2012
-from server.models import Device, Sensor, Configuration, DeviceConfiguration, SensorValueDaily, SensorValueHourly, SensorValueMonthlyAvg, SensorValueMonthlySum, WeatherValue
+from server.models import Device, Sensor, SensorValue, SensorLatestValue, SensorValueRollup, Configuration, DeviceConfiguration, SensorValueDaily, SensorValueHourly, SensorValueMonthlyAvg, SensorValueMonthlySum, WeatherValue
 from server.settings import TESTING
+from server.worker.functions import refresh_views, HIGH_WATER_MARK
 
 logger = logging.getLogger('ecocontrol')
 
@@ -160,6 +161,25 @@ def initialize_weathervalues():
         logger.debug("Default weather data for 2012 and 2013 initialized")
 
 
+def initialize_indexes():
+    cursor = connection.cursor()
+    # syncdb only creates the index of SensorValue.Meta.index_together for new tables
+    cursor.execute('''SELECT 1 FROM pg_indexes WHERE tablename = 'server_sensorvalue' AND indexdef LIKE %s''',
+                   ['%(sensor_id, "timestamp")'])
+    if cursor.fetchone() is None:
+        cursor.execute('''CREATE INDEX server_sensorvalue_sensor_timestamp ON server_sensorvalue (sensor_id, timestamp);''')
+        logger.debug("Index of the sensor values per sensor and time created")
+
+
+def initialize_latest_values():
+    if SensorLatestValue.objects.count() == 0:
+        cursor = connection.cursor()
+        cursor.execute('''INSERT INTO server_sensorlatestvalue (sensor_id, value, timestamp)
+            SELECT DISTINCT ON (sensor_id) sensor_id, value, timestamp
+            FROM server_sensorvalue
+            ORDER BY sensor_id, timestamp DESC''')
+
+
 def initialize_views():
     cursor = connection.cursor()
 
@@ -175,58 +195,56 @@ def initialize_views():
                         '1970-01-01 00:00:00'::timestamp without time zone + '01:00:00'::interval * (date_part('epoch'::text, server_sensorvalue."timestamp")::integer / 3600)::double precision AS timestamp,
                         server_sensorvalue.value
                         FROM server_sensorvalue
-                        WHERE timestamp >= (SELECT timestamp from server_sensorvalue ORDER BY timestamp DESC LIMIT 1) - INTERVAL '1 month'
+                        WHERE timestamp >= (SELECT max(timestamp) FROM server_sensorlatestvalue) - INTERVAL '1 month'
                     ) t1
               GROUP BY  t1.timestamp, t1.sensor_id
               ORDER BY t1.timestamp''')
 
+    for name in ['server_sensorvaluedaily', 'server_sensorvaluemonthlysum', 'server_sensorvaluemonthlyavg']:
+        cursor.execute('''SELECT 1 FROM pg_matviews WHERE matviewname = %s''', [name])
+        if cursor.fetchone() is not None:
+            # replaced by incrementally refreshed tables
+            cursor.execute('''DROP MATERIALIZED VIEW %s''' % name)
+
+    created = False
     try:
         len(SensorValueDaily.objects.all())
     except ProgrammingError:
-        cursor.execute('''CREATE MATERIALIZED VIEW server_sensorvaluedaily AS
-                    SELECT row_number() OVER (ORDER BY timestamp) AS id,
-                        sensor_id,
-                        date_trunc('day', timestamp)::timestamp::timestamptz AS timestamp,
-                        avg(value) AS value
-                    FROM ( SELECT server_sensorvalue.sensor_id,
-                        '1970-01-01 00:00:00'::timestamp without time zone + '1 day'::interval * (date_part('epoch'::text, server_sensorvalue."timestamp")::integer / 86400)::double precision AS timestamp,
-                        server_sensorvalue.value
-                        FROM server_sensorvalue) t1
-                    GROUP BY  t1.timestamp, t1.sensor_id
-                    ORDER BY t1.timestamp;''')
+        # sum and count allow to derive the monthly aggregates
+        cursor.execute('''CREATE TABLE server_sensorvaluedaily (
+                        id serial PRIMARY KEY,
+                        sensor_id integer NOT NULL,
+                        timestamp timestamp with time zone NOT NULL,
+                        value double precision NOT NULL,
+                        sum double precision NOT NULL,
+                        count integer NOT NULL);''')
+        cursor.execute('''CREATE UNIQUE INDEX server_sensorvaluedaily_sensor_date ON server_sensorvaluedaily (sensor_id, timestamp);''')
         cursor.execute('''CREATE INDEX server_sensorvaluedaily_date ON server_sensorvaluedaily (timestamp);''')
+        created = True
 
     try:
         len(SensorValueMonthlySum.objects.all())
     except ProgrammingError:
-        cursor.execute('''CREATE MATERIALIZED VIEW server_sensorvaluemonthlysum AS
-                     SELECT row_number() OVER (ORDER BY t1.timestamp) AS id,
-                        t1.sensor_id,
-                        t1.timestamp,
-                        sum(t1.value) AS sum
-                       FROM ( SELECT date_trunc('month'::text, server_sensorvalue."timestamp")::timestamp::date AS timestamp,
-                                server_sensorvalue.sensor_id,
-                                server_sensorvalue.value
-                               FROM server_sensorvalue INNER JOIN server_sensor ON server_sensor.id=server_sensorvalue.sensor_id
-                               WHERE server_sensor.aggregate_sum=TRUE) t1
-                      GROUP BY t1.timestamp, t1.sensor_id
-                      ORDER BY t1.timestamp
-                    WITH DATA;''')
+        cursor.execute('''CREATE TABLE server_sensorvaluemonthlysum (
+                        id serial PRIMARY KEY,
+                        sensor_id integer NOT NULL,
+                        timestamp date NOT NULL,
+                        sum double precision NOT NULL);''')
+        cursor.execute('''CREATE UNIQUE INDEX server_sensorvaluemonthlysum_sensor_date ON server_sensorvaluemonthlysum (sensor_id, timestamp);''')
+        created = True
 
     try:
         len(SensorValueMonthlyAvg.objects.all())
     except ProgrammingError:
-        # could be derived from server_sensorvaluehourly
-        cursor.execute('''CREATE MATERIALIZED VIEW server_sensorvaluemonthlyavg AS
-                     SELECT row_number() OVER (ORDER BY t1.timestamp) AS id,
-                        t1.sensor_id,
-                        t1.timestamp,
-                        avg(t1.value) AS avg
-                       FROM ( SELECT date_trunc('month'::text, server_sensorvalue."timestamp")::timestamp::date AS timestamp,
-                                server_sensorvalue.sensor_id,
-                                server_sensorvalue.value
-                               FROM server_sensorvalue INNER JOIN server_sensor ON server_sensor.id=server_sensorvalue.sensor_id
-                               WHERE server_sensor.aggregate_avg=TRUE) t1
-                      GROUP BY t1.timestamp, t1.sensor_id
-                      ORDER BY t1.timestamp
-                    WITH DATA;''')
+        cursor.execute('''CREATE TABLE server_sensorvaluemonthlyavg (
+                        id serial PRIMARY KEY,
+                        sensor_id integer NOT NULL,
+                        timestamp date NOT NULL,
+                        avg double precision NOT NULL);''')
+        cursor.execute('''CREATE UNIQUE INDEX server_sensorvaluemonthlyavg_sensor_date ON server_sensorvaluemonthlyavg (sensor_id, timestamp);''')
+        created = True
+
+    if created or (not SensorValueRollup.objects.exists() and SensorValue.objects.exists()):
+        # aggregate the whole history once
+        Configuration.objects.filter(key=HIGH_WATER_MARK).delete()
+        refresh_views()
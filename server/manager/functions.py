@@ -1,130 +1,152 @@
+import uuid
 import logging
 import calendar
 from datetime import datetime
 
 from django.db.models import Sum
 from django.utils.timezone import utc
+from django.core.cache import cache
 
-from server.models import Device, Sensor, SensorValue, SensorValueMonthlySum
-from server.functions import get_configuration
+from server.models import Device, SensorValue, SensorValueMonthlySum
+from server.functions import get_configuration, get_devices_and_sensors, get_past_time
 
 logger = logging.getLogger('django')
 
 
-def get_total_balance_by_date(month, year):
+BALANCE_CACHE_TIMEOUT = 10 * 60  # seconds, the monthly sums are refreshed more often
+PAST_YEAR_CACHE_TIMEOUT = 24 * 60 * 60  # seconds, values of past years don't change
 
-    start = datetime(year, month, 1).replace(tzinfo=utc)
-    end = datetime(year, month, calendar.mdays[month]).replace(tzinfo=utc)
+BALANCE_SENSORS = {
+    'gas_consumption': ([Device.CU, Device.PLB], 'current_gas_consumption'),
+    'electrical_purchase': ([Device.PM], 'purchased'),
+    'thermal_consumption': ([Device.TC], 'get_consumption_power'),
+    'warmwater_consumption': ([Device.TC], 'get_warmwater_consumption_power'),
+    'electrical_consumption': ([Device.EC], 'get_consumption_power'),
+    'electrical_infeed': ([Device.PM], 'fed_in_electricity'),
+}
+"""The kWh totals of a balance with the device types and the sensor key they are summed from"""
 
-    # calculate costs
-    sensor_ids = Sensor.objects.filter(
-        device__device_type__in=[Device.CU, Device.PLB]).values_list('id', flat=True)
 
-    sensor_values_sum = SensorValueMonthlySum.objects.filter(
-        timestamp__gte=start, timestamp__lte=end, sensor_id__in=sensor_ids)
+def invalidate_monthly_caches():
+    """Discards all cached balance totals and monthly aggregates, call this after the monthly sums changed.
 
-    sensor_values = sensor_values_sum.filter(
-        sensor__key='current_gas_consumption')
+    :returns: the new cache generation
+    """
+    generation = uuid.uuid4().hex
+    cache.set('monthly_generation', generation, BALANCE_CACHE_TIMEOUT)
+    return generation
 
-    total_gas_consumption = 0
-    for sensor_value in sensor_values:
-        total_gas_consumption += sensor_value.sum
 
-    gas_costs = get_configuration('gas_costs')
-    costs = total_gas_consumption * gas_costs
+def get_cache_generation():
+    """Returns the cache generation, which is part of all keys of cached monthly data"""
+    generation = cache.get('monthly_generation')
+    if generation is None:
+        generation = invalidate_monthly_caches()
+    return generation
 
-    # Calculate electrical purchase
-    sensor_ids = Sensor.objects.filter(
-        device__device_type=Device.PM).values_list('id', flat=True)
-    sensor_values_sum = SensorValueMonthlySum.objects.filter(
-        timestamp__gte=start, timestamp__lte=end, sensor_id__in=sensor_ids)
-    sensor_values = sensor_values_sum.filter(sensor__key='purchased')
 
-    total_electrical_purchase = 0
-    for sensor_value in sensor_values:
-        total_electrical_purchase += sensor_value.sum
+def get_balance_totals(months):
+    """Returns a `dict` with the kWh totals of :const:`BALANCE_SENSORS` for every (year, month).
+    The totals are cached per month, all missing months are fetched with one grouped query.
 
-    electrical_costs = get_configuration('electrical_costs')
-    costs += total_electrical_purchase * electrical_costs
+    :param list months: (year, month) tuples
+    """
+    generation = get_cache_generation()
+    keys = dict(('balance_%s_%d_%d' % (generation, year, month), (year, month)) for year, month in months)
+    totals = dict((keys[key], value) for key, value in cache.get_many(keys.keys()).items())
 
-    # calculate rewards
+    missing = [month for month in months if month not in totals]
+    if len(missing) == 0:
+        return totals
 
-    # thermal consumption
-    sensor_ids = Sensor.objects.filter(
-        device__device_type=Device.TC).values_list('id', flat=True)
-    sensor_values_sum = SensorValueMonthlySum.objects.filter(
-        timestamp__gte=start, timestamp__lte=end, sensor_id__in=sensor_ids)
-    sensor_values = sensor_values_sum.filter(
-        sensor__key='get_consumption_power')
+    fetched = dict((month, dict((name, 0) for name in BALANCE_SENSORS)) for month in missing)
+    last_year, last_month = max(missing)
+    start = datetime(min(missing)[0], min(missing)[1], 1).replace(tzinfo=utc)
+    end = datetime(last_year, last_month, calendar.mdays[last_month]).replace(tzinfo=utc)
 
-    total_thermal_consumption = 0
-    for sensor_value in sensor_values:
-        total_thermal_consumption += sensor_value.sum
+    rows = SensorValueMonthlySum.objects.filter(
+        timestamp__gte=start, timestamp__lte=end, sensor__key__in=[key for types, key in BALANCE_SENSORS.values()]).\
+        values('timestamp', 'sensor__device__device_type', 'sensor__key').annotate(total=Sum('sum'))
+    for row in rows:
+        month = (row['timestamp'].year, row['timestamp'].month)
+        if month not in fetched:
+            continue
+        for name, (device_types, key) in BALANCE_SENSORS.items():
+            if row['sensor__key'] == key and row['sensor__device__device_type'] in device_types:
+                fetched[month][name] += row['total']
 
-    thermal_revenues = get_configuration('thermal_revenues')
-    rewards = total_thermal_consumption * thermal_revenues
+    cache.set_many(dict((key, fetched[month]) for key, month in keys.items() if month in fetched),
+                   BALANCE_CACHE_TIMEOUT)
+    totals.update(fetched)
+    return totals
 
-    # warmwater consumption
-    sensor_values_sum = SensorValueMonthlySum.objects.filter(
-        timestamp__gte=start, timestamp__lte=end, sensor_id__in=sensor_ids)
-    sensor_values = sensor_values_sum.filter(
-        sensor__key='get_warmwater_consumption_power')
 
-    total_warmwater_consumption = 0
-    for sensor_value in sensor_values:
-        total_warmwater_consumption += sensor_value.sum
+def get_total_balances(months):
+    """Returns the costs and rewards of every (year, month) in `months`, see :func:`get_total_balance_by_date`"""
+    totals = get_balance_totals(months)
 
+    gas_costs = get_configuration('gas_costs')
+    electrical_costs = get_configuration('electrical_costs')
+    thermal_revenues = get_configuration('thermal_revenues')
     warmwater_revenues = get_configuration('warmwater_revenues')
-    rewards += total_warmwater_consumption * \
-        get_configuration('warmwater_revenues')
-
-    # electrical consumption
-    sensor_ids = Sensor.objects.filter(
-        device__device_type=Device.EC).values_list('id', flat=True)
-    sensor_values_sum = SensorValueMonthlySum.objects.filter(
-        timestamp__gte=start, timestamp__lte=end, sensor_id__in=sensor_ids)
-    sensor_values = sensor_values_sum.filter(
-        sensor__key='get_consumption_power')
-
-    total_electrical_consumption = 0
-    for sensor_value in sensor_values:
-        total_electrical_consumption += sensor_value.sum
-
     electrical_revenues = get_configuration('electrical_revenues')
-    rewards += total_electrical_consumption * electrical_revenues
+    feed_in_reward = get_configuration('feed_in_reward')
 
-    # electrical infeed
-    sensor_ids = Sensor.objects.filter(
-        device__device_type=Device.PM).values_list('id', flat=True)
-    sensor_values_sum = SensorValueMonthlySum.objects.filter(
-        timestamp__gte=start, timestamp__lte=end, sensor_id__in=sensor_ids)
-    sensor_values = sensor_values_sum.filter(sensor__key='fed_in_electricity')
+    output = []
+    for month in months:
+        kwh = totals[month]
+        costs = kwh['gas_consumption'] * gas_costs + \
+            kwh['electrical_purchase'] * electrical_costs
+        rewards = kwh['thermal_consumption'] * thermal_revenues + \
+            kwh['warmwater_consumption'] * warmwater_revenues + \
+            kwh['electrical_consumption'] * electrical_revenues + \
+            kwh['electrical_infeed'] * feed_in_reward
+
+        output.append({
+            'costs': round(-costs, 2),
+            'rewards': round(rewards, 2),
+            'balance': round(rewards - costs, 2),
+            'prices': {
+                'gas_costs': -gas_costs,
+                'electrical_costs': -electrical_costs,
+                'thermal_revenues': thermal_revenues,
+                'warmwater_revenues': warmwater_revenues,
+                'electrical_revenues': electrical_revenues,
+                'feed_in_reward': feed_in_reward
+            },
+            'kwh': dict((name, round(value, 2)) for name, value in kwh.items())
+        })
+    return output
 
-    total_electrical_infeed = 0
-    for sensor_value in sensor_values:
-        total_electrical_infeed += sensor_value.sum
 
-    feed_in_reward = get_configuration('feed_in_reward')
-    rewards += total_electrical_infeed * feed_in_reward
-
-    return {
-        'costs': round(-costs, 2),
-        'rewards': round(rewards, 2),
-        'balance': round(rewards - costs, 2),
-        'prices': {
-            'gas_costs': -gas_costs,
-            'electrical_costs': -electrical_costs,
-            'thermal_revenues': thermal_revenues,
-            'warmwater_revenues': warmwater_revenues,
-            'electrical_revenues': electrical_revenues,
-            'feed_in_reward': feed_in_reward
-        },
-        'kwh': {
-            'gas_consumption': round(total_gas_consumption, 2),
-            'electrical_purchase': round(total_electrical_purchase, 2),
-            'thermal_consumption': round(total_thermal_consumption, 2),
-            'warmwater_consumption': round(total_warmwater_consumption, 2),
-            'electrical_consumption': round(total_electrical_consumption, 2),
-            'electrical_infeed': round(total_electrical_infeed, 2)
-        }
-    }
\ No newline at end of file
+def get_total_balance_by_date(month, year):
+    return get_total_balances([(year, month)])[0]
+
+
+def get_monthly_aggregates(model, field, aggregate, year):
+    """Returns a `dict` with a list of {'timestamp', 'total'} per month for every sensor.
+    All sensors are aggregated in one grouped query. The result is cached per year and cache generation,
+    years before the latest values rarely change and are kept longer.
+
+    :param model: |SensorValueMonthlySum| or |SensorValueMonthlyAvg|
+    :param string field: the aggregated column of `model`
+    :param aggregate: the aggregate function, f.e. ``Sum``
+    """
+    key = 'monthly_%s_%s_%s_%d' % (get_cache_generation(), model.__name__, field, year)
+    if year < get_past_time(use_view=True).year:
+        timeout = PAST_YEAR_CACHE_TIMEOUT
+    else:
+        timeout = BALANCE_CACHE_TIMEOUT
+
+    output = cache.get(key)
+    if output is None:
+        start = datetime(year, 1, 1).replace(tzinfo=utc)
+        end = datetime(year, 12, 31).replace(tzinfo=utc)
+
+        output = dict((sensor.id, []) for sensor in get_devices_and_sensors()[1])
+        rows = model.objects.filter(timestamp__gte=start, timestamp__lte=end).\
+            values('sensor', 'timestamp').annotate(total=aggregate(field)).order_by('sensor', 'timestamp')
+        for row in rows:
+            output.setdefault(row['sensor'], []).append({'timestamp': row['timestamp'], 'total': row['total']})
+        cache.set(key, output, timeout)
+    return output
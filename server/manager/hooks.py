@@ -1,6 +1,5 @@
 import logging
-import calendar
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from django.db.models import Sum, Avg
 from django.db import connection
@@ -8,8 +7,8 @@ from django.core.exceptions import PermissionDenied
 from django.utils.timezone import utc
 
 from server.models import Device, Sensor, SensorValue, SensorValueMonthlySum, SensorValueMonthlyAvg
-from server.functions import get_configuration, get_past_time
-from server.helpers import create_json_response
+from server.functions import get_configuration, get_past_time, get_sensor_series
+from server.helpers import create_json_response, downsample_lttb
 import functions
 
 logger = logging.getLogger('django')
@@ -20,23 +19,11 @@ def get_sums(request, sensor_id=None, year=None):
         raise PermissionDenied
 
     if year is None:
-        start = datetime(datetime.today().year, 1, 1).replace(tzinfo=utc)
-        end = datetime(datetime.today().year, 12, 31).replace(tzinfo=utc)
-    else:
-        start = datetime(int(year), 1, 1).replace(tzinfo=utc)
-        end = datetime(int(year), 12, 31).replace(tzinfo=utc)
-
-    sensorvaluemonthlysum = SensorValueMonthlySum.objects.filter(
-        timestamp__gte=start, timestamp__lte=end)
+        year = datetime.today().year
 
-    if sensor_id is None:
-        output = {}
-        for sensor in Sensor.objects.all().values_list('id', flat=True):
-            output[sensor] = list(sensorvaluemonthlysum.filter(
-                sensor_id=sensor).values('timestamp').annotate(total=Sum('sum')).order_by('timestamp'))
-    else:
-        output = list(sensorvaluemonthlysum.filter(
-            sensor_id=sensor_id).values('timestamp').annotate(total=Sum('sum')).order_by('timestamp'))
+    output = functions.get_monthly_aggregates(SensorValueMonthlySum, 'sum', Sum, int(year))
+    if sensor_id is not None:
+        output = output.get(int(sensor_id), [])
 
     return create_json_response(output, request)
 
@@ -46,23 +33,11 @@ def get_avgs(request, sensor_id=None, year=None):
         raise PermissionDenied
 
     if year is None:
-        start = datetime(datetime.today().year, 1, 1).replace(tzinfo=utc)
-        end = datetime(datetime.today().year, 12, 31).replace(tzinfo=utc)
-    else:
-        start = datetime(int(year), 1, 1).replace(tzinfo=utc)
-        end = datetime(int(year), 12, 31).replace(tzinfo=utc)
+        year = datetime.today().year
 
-    sensorvaluemonthlyavg = SensorValueMonthlyAvg.objects.filter(
-        timestamp__gte=start, timestamp__lte=end)
-
-    if sensor_id is None:
-        output = {}
-        for sensor in Sensor.objects.all().values_list('id', flat=True):
-            output[sensor] = list(sensorvaluemonthlyavg.filter(
-                sensor_id=sensor).values('timestamp').annotate(total=Avg('avg')).order_by('timestamp'))
-    else:
-        output = list(sensorvaluemonthlyavg.filter(
-            sensor_id=sensor_id).values('timestamp').annotate(total=Avg('avg')).order_by('timestamp'))
+    output = functions.get_monthly_aggregates(SensorValueMonthlyAvg, 'avg', Avg, int(year))
+    if sensor_id is not None:
+        output = output.get(int(sensor_id), [])
 
     return create_json_response(output, request)
 
@@ -79,15 +54,43 @@ def get_sensorvalue_history_list(request):
     return create_json_response(output, request)
 
 
+def get_requested_points(request):
+    """Returns the number of values requested with ``points=N`` or ``None``, if all values should be returned"""
+    try:
+        return int(request.GET['points'])
+    except (KeyError, ValueError):
+        return None
+
+
 def get_detailed_sensor_values(request, sensor_id):
     if not request.user.is_authenticated():
         raise PermissionDenied
 
     start = get_past_time(days=1)
     sensor_values = list(SensorValue.objects.filter(
-        sensor_id=sensor_id, timestamp__gte=start).values_list('timestamp', 'value'))
+        sensor_id=sensor_id, timestamp__gte=start).order_by('timestamp').values_list('timestamp', 'value'))
 
-    return create_json_response(sensor_values, request)
+    return create_json_response(downsample_lttb(sensor_values, get_requested_points(request)), request)
+
+
+def sensor_series(request, sensor_id):
+    """Returns aggregated values of a sensor in a resolution fitting the requested time range.
+    ``start`` and ``end`` are unix timestamps, ``points`` is the minimal number of values."""
+    if not request.user.is_authenticated():
+        raise PermissionDenied
+
+    try:
+        end = datetime.utcfromtimestamp(int(request.GET['end'])).replace(tzinfo=utc)
+    except (KeyError, ValueError):
+        end = get_past_time()
+    try:
+        start = datetime.utcfromtimestamp(int(request.GET['start'])).replace(tzinfo=utc)
+    except (KeyError, ValueError):
+        start = end - timedelta(days=1)
+    points = get_requested_points(request) or 500
+
+    resolution, values = get_sensor_series(sensor_id, start, end, points)
+    return create_json_response({'resolution': resolution, 'data': values}, request)
 
 
 def get_daily_loads(request):
@@ -95,6 +98,7 @@ def get_daily_loads(request):
         raise PermissionDenied
 
     start = get_past_time(days=1)
+    points = get_requested_points(request)
     sensors = Sensor.objects.filter(
         device__device_type=Device.TC, key='get_consumption_power').values_list('id', flat=True)
 
@@ -104,20 +108,20 @@ def get_daily_loads(request):
         'electrical': {},
     }
     for sensor_id in sensors:
-        output['thermal'][sensor_id] = list(SensorValue.objects.filter(
-            sensor__id=sensor_id, timestamp__gte=start).values_list('timestamp', 'value'))
+        output['thermal'][sensor_id] = downsample_lttb(list(SensorValue.objects.filter(
+            sensor__id=sensor_id, timestamp__gte=start).order_by('timestamp').values_list('timestamp', 'value')), points)
 
     sensors = Sensor.objects.filter(
         device__device_type=Device.TC, key='get_warmwater_consumption_power').values_list('id', flat=True)
     for sensor_id in sensors:
-        output['warmwater'][sensor_id] = list(SensorValue.objects.filter(
-            sensor__id=sensor_id, timestamp__gte=start).values_list('timestamp', 'value'))
+        output['warmwater'][sensor_id] = downsample_lttb(list(SensorValue.objects.filter(
+            sensor__id=sensor_id, timestamp__gte=start).order_by('timestamp').values_list('timestamp', 'value')), points)
 
     sensors = Sensor.objects.filter(
         device__device_type=Device.EC, key='get_consumption_power').values_list('id', flat=True)
     for sensor_id in sensors:
-        output['electrical'][sensor_id] = list(SensorValue.objects.filter(
-            sensor__id=sensor_id, timestamp__gte=start).values_list('timestamp', 'value'))
+        output['electrical'][sensor_id] = downsample_lttb(list(SensorValue.objects.filter(
+            sensor__id=sensor_id, timestamp__gte=start).order_by('timestamp').values_list('timestamp', 'value')), points)
 
     return create_json_response(output, request)
 
@@ -140,12 +144,7 @@ def get_total_balance(request, year=None, month=None):
         except (TypeError, ValueError):
             months = [current.month]
 
-    output = []
-    for month in months:
-        start = datetime(year, month, 1).replace(tzinfo=utc)
-        end = datetime(year, month, calendar.mdays[month]).replace(tzinfo=utc)
-
-        output.append(functions.get_total_balance_by_date(month, year))
+    output = functions.get_total_balances([(year, month) for month in months])
 
     return create_json_response(output, request)
 
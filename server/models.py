@@ -92,6 +92,24 @@ class SensorValue(models.Model):
     value = models.FloatField()
     timestamp = models.DateTimeField(auto_now=False, db_index=True)
 
+    class Meta:
+        # speeds up the lookup of the latest values per sensor
+        index_together = [['sensor', 'timestamp']]
+
+    def __unicode__(self):
+        return str(self.pk) + " (" + self.sensor.name + ")"
+
+
+class SensorLatestValue(models.Model):
+
+    """
+    The latest value of every sensor, maintained whenever sensor values are stored.
+    Use the accessors in server.functions instead of querying the growing SensorValue table.
+    """
+    sensor = models.OneToOneField('Sensor', primary_key=True)
+    value = models.FloatField()
+    timestamp = models.DateTimeField(auto_now=False)
+
     def __unicode__(self):
         return str(self.pk) + " (" + self.sensor.name + ")"
 
@@ -151,6 +169,28 @@ class SensorValueMonthlyAvg(models.Model):
         return str(self.pk) + " (" + self.sensor.name + ")"
 
 
+class SensorValueRollup(models.Model):
+
+    """
+    Aggregated sensor values in buckets of `resolution` seconds, see ``server.functions.ROLLUP_RESOLUTIONS``.
+    Maintained by ``server.worker.functions.refresh_views``.
+    """
+    sensor = models.ForeignKey('Sensor')
+    resolution = models.PositiveIntegerField()
+    timestamp = models.DateTimeField(auto_now=False)
+    min = models.FloatField()
+    max = models.FloatField()
+    avg = models.FloatField()
+    sum = models.FloatField()
+    count = models.PositiveIntegerField()
+
+    class Meta:
+        index_together = [['sensor', 'resolution', 'timestamp']]
+
+    def __unicode__(self):
+        return str(self.pk) + " (" + self.sensor.name + ")"
+
+
 class Threshold(models.Model):
     Default = 0
     Primary = 1
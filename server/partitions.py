@@ -0,0 +1,148 @@
+"""
+|SensorValue|'s are stored in one table per month, which inherits from ``server_sensorvalue``.
+Queries against the parent table include all partitions, postgres skips partitions
+outside of a queried time range because of their CHECK constraints.
+Old values can be dropped with :func:`drop_partitions` instead of deleting rows.
+
+Values inserted by the ORM stay in the parent table, bulk inserts go to the partitions directly.
+
+Foreign keys can't reference the rows of the partitions. :func:`initialize_partitions` replaces
+the foreign key of notifications on sensor values by a trigger, which checks new and changed notifications.
+Deleted sensor values aren't checked, :func:`drop_partitions` deletes the notifications of the dropped values.
+"""
+import logging
+from datetime import datetime
+from threading import Lock
+
+from psycopg2.errorcodes import UNDEFINED_TABLE
+from django.db import connection, transaction
+from django.utils.timezone import utc
+
+logger = logging.getLogger('ecocontrol')
+
+PARENT_TABLE = 'server_sensorvalue'
+
+# partitions, which are known to exist in this process, see forget_partitions
+known_partitions = set()
+partition_lock = Lock()
+
+
+def get_partition_range(timestamp):
+    """Returns the start of the month of `timestamp` and the start of the next month"""
+    start = datetime(timestamp.year, timestamp.month, 1).replace(tzinfo=utc)
+    if timestamp.month == 12:
+        end = datetime(timestamp.year + 1, 1, 1).replace(tzinfo=utc)
+    else:
+        end = datetime(timestamp.year, timestamp.month + 1, 1).replace(tzinfo=utc)
+    return (start, end)
+
+
+def get_partition_name(timestamp):
+    """Returns the name of the table, which stores the values of the month of `timestamp`"""
+    return '%s_y%04dm%02d' % (PARENT_TABLE, timestamp.year, timestamp.month)
+
+
+def get_partitions():
+    """Returns the names of all existing partitions ordered by month"""
+    cursor = connection.cursor()
+    cursor.execute('''SELECT child.relname FROM pg_inherits
+        INNER JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        INNER JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = %s ORDER BY child.relname''', [PARENT_TABLE])
+    return [row[0] for row in cursor.fetchall()]
+
+
+def ensure_partition(timestamp):
+    """Creates the partition for the month of `timestamp`, if it doesn't exist yet.
+
+    :returns: the name of the partition
+    """
+    name = get_partition_name(timestamp)
+    with partition_lock:
+        if name in known_partitions:
+            return name
+
+        if name not in get_partitions():
+            start, end = get_partition_range(timestamp)
+            with transaction.atomic():
+                cursor = connection.cursor()
+                # ids, defaults and the value columns are inherited
+                cursor.execute('''CREATE TABLE %s (
+                        CHECK (timestamp >= %%s AND timestamp < %%s)
+                    ) INHERITS (%s)''' % (name, PARENT_TABLE), [start, end])
+                cursor.execute('ALTER TABLE %s ADD PRIMARY KEY (id)' % name)
+                cursor.execute('CREATE INDEX %s_sensor_timestamp ON %s (sensor_id, timestamp)' % (name, name))
+                cursor.execute('CREATE INDEX %s_timestamp ON %s (timestamp)' % (name, name))
+            logger.debug('Created sensor value partition %s' % name)
+
+        known_partitions.add(name)
+    return name
+
+
+def forget_partitions(names):
+    """Removes partitions from the partitions known to exist, so :func:`ensure_partition` checks them again.
+    Call this, if a partition was dropped by another process."""
+    with partition_lock:
+        for name in names:
+            known_partitions.discard(name)
+
+
+def is_missing_partition(error):
+    """Returns ``True``, if a database `error` was raised, because a table doesn't exist"""
+    for exception in [error, getattr(error, '__cause__', None)]:
+        if getattr(exception, 'pgcode', None) == UNDEFINED_TABLE:
+            return True
+    return False
+
+
+def drop_partitions(before):
+    """Drops all partitions of months, which ended before `before`, together with their notifications.
+    Dropping a table is instant and doesn't leave dead rows for vacuum.
+
+    :returns: the names of the dropped partitions
+    """
+    dropped = []
+    with partition_lock:
+        for name in get_partitions():
+            year, month = int(name[-7:-3]), int(name[-2:])
+            start, end = get_partition_range(datetime(year, month, 1))
+            if end > before:
+                continue
+
+            with transaction.atomic():
+                cursor = connection.cursor()
+                # notifications don't have a foreign key on partitions
+                cursor.execute('DELETE FROM server_notification WHERE sensor_value_id IN (SELECT id FROM %s)' % name)
+                cursor.execute('DROP TABLE %s' % name)
+            known_partitions.discard(name)
+            dropped.append(name)
+            logger.debug('Dropped sensor value partition %s' % name)
+    return dropped
+
+
+def initialize_partitions():
+    """Prepares ``server_sensorvalue`` for partitions. This can be called several times.
+
+    Foreign keys can only reference rows of the parent table,
+    so the foreign key of notifications on sensor values is replaced by a trigger.
+    """
+    cursor = connection.cursor()
+    cursor.execute('''SELECT conname FROM pg_constraint
+        WHERE contype = 'f' AND conrelid = 'server_notification'::regclass AND confrelid = %s::regclass''',
+                   [PARENT_TABLE])
+    for (constraint,) in cursor.fetchall():
+        cursor.execute('ALTER TABLE server_notification DROP CONSTRAINT %s' % constraint)
+
+    # queries on the parent table include the partitions
+    cursor.execute('''CREATE OR REPLACE FUNCTION server_notification_check_sensor_value() RETURNS trigger AS $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM server_sensorvalue WHERE id = NEW.sensor_value_id) THEN
+                RAISE foreign_key_violation USING MESSAGE = 'sensor value ' || NEW.sensor_value_id || ' does not exist';
+            END IF;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql''')
+    cursor.execute('DROP TRIGGER IF EXISTS server_notification_sensor_value ON server_notification')
+    cursor.execute('''CREATE TRIGGER server_notification_sensor_value
+        BEFORE INSERT OR UPDATE OF sensor_value_id ON server_notification
+        FOR EACH ROW EXECUTE PROCEDURE server_notification_check_sensor_value()''')
@@ -30,6 +30,43 @@ ALLOWED_HOSTS = []
 # Compile the cython (.pyx) version of a few, performance critical functions
 CYTHON_SUPPORT = True
 
+# Run forecasts on numpy state arrays instead of stepping every device object
+VECTORIZED_FORECASTS = True
+
+# Number of starting points of the parameter search of the double seasonal forecast, 0 searches from one guess
+DOUBLE_SEASONAL_STARTS = 64
+
+# Number of worker processes computing queued forecasts
+FORECAST_WORKERS = 2
+
+# Seconds to keep results of queued forecasts, which were not fetched
+FORECAST_RESULT_TTL = 10 * 60
+
+# Number of forecast results, which are kept in memory
+FORECAST_CACHE_SIZE = 16
+
+# Days before the latest value of every sensor, which are aggregated again on every refresh of the views,
+# so values committed after a refresh with lower ids than the already aggregated ones are included
+ROLLUP_REFRESH_DAYS = 2
+
+# Allowed relative deviation of measured values, before a rolling forecast is computed from scratch
+ROLLING_FORECAST_TOLERANCE = 0.05
+
+# Cache forecast values in one preallocated numpy buffer
+COLUMNAR_MEASUREMENTS = True
+
+# Directory for memory-mapped forecast buffers, if None the buffers are kept on the heap
+MEASUREMENT_MMAP_DIRECTORY = None
+
+# Number of sensor values of the demo simulation, which are written to the database at once
+SENSOR_VALUE_BATCH_SIZE = 1000
+
+# Seconds after which buffered sensor values are written, even if the batch isn't full
+SENSOR_VALUE_FLUSH_INTERVAL = 5
+
+# Number of simulation steps, which can wait for the database writer before the simulation is blocked
+SENSOR_VALUE_QUEUE_SIZE = 10000
+
 
 # Application definition
 
@@ -1,11 +1,21 @@
 import os
 import logging
 import json
+import calendar
+import time
+from datetime import datetime
+import dateutil.relativedelta
+
+import numpy as np
 
 from django.core.exceptions import ObjectDoesNotExist
+from django.core.cache import cache
+from django.db.models import Sum
 
-from server.models import Device, Configuration, DeviceConfiguration, Sensor, SensorValue, SensorValueMonthlyAvg, SensorValueMonthlySum, SensorValueDaily
-from server.functions import get_past_time, get_latest_value, get_latest_value_with_unit, get_configuration, get_device_configuration
+from server.models import Device, DeviceConfiguration, Sensor, SensorValue, SensorValueMonthlyAvg, SensorValueMonthlySum, SensorValueDaily
+from server.functions import get_configuration, get_device_configuration, get_devices_and_sensors, live_snapshot, CACHE_TIMEOUT
+from server.forecasting.resultcache import invalidate_forecast_cache
+from server.helpers import WebAPIEncoder
 from server.settings import BASE_DIR
 
 
@@ -46,6 +56,7 @@ def save_snippet(name, code):
 def apply_snippet(code):
     with open(os.path.join(BASE_DIR,'server/user_code.py'), "w") as snippet_file:
         snippet_file.write(code.encode('utf-8'))
+    invalidate_forecast_cache()
     return {
         'code': code,
         'status': 1
@@ -68,290 +79,189 @@ def get_modified_configurations(data):
     return configurations
 
 
-def get_statistics_for_cogeneration_unit(start=None, end=None):
-    output = []
+MAX_FORECAST_VARIANTS = 8
+"""The maximum number of variants of one forecast request, they are all simulated while the request waits"""
 
-    try:
-        for device in Device.objects.filter(device_type=Device.CU):
-            device_output = []
-            device_output.append(('type', Device.CU))
-            device_output.append(('device_id', device.id))
-            device_output.append(('device_name', device.name))
-
-            sensor_workload = Sensor.objects.get(device=device, key='workload')
-            sensor_consumption = Sensor.objects.get(
-                device=device, key='current_gas_consumption')
-            workloads = SensorValueDaily.objects.filter(sensor=sensor_workload)
-            workloads_monthly_avg = SensorValueMonthlyAvg.objects.filter(
-                sensor=sensor_workload)
-            consumptions_monthly_sum = SensorValueMonthlySum.objects.filter(
-                sensor=sensor_consumption)
-            if start is not None:
-                workloads = workloads.filter(timestamp__gte=start)
-                workloads_monthly_avg = workloads_monthly_avg.filter(
-                    timestamp__gte=start)
-                consumptions_monthly_sum = consumptions_monthly_sum.filter(
-                    timestamp__gte=start)
-            if end is not None:
-                workloads = workloads.filter(timestamp__lte=end)
-                workloads_monthly_avg = workloads_monthly_avg.filter(
-                    timestamp__lte=end)
-                consumptions_monthly_sum = consumptions_monthly_sum.filter(
-                    timestamp__lte=end)
-
-            hours_of_operation = workloads.filter(
-                value__gt=0).count() * 24
-
-            device_output.append(
-                ('hours_of_operation', round(hours_of_operation, 2)))
-
-            device_output.append(
-                ('average_workload', round(workloads_monthly_avg.latest('timestamp').avg, 2)))
-
-            thermal_efficiency = get_device_configuration(
-                device, 'thermal_efficiency')
-            electrical_efficiency = get_device_configuration(
-                device, 'electrical_efficiency')
-            max_gas_input = get_device_configuration(device, 'max_gas_input')
-
-            total_gas_consumption = consumptions_monthly_sum.latest('timestamp').sum
-            total_electrical_production = total_gas_consumption * \
-                electrical_efficiency
-            total_thermal_production = total_gas_consumption * \
-                thermal_efficiency
-            device_output.append(
-                ('total_thermal_production', round(total_thermal_production, 2)))
-            device_output.append(
-                ('total_electrical_production', round(total_electrical_production, 2)))
-            device_output.append(
-                ('total_gas_consumption', round(total_gas_consumption, 2)))
-
-            gas_costs = get_configuration('gas_costs')
-            operating_costs = total_gas_consumption * gas_costs
-            device_output.append(
-                ('operating_costs', round(operating_costs, 2)))
-
-            values = list(workloads)
-            device_output.append(('values_count', len(values)))
-
-            power_ons = 0
-            last_time_on = None
-            for value in values:
-                if last_time_on is None:
-                    last_time_on = value.value > 0
-
-                if (last_time_on and value.value == 0) or (not last_time_on and value.value > 0):
-                    power_ons += 1
-                    last_time_on = not last_time_on
-
-            device_output.append(('power_ons', power_ons))
-
-            output.append(dict(device_output))
-
-    except (Device.DoesNotExist, DeviceConfiguration.DoesNotExist, Configuration.DoesNotExist, Sensor.DoesNotExist, SensorValue.DoesNotExist, SensorValueMonthlyAvg.DoesNotExist) as e:
-        logger.warning("DoesNotExist error: %s" % e)
 
-    return output
+def get_variant_configurations(variants):
+    """Returns the modified configurations of every variant, see :func:`get_modified_configurations`.
 
+    :param list variants: a list of configuration changes per variant
+    :raises ValueError: if `variants` is not a list of 1 to :const:`MAX_FORECAST_VARIANTS` lists of changes
+    """
+    if not isinstance(variants, list) or not 0 < len(variants) <= MAX_FORECAST_VARIANTS:
+        raise ValueError('variants must be a list of 1 to %d variants' % MAX_FORECAST_VARIANTS)
+    for changes in variants:
+        if not isinstance(changes, list) or not all(
+                isinstance(change, dict) and all(key in change for key in ['device', 'key', 'type', 'value'])
+                for change in changes):
+            raise ValueError('every variant must be a list of configuration changes')
+    return [get_modified_configurations(changes) for changes in variants]
 
-def get_statistics_for_peak_load_boiler(start=None, end=None):
-    output = []
 
-    try:
-        for device in Device.objects.filter(device_type=Device.PLB):
-            device_output = []
-            device_output.append(('type', Device.PLB))
-            device_output.append(('device_id', device.id))
-            device_output.append(('device_name', device.name))
-
-            sensor_workload = Sensor.objects.get(device=device, key='workload')
-            sensor_consumption = Sensor.objects.get(
-                device=device, key='current_gas_consumption')
-            workloads = SensorValueDaily.objects.filter(sensor=sensor_workload)
-            workloads_monthly_avg = SensorValueMonthlyAvg.objects.filter(
-                sensor=sensor_workload)
-            consumptions_monthly_sum = SensorValueMonthlySum.objects.filter(
-                sensor=sensor_consumption)
-            if start is not None:
-                workloads = workloads.filter(timestamp__gte=start)
-                workloads_monthly_avg = workloads_monthly_avg.filter(
-                    timestamp__gte=start)
-                consumptions_monthly_sum = consumptions_monthly_sum.filter(
-                    timestamp__gte=start)
-            if end is not None:
-                workloads = workloads.filter(timestamp__lte=end)
-                workloads_monthly_avg = workloads_monthly_avg.filter(
-                    timestamp__lte=end)
-                consumptions_monthly_sum = consumptions_monthly_sum.filter(
-                    timestamp__lte=end)
-
-            hours_of_operation = workloads.filter(
-                value__gt=0).count() * 24
-
-            device_output.append(
-                ('hours_of_operation', round(hours_of_operation, 2)))
-
-            device_output.append(
-                ('average_workload', round(workloads_monthly_avg.latest('timestamp').avg, 2)))
-
-            thermal_efficiency = get_device_configuration(
-                device, 'thermal_efficiency')
-            max_gas_input = get_device_configuration(device, 'max_gas_input')
-
-            total_gas_consumption = consumptions_monthly_sum.latest('timestamp').sum
-            total_thermal_production = total_gas_consumption * \
-                thermal_efficiency
-            device_output.append(
-                ('total_thermal_production', round(total_thermal_production, 2)))
-            device_output.append(
-                ('total_gas_consumption', round(total_gas_consumption, 2)))
-
-            gas_costs = get_configuration('gas_costs')
-            operating_costs = total_gas_consumption * gas_costs
-            device_output.append(
-                ('operating_costs', round(operating_costs, 2)))
-
-            values = list(workloads)
-            device_output.append(('values_count', len(values)))
-
-            power_ons = 0
-            last_time_on = None
-            for value in values:
-                if last_time_on is None:
-                    last_time_on = value.value > 0
-
-                if (last_time_on and value.value == 0) or (not last_time_on and value.value > 0):
-                    power_ons += 1
-                    last_time_on = not last_time_on
-
-            device_output.append(('power_ons', power_ons))
-
-            output.append(dict(device_output))
-
-    except (Device.DoesNotExist, DeviceConfiguration.DoesNotExist, Configuration.DoesNotExist, Sensor.DoesNotExist, SensorValue.DoesNotExist, SensorValueMonthlyAvg.DoesNotExist) as e:
-        logger.warning("DoesNotExist error: %s" % e)
+def get_statistics_for_cogeneration_unit(start=None, end=None):
+    return get_statistics([(start, end)], [Device.CU])[0]
 
-    return output
+
+def get_statistics_for_peak_load_boiler(start=None, end=None):
+    return get_statistics([(start, end)], [Device.PLB])[0]
 
 
 def get_statistics_for_thermal_consumer(start=None, end=None):
-    output = []
+    return get_statistics([(start, end)], [Device.TC])[0]
 
-    try:
-        for device in Device.objects.filter(device_type=Device.TC):
-            device_output = []
-            device_output.append(('type', device.device_type))
-            device_output.append(('device_id', device.id))
-            device_output.append(('device_name', device.name))
 
-            sensor_values = SensorValueDaily.objects.all()
-            if start is not None:
-                sensor_values = sensor_values.filter(timestamp__gte=start)
-            if end is not None:
-                sensor_values = sensor_values.filter(timestamp__lte=end)
+def get_statistics_for_electrical_consumer(start=None, end=None):
+    return get_statistics([(start, end)], [Device.EC])[0]
 
-            thermal_consumption = 0
-            warmwater_consumption = 0
 
-            sensor1 = Sensor.objects.get(
-                device=device, key='get_consumption_power')
-            for value in sensor_values.filter(sensor=sensor1):
-                thermal_consumption += value.value * 24
+def get_statistics_for_power_meter(start=None, end=None):
+    return get_statistics([(start, end)], [Device.PM])[0]
 
-            sensor2 = Sensor.objects.get(
-                device=device, key='get_warmwater_consumption_power')
-            for value in sensor_values.filter(sensor=sensor2):
-                warmwater_consumption += value.value * 24
 
-            device_output.append(
-                ('thermal_consumption', round(thermal_consumption, 2)))
-            device_output.append(
-                ('warmwater_consumption', round(warmwater_consumption, 2)))
+STATISTICS_DEVICE_TYPES = [Device.CU, Device.PLB, Device.TC, Device.EC, Device.PM]
 
-            output.append(dict(device_output))
 
-    except (Device.DoesNotExist, Sensor.DoesNotExist, SensorValue.DoesNotExist) as e:
-        logger.warning("DoesNotExist error: %s" % e)
+def to_epoch(timestamp, default):
+    """Returns the unix timestamp of a datetime or a date (monthly aggregates) or `default` for ``None``"""
+    if timestamp is None:
+        return default
+    if isinstance(timestamp, datetime):
+        return calendar.timegm(timestamp.utctimetuple())
+    return calendar.timegm(timestamp.timetuple())
 
-    return output
 
+def fetch_series(model, field, sensor_ids, start, end):
+    """Returns (timestamps, values) arrays ordered by time per sensor id with one query"""
+    queryset = model.objects.filter(sensor_id__in=sensor_ids)
+    if start is not None:
+        queryset = queryset.filter(timestamp__gte=start)
+    if end is not None:
+        queryset = queryset.filter(timestamp__lte=end)
 
-def get_statistics_for_electrical_consumer(start=None, end=None):
-    output = []
+    series = {}
+    for sensor_id, timestamp, value in queryset.order_by('sensor', 'timestamp').values_list('sensor_id', 'timestamp', field):
+        timestamps, values = series.setdefault(sensor_id, ([], []))
+        timestamps.append(to_epoch(timestamp, None))
+        values.append(value)
+    return dict((sensor_id, (np.array(timestamps, dtype=np.float64), np.array(values, dtype=np.float64)))
+                for sensor_id, (timestamps, values) in series.items())
 
-    try:
-        for device in Device.objects.filter(device_type=Device.EC):
-            device_output = []
-            device_output.append(('type', device.device_type))
-            device_output.append(('device_id', device.id))
-            device_output.append(('device_name', device.name))
 
-            sensor_values = SensorValueMonthlySum.objects.all()
-            if start is not None:
-                sensor_values = sensor_values.filter(timestamp__gte=start)
-            if end is not None:
-                sensor_values = sensor_values.filter(timestamp__lte=end)
+def count_power_ons(workloads):
+    """Returns the number of changes between on (> 0) and off (== 0), negative values keep the state"""
+    states = workloads[workloads >= 0] > 0
+    if len(workloads) > 0 and workloads[0] < 0:
+        states = np.concatenate([[False], states])
+    return int(np.count_nonzero(states[1:] != states[:-1]))
 
-            electrical_consumption = 0
 
-            power = Sensor.objects.get(
-                device=device, key='get_consumption_power')
-            for value in sensor_values.filter(sensor=power):
-                electrical_consumption += value.sum
+def get_statistics(periods, device_types=STATISTICS_DEVICE_TYPES):
+    """Returns the statistics of all devices of `device_types` for every (start, end) period.
+    The values of all periods are fetched with one query per aggregate and split with NumPy,
+    so the number of queries doesn't depend on the number of periods or devices.
 
-            device_output.append(
-                ('electrical_consumption', electrical_consumption))
+    :param list periods: (start, end) tuples, ``None`` means unbounded
+    :returns: one list of statistics per period
+    """
+    if len(periods) == 0:
+        return []
 
-            output.append(dict(device_output))
+    devices, sensors = get_devices_and_sensors()
+    devices = sorted([device for device in devices if device.device_type in device_types], key=lambda device: device.id)
+    sensor_map = dict(((sensor.device_id, sensor.key), sensor.id) for sensor in sensors)
 
-    except (Device.DoesNotExist, Sensor.DoesNotExist, SensorValue.DoesNotExist) as e:
-        logger.warning("DoesNotExist error: %s" % e)
+    daily_keys = ['workload', 'get_consumption_power', 'get_warmwater_consumption_power']
+    sum_keys = ['current_gas_consumption', 'get_consumption_power', 'purchased', 'fed_in_electricity']
+    sensor_ids = lambda keys: [sensor_map[(device.id, key)] for device in devices for key in keys
+                               if (device.id, key) in sensor_map]
 
-    return output
+    # one range for all periods
+    overall_start = None if None in [start for start, end in periods] else min(start for start, end in periods)
+    overall_end = None if None in [end for start, end in periods] else max(end for start, end in periods)
+    daily = fetch_series(SensorValueDaily, 'value', sensor_ids(daily_keys), overall_start, overall_end)
+    monthly_avg = fetch_series(SensorValueMonthlyAvg, 'avg', sensor_ids(['workload']), overall_start, overall_end)
+    monthly_sum = fetch_series(SensorValueMonthlySum, 'sum', sensor_ids(sum_keys), overall_start, overall_end)
 
+    gas_costs = get_configuration('gas_costs') if Device.CU in device_types or Device.PLB in device_types else None
 
-def get_statistics_for_power_meter(start=None, end=None):
     output = []
+    for start, end in periods:
+        start_epoch, end_epoch = to_epoch(start, -np.inf), to_epoch(end, np.inf)
+
+        def values_of(series, device, key):
+            if (device.id, key) not in sensor_map:
+                raise Sensor.DoesNotExist('%s has no sensor %s' % (device, key))
+            timestamps, values = series.get(sensor_map[(device.id, key)], (np.array([]), np.array([])))
+            return values[(timestamps >= start_epoch) & (timestamps <= end_epoch)]
+
+        def latest_of(series, device, key):
+            values = values_of(series, device, key)
+            if len(values) == 0:
+                raise SensorValue.DoesNotExist('No aggregated values of %s for %s' % (key, device))
+            return values[-1]
+
+        period_output = []
+        for device_type in device_types:
+            for device in [device for device in devices if device.device_type == device_type]:
+                device_output = [('type', device.device_type), ('device_id', device.id), ('device_name', device.name)]
+                try:
+                    if device_type in [Device.CU, Device.PLB]:
+                        workloads = values_of(daily, device, 'workload')
+                        device_output.append(
+                            ('hours_of_operation', round(np.count_nonzero(workloads > 0) * 24, 2)))
+                        device_output.append(
+                            ('average_workload', round(latest_of(monthly_avg, device, 'workload'), 2)))
+
+                        total_gas_consumption = latest_of(monthly_sum, device, 'current_gas_consumption')
+                        thermal_efficiency = get_device_configuration(device, 'thermal_efficiency')
+                        device_output.append(
+                            ('total_thermal_production', round(total_gas_consumption * thermal_efficiency, 2)))
+                        if device_type == Device.CU:
+                            electrical_efficiency = get_device_configuration(device, 'electrical_efficiency')
+                            device_output.append(
+                                ('total_electrical_production', round(total_gas_consumption * electrical_efficiency, 2)))
+                        device_output.append(
+                            ('total_gas_consumption', round(total_gas_consumption, 2)))
+                        device_output.append(
+                            ('operating_costs', round(total_gas_consumption * gas_costs, 2)))
+
+                        device_output.append(('values_count', len(workloads)))
+                        device_output.append(('power_ons', count_power_ons(workloads)))
+
+                    elif device_type == Device.TC:
+                        device_output.append(('thermal_consumption', round(
+                            values_of(daily, device, 'get_consumption_power').sum() * 24, 2)))
+                        device_output.append(('warmwater_consumption', round(
+                            values_of(daily, device, 'get_warmwater_consumption_power').sum() * 24, 2)))
+
+                    elif device_type == Device.EC:
+                        device_output.append(('electrical_consumption', float(
+                            values_of(monthly_sum, device, 'get_consumption_power').sum())))
+
+                    elif device_type == Device.PM:
+                        device_output.append(('total_purchased', float(
+                            values_of(monthly_sum, device, 'purchased').sum())))
+                        device_output.append(('total_fed_in_electricity', float(
+                            values_of(monthly_sum, device, 'fed_in_electricity').sum())))
+
+                except (Sensor.DoesNotExist, SensorValue.DoesNotExist) as e:
+                    logger.warning("DoesNotExist error: %s" % e)
+                    continue
+
+                period_output.append(dict(device_output))
+        output.append(period_output)
 
-    try:
-        for device in Device.objects.filter(device_type=Device.PM):
-            device_output = []
-            device_output.append(('type', device.device_type))
-            device_output.append(('device_id', device.id))
-            device_output.append(('device_name', device.name))
-
-            sensor_values = SensorValueMonthlySum.objects.all()
-            if start is not None:
-                sensor_values = sensor_values.filter(timestamp__gte=start)
-            if end is not None:
-                sensor_values = sensor_values.filter(timestamp__lte=end)
-
-            total_purchased = 0
-            total_fed_in_electricity = 0
-
-            purchase = Sensor.objects.get(
-                device=device, key='purchased')
-            for value in sensor_values.filter(sensor=purchase):
-                total_purchased += value.sum
-
-            feed_in = Sensor.objects.get(
-                device=device, key='fed_in_electricity')
-            for value in sensor_values.filter(sensor=feed_in):
-                total_fed_in_electricity += value.sum
-
-            device_output.append(('total_purchased', total_purchased))
-            device_output.append(
-                ('total_fed_in_electricity', total_fed_in_electricity))
-
-            output.append(dict(device_output))
+    return output
 
-    except (Device.DoesNotExist, Sensor.DoesNotExist, SensorValue.DoesNotExist) as e:
-        logger.warning("DoesNotExist error: %s" % e)
 
-    return output
+LIVE_POLL_TIMEOUT = 30  # seconds a client waits for new live data
+LIVE_STREAM_DURATION = 5 * 60  # seconds a live data stream stays open, before the client has to reconnect
 
 
 def get_live_data():
+    """Returns the latest values of all devices from the in-memory :data:`server.functions.live_snapshot`.
+    The snapshot `version` can be passed to :func:`server.functions.LiveSnapshot.wait` to wait for the next update."""
     output = {
         'electrical_consumption': '',
         'cu_workload': '',
@@ -369,24 +279,44 @@ def get_live_data():
         'time': ''
     }
 
-    try:
-        output['time'] = SensorValue.objects.all().latest(
-            'timestamp').timestamp
-        last_month = get_past_time(months=1)
-
-        for device in Device.objects.all():
-            if device.device_type == Device.HS:
-                output['hs_temperature'] = get_latest_value_with_unit(
-                    device, 'get_temperature')
-            elif device.device_type == Device.PM:
-                output['infeed_costs'] = get_latest_value_with_unit(
-                    device, 'purchased')
-                output['infeed_reward'] = get_latest_value_with_unit(
-                    device, 'fed_in_electricity')
-            elif device.device_type == Device.CU:
-                output['cu_workload'] = get_latest_value_with_unit(
-                    device, 'workload')
-                workload = get_latest_value(device, 'workload')
+    version, values = live_snapshot.get()
+    output['version'] = version
+    if len(values) == 0:
+        return output
+
+    devices, sensors = get_devices_and_sensors()
+    sensor_map = dict(((sensor.device_id, sensor.key), sensor) for sensor in sensors)
+
+    def latest_value(device, key):
+        sensor = sensor_map.get((device.id, key))
+        if sensor is None or sensor.id not in values:
+            return None
+        return values[sensor.id][0]
+
+    def latest_value_with_unit(device, key):
+        value = latest_value(device, key)
+        if value is None:
+            return ''
+        return '%s %s' % (round(value, 2), sensor_map[(device.id, key)].unit)
+
+    latest_time = max(timestamp for value, timestamp in values.values())
+    output['time'] = latest_time
+    last_month = latest_time + dateutil.relativedelta.relativedelta(months=-1)
+
+    for device in devices:
+        if device.device_type == Device.HS:
+            output['hs_temperature'] = latest_value_with_unit(
+                device, 'get_temperature')
+        elif device.device_type == Device.PM:
+            output['infeed_costs'] = latest_value_with_unit(
+                device, 'purchased')
+            output['infeed_reward'] = latest_value_with_unit(
+                device, 'fed_in_electricity')
+        elif device.device_type == Device.CU:
+            output['cu_workload'] = latest_value_with_unit(
+                device, 'workload')
+            workload = latest_value(device, 'workload')
+            if workload is not None:
                 thermal_production = round(
                     workload * get_device_configuration(device, 'thermal_efficiency') / 100.0, 2)
                 output['cu_thermal_production'] = '%s kWh' % thermal_production
@@ -394,36 +324,63 @@ def get_live_data():
                     workload * get_device_configuration(device, 'electrical_efficiency') / 100.0, 2)
                 output[
                     'cu_electrical_production'] = '%s kWh' % electrical_efficiency
-                output['cu_operating_costs'] = get_operating_costs(
-                    device, last_month)
-            elif device.device_type == Device.PLB:
-                output['plb_workload'] = get_latest_value_with_unit(
-                    device, 'workload')
+            output['cu_operating_costs'] = get_operating_costs(
+                device, last_month)
+        elif device.device_type == Device.PLB:
+            output['plb_workload'] = latest_value_with_unit(
+                device, 'workload')
+            workload = latest_value(device, 'workload')
+            if workload is not None:
                 thermal_production = round(
-                    get_latest_value(device, 'workload') * get_device_configuration(device, 'thermal_efficiency') / 100.0, 2)
+                    workload * get_device_configuration(device, 'thermal_efficiency') / 100.0, 2)
                 output[
                     'plb_thermal_production'] = '%s kWh' % thermal_production
-                output['plb_operating_costs'] = get_operating_costs(
-                    device, last_month)
-            elif device.device_type == Device.TC:
-                output['thermal_consumption'] = get_latest_value_with_unit(
-                    device, 'get_consumption_power')
-                output['warmwater_consumption'] = get_latest_value_with_unit(
-                    device, 'get_warmwater_consumption_power')
-            elif device.device_type == Device.EC:
-                output['electrical_consumption'] = get_latest_value_with_unit(
-                    device, 'get_consumption_power')
-    except SensorValue.DoesNotExist:
-        logger.debug('SensorValue.DoesNotExist')
+            output['plb_operating_costs'] = get_operating_costs(
+                device, last_month)
+        elif device.device_type == Device.TC:
+            output['thermal_consumption'] = latest_value_with_unit(
+                device, 'get_consumption_power')
+            output['warmwater_consumption'] = latest_value_with_unit(
+                device, 'get_warmwater_consumption_power')
+        elif device.device_type == Device.EC:
+            output['electrical_consumption'] = latest_value_with_unit(
+                device, 'get_consumption_power')
 
     return output
 
 
+def stream_live_data(timeout=LIVE_POLL_TIMEOUT, duration=LIVE_STREAM_DURATION):
+    """Yields the live data as server-sent events whenever the snapshot changes.
+    A comment is sent every `timeout` seconds without changes, to keep the connection open.
+
+    The stream ends after `duration` seconds, so a client, which disconnected, holds a worker at most that long.
+    ``EventSource`` clients reconnect by themselves.
+    The snapshot only sees values written by this process, values of other processes
+    show up when :data:`server.functions.live_snapshot` reloads them after its timeout."""
+    end = time.time() + duration
+    while True:
+        data = get_live_data()
+        yield 'data: %s\n\n' % json.dumps(data, cls=WebAPIEncoder, separators=(',', ':'))
+        while True:
+            remaining = end - time.time()
+            if remaining <= 0:
+                return
+            if live_snapshot.wait(data['version'], min(timeout, remaining)) != data['version']:
+                break
+            yield ': keep-alive\n\n'
+
+
 def get_operating_costs(device, start):
-    workload = Sensor.objects.get(device=device, key='workload')
-    max_gas_input = get_device_configuration(device, 'max_gas_input')
-    total_gas_consumption = 0
-    for value in SensorValueDaily.objects.filter(sensor=workload, timestamp__gte=start):
-        step = (value.value / 100.0) * (120 / 3600.0)
-        total_gas_consumption += max_gas_input * step
-    return '%s Euro' % round(total_gas_consumption * get_configuration('gas_costs'), 2)
+    """Returns the gas costs of a device since `start`.
+    The daily values only change with :func:`server.worker.functions.refresh_views`, so the costs are cached."""
+    key = 'operating_costs_%d_%s' % (device.id, start.date())
+    costs = cache.get(key)
+    if costs is None:
+        workload = Sensor.objects.get(device=device, key='workload')
+        max_gas_input = get_device_configuration(device, 'max_gas_input')
+        total_workload = SensorValueDaily.objects.filter(
+            sensor=workload, timestamp__gte=start).aggregate(total=Sum('value'))['total'] or 0
+        total_gas_consumption = max_gas_input * (total_workload / 100.0) * (120 / 3600.0)
+        costs = '%s Euro' % round(total_gas_consumption * get_configuration('gas_costs'), 2)
+        cache.set(key, costs, CACHE_TIMEOUT)
+    return costs
@@ -16,12 +16,14 @@ from django.db import connection
 from django.core.cache import cache
 from django.core.exceptions import PermissionDenied
 from django.views.decorators.gzip import gzip_page
+from django.http import StreamingHttpResponse
 
 from server.models import Device, Configuration, DeviceConfiguration, Sensor, SensorValue, SensorValueHourly, SensorValueDaily, SensorValueMonthlySum, Threshold, Notification
-from server.helpers import create_json_response
-from server.functions import get_device_configurations, get_past_time
+from server.helpers import create_json_response, create_streaming_json_response, accepts_series, create_series_response, to_equidistant_series
+from server.functions import get_device_configurations, get_past_time, get_devices_and_sensors, iterate_sensor_values, live_snapshot
 from server.devices import perform_configuration
-from server.forecasting import get_forecast, DemoSimulation, ForecastQueue
+from server.forecasting import get_forecast, get_forecasts, DemoSimulation, ForecastQueue
+from server.forecasting.resultcache import invalidate_forecast_cache
 import functions
 
 logger = logging.getLogger('django')
@@ -83,6 +85,7 @@ def configure(request):
         auto_optimization.value = data['auto_optimization']
         DEMO_SIMULATION.use_optimization = data['auto_optimization']
         auto_optimization.save()
+        invalidate_forecast_cache()
         return create_json_response({"auto_optimization": auto_optimization.value}, request)
     else:
         cache.clear()
@@ -147,10 +150,16 @@ def forecast(request):
             data = json.loads(request.body)
 
             if 'forecast_id' in data:
+                if 'cancel' in data:
+                    FORECAST_QUEUE.cancel(data['forecast_id'])
+                    return create_json_response({"forecast_id": data['forecast_id'], 'sensors': [], 'status': "cancelled"}, request)
+
                 result = FORECAST_QUEUE.get_by_id(data['forecast_id'])
                 if result == None:
+                    progress = FORECAST_QUEUE.get_progress(data['forecast_id'])
                     output = {"forecast_id": data[
-                        'forecast_id'], 'sensors': [], 'status': "running"}
+                        'forecast_id'], 'sensors': [], 'progress': progress,
+                        'status': "running" if progress is not None else "failed"}
                 else:
                     output = result
                     output["status"] = "finished"
@@ -160,6 +169,12 @@ def forecast(request):
             if 'code' in data:
                 code = data['code']
 
+            if 'variants' in data:
+                # simulate several configuration variants side by side
+                variants = functions.get_variant_configurations(data['variants'])
+                output = get_forecasts(initial_time, variants, code=code)
+                return create_json_response(output, request)
+
             configurations = None
             if 'configurations' in data:
                 configurations = functions.get_modified_configurations(
@@ -179,7 +194,14 @@ def forecast(request):
             logger.error(e)
             return create_json_response({"status": "failed"}, request)
     else:
-        output = get_forecast(initial_time)
+        output = get_forecast(initial_time, rolling=True)
+
+    if accepts_series(request) and 'start_timestamp' in output:
+        series = []
+        for sensor in output['sensors']:
+            entry = dict(sensor, start=output['start_timestamp'], step=output['step'])
+            series.append(entry)
+        return create_series_response(series, request)
 
     return create_json_response(output, request)
 
@@ -289,38 +311,39 @@ def list_sensor_values(request, interval='month'):
     if not request.user.is_superuser:
         raise PermissionDenied
 
-    output = []
     if interval == 'month':
-        sensor_values = SensorValueHourly.objects.\
-            filter(sensor__in_diagram=True).\
-            select_related(
-                'sensor__name', 'sensor__unit', 'sensor__key', 'sensor__device__name')
+        step = 3600
+        model = SensorValueHourly
+        start = None
     else:
+        step = 24 * 3600
+        model = SensorValueDaily
         start = get_past_time(years=1, use_view=True)
-        sensor_values = SensorValueDaily.objects.\
-            filter(timestamp__gte=start, sensor__in_diagram=True).\
-            select_related(
-                'sensor__name', 'sensor__unit', 'sensor__key', 'sensor__device__name')
-
-    values = {}
-    output = {}
-    for value in sensor_values:
-        # Save sensor data
-        if value.sensor.id not in values.keys():
-            values[value.sensor.id] = []
-            output[value.sensor.id] = {
-                'id': value.sensor.id,
-                'device': value.sensor.device.name,
-                'name': value.sensor.name,
-                'unit': value.sensor.unit,
-                'key': value.sensor.key,
+
+    sensors = dict((sensor.id, sensor) for sensor in get_devices_and_sensors()[1] if sensor.in_diagram)
+
+    def sensor_blocks(as_series=False):
+        # one sensor at a time from a server-side cursor
+        for sensor_id, values in iterate_sensor_values(model, sensors.keys(), start):
+            sensor = sensors[sensor_id]
+            block = {
+                'id': sensor.id,
+                'device': sensor.device.name,
+                'name': sensor.name,
+                'unit': sensor.unit,
+                'key': sensor.key,
             }
-        values[value.sensor.id].append((value.timestamp, value.value))
+            if as_series:
+                block['start'], block['data'] = to_equidistant_series(values, step)
+                block['step'] = step
+            else:
+                block['data'] = values
+            yield block
 
-    for sensor_id in output.keys():
-        output[sensor_id]['data'] = values[sensor_id]
+    if accepts_series(request):
+        return create_series_response(list(sensor_blocks(as_series=True)), request)
 
-    return create_json_response(output.values(), request)
+    return create_streaming_json_response(sensor_blocks(), request)
 
 
 def get_statistics(request):
@@ -330,12 +353,7 @@ def get_statistics(request):
     end = get_past_time(use_view=True)
     start = end + dateutil.relativedelta.relativedelta(months=-1)
 
-    output = []
-    output += functions.get_statistics_for_cogeneration_unit(start, end)
-    output += functions.get_statistics_for_peak_load_boiler(start, end)
-    output += functions.get_statistics_for_thermal_consumer(start, end)
-    output += functions.get_statistics_for_electrical_consumer(start, end)
-    output += functions.get_statistics_for_power_meter(start, end)
+    output = functions.get_statistics([(start, end)])[0]
 
     return create_json_response(output, request)
 
@@ -352,24 +370,15 @@ def get_monthly_statistics(request):
 
     months = sensor_values.extra({'month': "date_trunc('month', timestamp)"}).values(
         'month').annotate(count=Count('id'))
-    output = []
+    periods = []
     for month in months:
         month_start = month['month']
         month_end = month['month'] + dateutil.relativedelta.relativedelta(
             months=1) - timedelta(days=1)
-        month_data = []
-        month_data += functions.get_statistics_for_cogeneration_unit(
-            month_start, month_end)
-        month_data += functions.get_statistics_for_peak_load_boiler(
-            month_start, month_end)
-        month_data += functions.get_statistics_for_thermal_consumer(
-            month_start, month_end)
-        month_data += functions.get_statistics_for_electrical_consumer(
-            month_start, month_end)
-        month_data += functions.get_statistics_for_power_meter(
-            month_start, month_end)
-
-        output.append(month_data)
+        periods.append((month_start, month_end))
+
+    # all months at once
+    output = functions.get_statistics(periods)
 
     return create_json_response(output, request)
 
@@ -378,10 +387,25 @@ def live_data(request):
     if not request.user.is_superuser:
         raise PermissionDenied
 
+    if 'text/event-stream' in request.META.get('HTTP_ACCEPT', ''):
+        response = StreamingHttpResponse(
+            functions.stream_live_data(), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+    if 'since' in request.GET:
+        # long polling, wait until the snapshot is newer than the client's version
+        try:
+            live_snapshot.wait(int(request.GET['since']), functions.LIVE_POLL_TIMEOUT)
+        except ValueError:
+            pass
+
     return create_json_response(functions.get_live_data(), request)
 
 
 def initialize_globals():
     global DEMO_SIMULATION, FORECAST_QUEUE
-    DEMO_SIMULATION = DemoSimulation.start_or_get()
+    # fork the forecast workers before any threads are started
     FORECAST_QUEUE = ForecastQueue()
+    FORECAST_QUEUE.start_pool()
+    DEMO_SIMULATION = DemoSimulation.start_or_get()
@@ -0,0 +1,28 @@
+from django.test import TestCase
+from django.db import connection
+
+from server.management.defaults import initialize_indexes
+
+
+class DefaultsTestCase(TestCase):
+
+    def get_sensor_timestamp_indexes(self):
+        cursor = connection.cursor()
+        cursor.execute('''SELECT indexname FROM pg_indexes
+            WHERE tablename = 'server_sensorvalue' AND indexdef LIKE %s''', ['%(sensor_id, "timestamp")'])
+        return [row[0] for row in cursor.fetchall()]
+
+    def test_initialize_indexes(self):
+        # an installation, whose table was created before the index was added to the model
+        for name in self.get_sensor_timestamp_indexes():
+            connection.cursor().execute('DROP INDEX %s' % name)
+
+        initialize_indexes()
+        initialize_indexes()
+        self.assertEqual(self.get_sensor_timestamp_indexes(), ['server_sensorvalue_sensor_timestamp'])
+
+        # the index of syncdb is kept
+        connection.cursor().execute('DROP INDEX server_sensorvalue_sensor_timestamp')
+        connection.cursor().execute('CREATE INDEX server_sensorvalue_c7542b02 ON server_sensorvalue (sensor_id, timestamp)')
+        initialize_indexes()
+        self.assertEqual(self.get_sensor_timestamp_indexes(), ['server_sensorvalue_c7542b02'])
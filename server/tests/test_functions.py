@@ -0,0 +1,120 @@
+import unittest
+from datetime import datetime, timedelta
+
+from mock import patch
+from django.test import TestCase
+from django.utils.timezone import utc
+
+from server.models import Configuration, DeviceConfiguration, SensorLatestValue
+from server.functions import get_sensor_series, ConfigurationRegistry, LiveSnapshot, update_latest_sensor_values
+
+
+class SensorSeriesTestCase(unittest.TestCase):
+
+    def get_resolution(self, span, points):
+        end = datetime(2014, 6, 1).replace(tzinfo=utc)
+        with patch('server.functions.SensorValueRollup') as rollup:
+            rollup.objects.filter.return_value.order_by.return_value.values_list.return_value = []
+            resolution, values = get_sensor_series(1, end - span, end, points)
+            self.assertEqual(rollup.objects.filter.call_args[1]['resolution'], resolution)
+        return resolution
+
+    def test_resolution(self):
+        self.assertEqual(self.get_resolution(timedelta(hours=1), 500), 60)
+        self.assertEqual(self.get_resolution(timedelta(days=7), 500), 15 * 60)
+        self.assertEqual(self.get_resolution(timedelta(days=30), 500), 60 * 60)
+        self.assertEqual(self.get_resolution(timedelta(days=3 * 365), 500), 24 * 60 * 60)
+        self.assertEqual(self.get_resolution(timedelta(days=1), 24), 60 * 60)
+
+
+class ConfigurationRegistryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.configurations = [Configuration(key='gas_costs', value='0.07', value_type=Configuration.FLOAT),
+                               Configuration(key='auto_optimization', value='True', value_type=Configuration.BOOL)]
+        self.device_configurations = [DeviceConfiguration(device_id=3, key='max_gas_input', value='19',
+                                                          value_type=DeviceConfiguration.INT)]
+        for model, values in [('Configuration', self.configurations), ('DeviceConfiguration', self.device_configurations)]:
+            patcher = patch('server.functions.%s.objects' % model)
+            patcher.start().all.side_effect = lambda values=values: list(values)
+            self.addCleanup(patcher.stop)
+
+    def test_typed_lookups(self):
+        registry = ConfigurationRegistry()
+        self.assertEqual(registry.get('gas_costs'), 0.07)
+        self.assertIs(registry.get('auto_optimization'), True)
+        self.assertEqual(registry.get_device(3, 'max_gas_input'), 19)
+        self.assertIsNone(registry.get_device(4, 'max_gas_input'))
+        self.assertRaises(Configuration.DoesNotExist, registry.get, 'unknown')
+        # loaded once
+        self.assertEqual(Configuration.objects.all.call_count, 1)
+
+    def test_invalidate(self):
+        registry = ConfigurationRegistry()
+        registry.get('gas_costs')
+        self.configurations[0].value = '0.08'
+        self.assertEqual(registry.get('gas_costs'), 0.07)
+
+        registry.invalidate()
+        self.assertEqual(registry.get('gas_costs'), 0.08)
+
+    def test_timeout(self):
+        registry = ConfigurationRegistry(timeout=0)
+        registry.get('gas_costs')
+        registry.get('gas_costs')
+        self.assertEqual(Configuration.objects.all.call_count, 2)
+
+
+class LiveSnapshotTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.time = datetime(2014, 6, 1).replace(tzinfo=utc)
+        patcher = patch('server.functions.SensorLatestValue.objects')
+        patcher.start().values_list.return_value = [(1, 20.0, self.time), (2, 5.0, self.time)]
+        self.addCleanup(patcher.stop)
+
+    def test_update(self):
+        snapshot = LiveSnapshot()
+        version, values = snapshot.get()
+        self.assertEqual(values[1], (20.0, self.time))
+
+        later = self.time + timedelta(minutes=2)
+        snapshot.update({1: (21.0, later), 2: (4.0, self.time - timedelta(minutes=2))})
+        new_version, values = snapshot.get()
+        self.assertGreater(new_version, version)
+        self.assertEqual(values[1], (21.0, later))
+        # older values are ignored
+        self.assertEqual(values[2], (5.0, self.time))
+
+    def test_wait(self):
+        snapshot = LiveSnapshot()
+        version, values = snapshot.get()
+        self.assertEqual(snapshot.wait(version, 0.01), version)
+
+        snapshot.update({1: (21.0, self.time)})
+        self.assertEqual(snapshot.wait(version, 10), version + 1)
+
+
+class LatestSensorValuesTestCase(TestCase):
+
+    def setUp(self):
+        SensorLatestValue.objects.all().delete()
+        self.start = datetime(2014, 6, 1).replace(tzinfo=utc)
+
+    def get_latest(self):
+        return dict((sensor_id, (value, timestamp)) for sensor_id, value, timestamp in
+                    SensorLatestValue.objects.values_list('sensor_id', 'value', 'timestamp'))
+
+    def test_update_latest_sensor_values(self):
+        update_latest_sensor_values([(1, 1.0, self.start), (2, 2.0, self.start + timedelta(hours=1)),
+                                     (2, 3.0, self.start)])
+        self.assertEqual(self.get_latest(), {1: (1.0, self.start), 2: (2.0, self.start + timedelta(hours=1))})
+
+        # older values are ignored, newer and equally old values replace the latest value, new sensors are inserted
+        update_latest_sensor_values([(1, 4.0, self.start - timedelta(hours=1)), (2, 5.0, self.start + timedelta(hours=1)),
+                                     (3, 6.0, self.start)])
+        self.assertEqual(self.get_latest(), {1: (1.0, self.start), 2: (5.0, self.start + timedelta(hours=1)),
+                                             3: (6.0, self.start)})
+
+        update_latest_sensor_values([(1, 7, self.start + timedelta(hours=2))])
+        self.assertEqual(self.get_latest()[1], (7.0, self.start + timedelta(hours=2)))
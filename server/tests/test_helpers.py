@@ -0,0 +1,83 @@
+import json
+import struct
+import unittest
+from datetime import datetime, timedelta
+
+import numpy as np
+from django.test.client import RequestFactory
+from django.utils.timezone import utc
+
+from server.helpers import create_json_response, create_streaming_json_response, accepts_series, encode_series, to_equidistant_series, downsample_lttb, SERIES_CONTENT_TYPE
+
+
+def decode_series(content):
+    header_length, = struct.unpack('<I', content[:4])
+    header = json.loads(content[4:4 + header_length])
+    values = np.frombuffer(content[4 + header_length:], dtype='<f4')
+    return header, values
+
+
+class HelpersTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def test_json_response(self):
+        data = {'b': [1.5, 2.5], 'a': 1}
+        pretty = create_json_response(data, self.factory.get('/api/'))
+        compact = create_json_response(data, self.factory.get('/api/', {'format': 'compact'}))
+
+        self.assertEqual(json.loads(pretty.content), data)
+        self.assertEqual(json.loads(compact.content), data)
+        self.assertNotIn(' ', compact.content)
+        self.assertLess(len(compact.content), len(pretty.content))
+
+    def test_accepts_series(self):
+        self.assertFalse(accepts_series(self.factory.get('/api/')))
+        self.assertTrue(accepts_series(self.factory.get('/api/', {'format': 'binary'})))
+        self.assertTrue(accepts_series(self.factory.get('/api/', HTTP_ACCEPT=SERIES_CONTENT_TYPE)))
+
+    def test_encode_series(self):
+        series = [{'id': 1, 'start': 3600, 'step': 900, 'data': [1.0, 2.0]},
+                  {'id': 2, 'start': 7200, 'step': 900, 'data': np.array([3.0], dtype=np.float32)}]
+
+        header, values = decode_series(encode_series(series))
+
+        self.assertEqual(values.tolist(), [1.0, 2.0, 3.0])
+        self.assertEqual(header[0], {'id': 1, 'start': 3600, 'step': 900, 'offset': 0, 'length': 2})
+        self.assertEqual(header[1], {'id': 2, 'start': 7200, 'step': 900, 'offset': 2, 'length': 1})
+
+    def test_to_equidistant_series(self):
+        start = datetime(2014, 1, 1).replace(tzinfo=utc)
+        values = [(start, 1.0), (start + timedelta(hours=1), 2.0), (start + timedelta(hours=3), 4.0)]
+
+        timestamp, data = to_equidistant_series(values, 3600)
+
+        self.assertEqual(timestamp, 1388534400)
+        self.assertEqual(data[[0, 1, 3]].tolist(), [1.0, 2.0, 4.0])
+        self.assertTrue(np.isnan(data[2]))
+
+    def test_streaming_json_response(self):
+        data = [{'id': 1, 'data': [1.5]}, {'id': 2, 'data': []}]
+        response = create_streaming_json_response(iter(data), self.factory.get('/api/', {'format': 'compact'}))
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(json.loads(''.join(response.streaming_content)), data)
+        empty = create_streaming_json_response([], self.factory.get('/api/'))
+        self.assertEqual(json.loads(''.join(empty.streaming_content)), [])
+
+    def test_downsample_lttb(self):
+        start = datetime(2014, 1, 1).replace(tzinfo=utc)
+        values = [(start + timedelta(minutes=i), 0.0) for i in range(1000)]
+        values[500] = (values[500][0], 100.0)
+
+        output = downsample_lttb(values, 50)
+
+        self.assertEqual(len(output), 50)
+        self.assertEqual(output[0], values[0])
+        self.assertEqual(output[-1], values[-1])
+        # peaks are kept
+        self.assertIn(values[500], output)
+        self.assertEqual(output, sorted(output))
+        self.assertIs(downsample_lttb(values, None), values)
+        self.assertEqual(downsample_lttb(values[:10], 50), values[:10])
@@ -0,0 +1,99 @@
+import unittest
+from datetime import date, datetime
+
+from mock import patch, MagicMock
+from django.db.models import Sum
+from django.utils.timezone import utc
+
+from server.models import Device, Sensor
+from server.manager import functions
+from server.manager.functions import get_total_balances, get_monthly_aggregates, invalidate_monthly_caches
+
+
+class BalanceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        invalidate_monthly_caches()
+        prices = {'gas_costs': 0.1, 'electrical_costs': 0.3, 'thermal_revenues': 0.1,
+                  'warmwater_revenues': 0.1, 'electrical_revenues': 0.2, 'feed_in_reward': 0.1}
+        patcher = patch.object(functions, 'get_configuration', side_effect=lambda key: prices[key])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @patch.object(functions, 'SensorValueMonthlySum')
+    def test_total_balances(self, monthly_sum):
+        rows = [{'timestamp': date(2014, 1, 1), 'sensor__device__device_type': Device.CU,
+                 'sensor__key': 'current_gas_consumption', 'total': 100.0},
+                {'timestamp': date(2014, 1, 1), 'sensor__device__device_type': Device.PLB,
+                 'sensor__key': 'current_gas_consumption', 'total': 50.0},
+                {'timestamp': date(2014, 1, 1), 'sensor__device__device_type': Device.TC,
+                 'sensor__key': 'get_consumption_power', 'total': 200.0},
+                {'timestamp': date(2014, 2, 1), 'sensor__device__device_type': Device.EC,
+                 'sensor__key': 'get_consumption_power', 'total': 10.0}]
+        monthly_sum.objects.filter.return_value.values.return_value.annotate.return_value = rows
+
+        january, february = get_total_balances([(2014, 1), (2014, 2)])
+
+        self.assertEqual(january['kwh']['gas_consumption'], 150.0)
+        self.assertEqual(january['kwh']['thermal_consumption'], 200.0)
+        self.assertEqual(january['kwh']['electrical_consumption'], 0)
+        self.assertEqual(january['costs'], -15.0)
+        self.assertEqual(january['balance'], 5.0)
+        self.assertEqual(february['rewards'], 2.0)
+        self.assertEqual(monthly_sum.objects.filter.call_count, 1)
+
+        # cached until invalidated
+        get_total_balances([(2014, 1), (2014, 2)])
+        self.assertEqual(monthly_sum.objects.filter.call_count, 1)
+        invalidate_monthly_caches()
+        get_total_balances([(2014, 2)])
+        self.assertEqual(monthly_sum.objects.filter.call_count, 2)
+
+
+class MonthlyAggregatesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        invalidate_monthly_caches()
+        sensors = [Sensor(id=1), Sensor(id=2), Sensor(id=3)]
+        for target, value in [('get_devices_and_sensors', ([], sensors)),
+                              ('get_past_time', datetime(2014, 5, 1).replace(tzinfo=utc))]:
+            patcher = patch.object(functions, target, return_value=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def get_model(self, name):
+        model = MagicMock()
+        model.__name__ = name
+        model.objects.filter.return_value.values.return_value.annotate.return_value.order_by.return_value = [
+            {'sensor': 1, 'timestamp': date(2013, 1, 1), 'total': 1.0},
+            {'sensor': 1, 'timestamp': date(2013, 2, 1), 'total': 2.0},
+            {'sensor': 3, 'timestamp': date(2013, 1, 1), 'total': 3.0}]
+        return model
+
+    def test_one_query_for_all_sensors(self):
+        model = self.get_model('PastYearSums')
+        output = get_monthly_aggregates(model, 'sum', Sum, 2013)
+
+        self.assertEqual(output[1], [{'timestamp': date(2013, 1, 1), 'total': 1.0},
+                                     {'timestamp': date(2013, 2, 1), 'total': 2.0}])
+        self.assertEqual(output[2], [])
+        self.assertEqual(output[3], [{'timestamp': date(2013, 1, 1), 'total': 3.0}])
+        self.assertEqual(model.objects.filter.call_count, 1)
+
+    def test_cached_per_year(self):
+        past = self.get_model('CachedSums')
+        get_monthly_aggregates(past, 'sum', Sum, 2013)
+        get_monthly_aggregates(past, 'sum', Sum, 2013)
+        self.assertEqual(past.objects.filter.call_count, 1)
+        # rewritten aggregates of past years are picked up as well
+        invalidate_monthly_caches()
+        get_monthly_aggregates(past, 'sum', Sum, 2013)
+        self.assertEqual(past.objects.filter.call_count, 2)
+
+        current = self.get_model('CurrentSums')
+        get_monthly_aggregates(current, 'sum', Sum, 2014)
+        get_monthly_aggregates(current, 'sum', Sum, 2014)
+        self.assertEqual(current.objects.filter.call_count, 1)
+        invalidate_monthly_caches()
+        get_monthly_aggregates(current, 'sum', Sum, 2014)
+        self.assertEqual(current.objects.filter.call_count, 2)
@@ -0,0 +1,33 @@
+import json
+import calendar
+from datetime import datetime, timedelta
+
+from django.test import TestCase, Client
+from django.contrib.auth.models import User
+from django.utils.timezone import utc
+
+from server.models import SensorValueRollup
+
+
+class ManagerHooksTestCase(TestCase):
+
+    def setUp(self):
+        # the user is rolled back with the test
+        User.objects.create_user(
+            username="test_manager", password="testing")
+        self.client = Client()
+        self.client.login(username='test_manager', password='testing')
+
+    def test_sensor_series(self):
+        start = datetime(2014, 6, 1).replace(tzinfo=utc)
+        for hour in range(48):
+            SensorValueRollup(sensor_id=1, resolution=60 * 60, timestamp=start + timedelta(hours=hour),
+                              min=1.0, max=3.0, avg=2.0, sum=2.0, count=60).save()
+
+        end = start + timedelta(days=1)
+        response = self.client.get('/api/sensor/1/series/?start=%d&end=%d&points=24' % (
+            calendar.timegm(start.timetuple()), calendar.timegm(end.timetuple())))
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertEqual(data['resolution'], 60 * 60)
+        self.assertEqual(len(data['data']), 24)
@@ -0,0 +1,110 @@
+import unittest
+from datetime import datetime
+
+from django.test import TestCase
+from django.db import connection, transaction, IntegrityError
+from django.utils.timezone import utc
+
+from server.models import SensorValue, Threshold, Notification
+from server.partitions import get_partition_name, get_partition_range, get_partitions, ensure_partition, \
+    drop_partitions, initialize_partitions, known_partitions
+from server.forecasting.measurementstorage import write_sensor_values
+
+
+class PartitionsTestCase(unittest.TestCase):
+
+    def test_partition_name(self):
+        self.assertEqual(get_partition_name(datetime(2014, 3, 31, 23, 59)), 'server_sensorvalue_y2014m03')
+
+    def test_partition_range(self):
+        start, end = get_partition_range(datetime(2013, 12, 24, 18, 0).replace(tzinfo=utc))
+        self.assertEqual(start, datetime(2013, 12, 1).replace(tzinfo=utc))
+        self.assertEqual(end, datetime(2014, 1, 1).replace(tzinfo=utc))
+
+
+class PartitionsDatabaseTestCase(TestCase):
+
+    def setUp(self):
+        known_partitions.clear()
+        self.addCleanup(known_partitions.clear)
+
+    def get_values(self, table):
+        cursor = connection.cursor()
+        cursor.execute('SELECT id, sensor_id, value FROM ONLY %s ORDER BY id' % table)
+        return cursor.fetchall()
+
+    def test_ensure_partition(self):
+        timestamp = datetime(1990, 5, 10, 12, 0).replace(tzinfo=utc)
+        name = ensure_partition(timestamp)
+        self.assertEqual(name, 'server_sensorvalue_y1990m05')
+        self.assertIn(name, get_partitions())
+        self.assertEqual(ensure_partition(timestamp), name)
+
+        # bulk inserts into a new month go to its partition, queries on the parent table include them
+        write_sensor_values([(1, 1.5, timestamp), (2, 2.5, datetime(1990, 6, 1).replace(tzinfo=utc))])
+        self.assertEqual([row[1:] for row in self.get_values(name)], [(1, 1.5)])
+        self.assertEqual([row[1:] for row in self.get_values('server_sensorvalue_y1990m06')], [(2, 2.5)])
+        self.assertEqual(SensorValue.objects.filter(timestamp__year=1990).count(), 2)
+        cursor = connection.cursor()
+        cursor.execute('SELECT count(*) FROM ONLY server_sensorvalue WHERE timestamp < %s',
+                       [datetime(1991, 1, 1).replace(tzinfo=utc)])
+        self.assertEqual(cursor.fetchone()[0], 0)
+
+    def test_partition_dropped_by_other_process(self):
+        timestamp = datetime(1990, 5, 10).replace(tzinfo=utc)
+        name = ensure_partition(timestamp)
+        connection.cursor().execute('DROP TABLE %s' % name)
+
+        write_sensor_values([(1, 1.5, timestamp)])
+        self.assertIn(name, get_partitions())
+        self.assertEqual([row[1:] for row in self.get_values(name)], [(1, 1.5)])
+
+    def test_check_constraint(self):
+        name = ensure_partition(datetime(1990, 5, 10).replace(tzinfo=utc))
+        cursor = connection.cursor()
+        insert = 'INSERT INTO %s (sensor_id, value, timestamp) VALUES (1, 1, %%s)' % name
+
+        cursor.execute(insert, [datetime(1990, 5, 1).replace(tzinfo=utc)])
+        cursor.execute(insert, [datetime(1990, 5, 31, 23, 59, 59).replace(tzinfo=utc)])
+        for timestamp in [datetime(1990, 4, 30, 23, 59, 59), datetime(1990, 6, 1)]:
+            with self.assertRaises(IntegrityError):
+                with transaction.atomic():
+                    cursor.execute(insert, [timestamp.replace(tzinfo=utc)])
+        self.assertEqual(len(self.get_values(name)), 2)
+
+    def test_drop_partitions(self):
+        months = [datetime(1990, month, 15).replace(tzinfo=utc) for month in [1, 2, 3]]
+        write_sensor_values([(1, float(index), timestamp) for index, timestamp in enumerate(months)])
+        names = [get_partition_name(timestamp) for timestamp in months]
+        threshold = Threshold.objects.create(sensor_id=1, name='test')
+        for name in names:
+            Notification.objects.create(threshold=threshold, sensor_value_id=self.get_values(name)[0][0], target=0)
+
+        self.assertEqual(drop_partitions(datetime(1990, 3, 1).replace(tzinfo=utc)), names[:2])
+        partitions = get_partitions()
+        self.assertNotIn(names[0], partitions)
+        self.assertNotIn(names[1], partitions)
+        self.assertIn(names[2], partitions)
+        self.assertEqual(list(Notification.objects.values_list('sensor_value_id', flat=True)),
+                         [self.get_values(names[2])[0][0]])
+        self.assertEqual(drop_partitions(datetime(1990, 3, 1).replace(tzinfo=utc)), [])
+
+    def test_initialize_partitions(self):
+        # already run by syncdb
+        initialize_partitions()
+        initialize_partitions()
+
+        cursor = connection.cursor()
+        cursor.execute('''SELECT count(*) FROM pg_constraint
+            WHERE contype = 'f' AND conrelid = 'server_notification'::regclass
+                AND confrelid = 'server_sensorvalue'::regclass''')
+        self.assertEqual(cursor.fetchone()[0], 0)
+
+        # notifications are checked by a trigger instead
+        write_sensor_values([(1, 1.0, datetime(1990, 1, 15).replace(tzinfo=utc))])
+        sensor_value_id = self.get_values('server_sensorvalue_y1990m01')[0][0]
+        threshold = Threshold.objects.create(sensor_id=1, name='test')
+        Notification.objects.create(threshold=threshold, sensor_value_id=sensor_value_id, target=0)
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                Notification.objects.create(threshold=threshold, sensor_value_id=sensor_value_id + 1000, target=0)
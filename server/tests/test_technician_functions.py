@@ -0,0 +1,100 @@
+import unittest
+from datetime import datetime
+
+import numpy as np
+from mock import patch
+from django.utils.timezone import utc
+
+from server.models import Device, Sensor
+from server.technician import functions
+from server.technician.functions import count_power_ons, get_statistics, get_variant_configurations, \
+    MAX_FORECAST_VARIANTS
+
+
+def power_ons_loop(values):
+    # the former implementation
+    power_ons = 0
+    last_time_on = None
+    for value in values:
+        if last_time_on is None:
+            last_time_on = value > 0
+        if (last_time_on and value == 0) or (not last_time_on and value > 0):
+            power_ons += 1
+            last_time_on = not last_time_on
+    return power_ons
+
+
+def epoch(day):
+    return float((datetime(2014, 1, day).replace(tzinfo=utc) - datetime(1970, 1, 1).replace(tzinfo=utc)).total_seconds())
+
+
+class StatisticsTestCase(unittest.TestCase):
+
+    def test_count_power_ons(self):
+        for values in [[], [0], [50, 0, 0, 30, 0], [0, 10, -1, 0, 20], [-1, 20, 0], [0, 0, 0]]:
+            self.assertEqual(count_power_ons(np.array(values, dtype=np.float64)), power_ons_loop(values))
+
+    def test_periods(self):
+        cu = Device(id=1, name='Cogeneration Unit', device_type=Device.CU)
+        pm = Device(id=2, name='Power Meter', device_type=Device.PM)
+        sensors = [Sensor(id=1, device=cu, key='workload'),
+                   Sensor(id=2, device=cu, key='current_gas_consumption'),
+                   Sensor(id=3, device=pm, key='purchased'),
+                   Sensor(id=4, device=pm, key='fed_in_electricity')]
+        days = np.array([epoch(1), epoch(2), epoch(3), epoch(4)])
+        series = {
+            'value': {1: (days, np.array([0.0, 50.0, 0.0, 60.0]))},
+            'avg': {1: (days[[0, 2]], np.array([40.0, 30.0]))},
+            'sum': {2: (days[[0, 2]], np.array([100.0, 200.0])), 3: (days, np.array([1.0, 2.0, 3.0, 4.0]))},
+        }
+
+        with patch.object(functions, 'get_devices_and_sensors', return_value=([cu, pm], sensors)), \
+                patch.object(functions, 'fetch_series', side_effect=lambda model, field, *args: series[field]), \
+                patch.object(functions, 'get_device_configuration', return_value=0.5), \
+                patch.object(functions, 'get_configuration', return_value=0.1):
+            output = get_statistics([(datetime(2014, 1, 1).replace(tzinfo=utc), datetime(2014, 1, 2).replace(tzinfo=utc)),
+                                     (datetime(2014, 1, 1).replace(tzinfo=utc), datetime(2014, 1, 4).replace(tzinfo=utc))])
+
+        first, second = output
+        self.assertEqual(first[0]['hours_of_operation'], 24)
+        self.assertEqual(first[0]['power_ons'], 1)
+        self.assertEqual(first[0]['average_workload'], 40.0)
+        self.assertEqual(first[0]['total_gas_consumption'], 100.0)
+        self.assertEqual(first[0]['total_electrical_production'], 50.0)
+        self.assertEqual(first[1]['total_purchased'], 3.0)
+        self.assertEqual(first[1]['total_fed_in_electricity'], 0.0)
+
+        self.assertEqual(second[0]['values_count'], 4)
+        self.assertEqual(second[0]['power_ons'], 3)
+        self.assertEqual(second[0]['average_workload'], 30.0)
+        self.assertEqual(second[0]['operating_costs'], 20.0)
+        self.assertEqual(second[1]['total_purchased'], 10.0)
+
+
+class VariantConfigurationsTestCase(unittest.TestCase):
+
+    @patch.object(functions, 'get_modified_configurations', side_effect=lambda changes: changes)
+    def test_variants(self, get_modified_configurations):
+        change = {'device': '1', 'key': 'capacity', 'type': '1', 'value': '100'}
+        self.assertEqual(get_variant_configurations([[change], []]), [[change], []])
+
+        for variants in [[], {}, 'variants', [[change]] * (MAX_FORECAST_VARIANTS + 1), [change], [[{'device': '1'}]]]:
+            self.assertRaises(ValueError, get_variant_configurations, variants)
+
+
+@patch('server.technician.functions.live_snapshot')
+@patch('server.technician.functions.get_live_data')
+class StreamLiveDataTestCase(unittest.TestCase):
+
+    def test_events(self, get_live_data, live_snapshot):
+        get_live_data.side_effect = [{'version': 1}, {'version': 2}]
+        live_snapshot.wait.side_effect = [1, 2, 2]
+
+        with patch('server.technician.functions.time.time', side_effect=[0, 1, 2, 7, 11]):
+            events = list(functions.stream_live_data(timeout=5, duration=10))
+
+        self.assertEqual(events, ['data: {"version":1}\n\n', ': keep-alive\n\n', 'data: {"version":2}\n\n',
+                                  ': keep-alive\n\n'])
+        # the last wait is shortened to the end of the stream
+        self.assertEqual([call[0] for call in live_snapshot.wait.call_args_list], [(1, 5), (1, 5), (2, 3)])
+
@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+
+from mock import patch
+from django.test import TestCase
+from django.db import connection
+from django.db.models import Max
+from django.utils.timezone import utc
+
+from server.models import Configuration, Sensor, SensorValue
+from server.functions import configuration_registry
+from server.worker.functions import refresh_views, HIGH_WATER_MARK
+
+AGGREGATE_TABLES = {
+    'server_sensorvaluedaily': 'sensor_id, timestamp, value, sum, count',
+    'server_sensorvaluemonthlysum': 'sensor_id, timestamp, sum',
+    'server_sensorvaluemonthlyavg': 'sensor_id, timestamp, avg',
+    'server_sensorvaluerollup': 'sensor_id, resolution, timestamp, min, max, avg, sum, count',
+}
+
+
+class RefreshViewsTestCase(TestCase):
+
+    def setUp(self):
+        Sensor.objects.filter(id__in=[1, 2]).update(aggregate_sum=True, aggregate_avg=True)
+        self.start = datetime(2014, 1, 30, 12, 0).replace(tzinfo=utc)
+        # the ids of the test values follow the stored values
+        self.first_id = (SensorValue.objects.aggregate(Max('id'))['id__max'] or 0) + 1
+
+    def store_values(self, offsets, hours):
+        for offset, hour in zip(offsets, hours):
+            SensorValue(id=self.first_id + offset, sensor_id=1 + offset % 2, value=offset % 7,
+                        timestamp=self.start + timedelta(hours=hour)).save()
+
+    def get_aggregates(self):
+        cursor = connection.cursor()
+        aggregates = {}
+        for table, columns in AGGREGATE_TABLES.items():
+            cursor.execute('SELECT %s FROM %s ORDER BY %s' % (columns, table, columns))
+            aggregates[table] = [tuple(round(value, 6) if isinstance(value, float) else value for value in row)
+                                 for row in cursor.fetchall()]
+        return aggregates
+
+    def recompute(self):
+        cursor = connection.cursor()
+        for table in AGGREGATE_TABLES:
+            cursor.execute('DELETE FROM %s' % table)
+        Configuration.objects.filter(key=HIGH_WATER_MARK).update(value='0')
+        refresh_views()
+        return self.get_aggregates()
+
+    def test_incremental_refresh(self):
+        # start from aggregates, which match the stored values
+        self.recompute()
+
+        # two days in january, a gap in the ids for a late value
+        self.store_values(range(0, 40), range(0, 40))
+        self.store_values(range(50, 60), range(40, 50))
+        refresh_views()
+
+        # new values in february and late values with lower ids on a day without new values,
+        # two days before the latest values
+        self.store_values(range(60, 70), range(100, 110))
+        self.store_values([45, 46], [65, 70])
+        refresh_views()
+
+        incremental = self.get_aggregates()
+        self.assertTrue(len(incremental['server_sensorvaluedaily']) > 0)
+        self.assertTrue(len(incremental['server_sensorvaluemonthlysum']) > 0)
+        self.assertTrue(len(incremental['server_sensorvaluerollup']) > 0)
+        self.assertEqual(incremental, self.recompute())
+
+    def test_high_water_mark(self):
+        self.recompute()
+        self.store_values(range(0, 10), range(0, 10))
+        with patch.object(configuration_registry, 'invalidate') as invalidate:
+            refresh_views()
+        # the mark is internal, storing it doesn't reload the configurations
+        self.assertFalse(invalidate.called)
+        self.assertEqual(Configuration.objects.get(key=HIGH_WATER_MARK).value, str(self.first_id + 9))
+
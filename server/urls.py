@@ -42,6 +42,7 @@ urlpatterns = patterns('',
     (r'^api/history/$', manager.hooks.get_sensorvalue_history_list),
     (r'^api/loads/$', manager.hooks.get_daily_loads),
     (r'^api/sensor/((?P<sensor_id>\d+)/)?$', manager.hooks.get_detailed_sensor_values),
+    (r'^api/sensor/(?P<sensor_id>\d+)/series/$', manager.hooks.sensor_series),
     (r'^api/sums/(sensor/(?P<sensor_id>[0-9]+)/)?(year/(?P<year>[0-9]+)/)?$', manager.hooks.get_sums),
 
     url(r'^admin/', include(admin.site.urls)),
@@ -27,10 +27,12 @@ class Worker(Thread):
             if not execute_user_function(self.user_function, self.env, self.devices, get_forecast):
                 logger.warning('user_function failed')
 
-            # every 10 minutes
-            if step % 10 == 0:
-                # functions.refresh_views()
-                pass
+            # every 5 minutes, only new values are aggregated
+            if step % 5 == 0:
+                try:
+                    functions.refresh_views()
+                except Exception as e:
+                    logger.warning('refresh_views failed: %s' % e)
 
             # make sure step is within a day
             step = (step + 1) % (60 * 60 * 24)
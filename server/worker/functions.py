@@ -1,9 +1,12 @@
 import logging
 import time
 
-from django.db import connection
+from django.db import connection, transaction
 
-from server.models import SensorValue, Threshold, Notification
+from server.models import Configuration, SensorValue, Threshold, Notification
+from server.functions import get_latest_sensor_value, ROLLUP_RESOLUTIONS
+from server.settings import ROLLUP_REFRESH_DAYS
+from server.manager.functions import invalidate_monthly_caches
 import functions
 
 logger = logging.getLogger('ecocontrol')
@@ -12,13 +15,15 @@ logger = logging.getLogger('ecocontrol')
 def check_thresholds():
     for threshold in Threshold.objects.all():
         try:
-            latest_sensorvalue = SensorValue.objects.filter(
-                sensor=threshold.sensor).latest('timestamp')
+            latest_value = get_latest_sensor_value(threshold.sensor_id)
 
-            min_threshold_triggered = threshold.min_value is not None and latest_sensorvalue.value < threshold.min_value
-            max_threshold_triggered = threshold.max_value is not None and latest_sensorvalue.value > threshold.max_value
+            min_threshold_triggered = threshold.min_value is not None and latest_value.value < threshold.min_value
+            max_threshold_triggered = threshold.max_value is not None and latest_value.value > threshold.max_value
 
             if min_threshold_triggered or max_threshold_triggered:
+                    # notifications reference the stored value itself
+                    latest_sensorvalue = SensorValue.objects.filter(
+                        sensor_id=threshold.sensor_id, timestamp=latest_value.timestamp).latest('id')
                     try:
                         Notification.objects.get(
                             sensor_value=latest_sensorvalue)
@@ -34,14 +39,95 @@ def check_thresholds():
                          threshold.sensor_id)
 
 
+HIGH_WATER_MARK = 'rollup_high_water_mark'
+"""Key of the internal |Configuration|, which stores the id of the newest aggregated |SensorValue|"""
+
+
 def refresh_views():
+    """ Update the daily and monthly aggregates of sensor values and the |SensorValueRollup|'s.
+
+    Only days and months with values newer than the stored high water mark are aggregated again,
+    so the cost depends on the amount of new values instead of the whole history.
+    The ids don't follow the commit order, a value committed after the last refresh can have a lower id
+    than the mark. So the last `ROLLUP_REFRESH_DAYS` days up to the latest value of every sensor
+    are always aggregated again, too.
+    """
     logger.debug('Trigger views refresh')
 
-    cursor = connection.cursor()
-    cursor.execute('''REFRESH MATERIALIZED VIEW server_sensorvaluedaily;''')
-    cursor.execute(
-        '''REFRESH MATERIALIZED VIEW server_sensorvaluemonthlysum;''')
-    cursor.execute(
-        '''REFRESH MATERIALIZED VIEW server_sensorvaluemonthlyavg;''')
+    with transaction.atomic():
+        mark, created = Configuration.objects.select_for_update().get_or_create(
+            key=HIGH_WATER_MARK, defaults={'value': '0', 'value_type': Configuration.INT, 'internal': True})
+
+        cursor = connection.cursor()
+        cursor.execute('SELECT max(id) FROM server_sensorvalue')
+        new_mark = cursor.fetchone()[0] or 0
+
+        cursor.execute('DROP TABLE IF EXISTS rollup_days, rollup_months')
+        # days are local times in UTC
+        cursor.execute('''CREATE TEMPORARY TABLE rollup_days AS
+            SELECT DISTINCT sensor_id, date_trunc('day', timestamp AT TIME ZONE 'UTC') AS day
+                FROM server_sensorvalue WHERE id > %s AND id <= %s
+            UNION
+            SELECT sensor_id, generate_series(date_trunc('day', timestamp AT TIME ZONE 'UTC') - %s * INTERVAL '1 day',
+                                              date_trunc('day', timestamp AT TIME ZONE 'UTC'), INTERVAL '1 day') AS day
+                FROM server_sensorlatestvalue''', [int(mark.value), new_mark, ROLLUP_REFRESH_DAYS])
+        cursor.execute('''CREATE TEMPORARY TABLE rollup_months AS
+            SELECT DISTINCT sensor_id, date_trunc('month', day)::date AS month FROM rollup_days''')
+
+        cursor.execute('''DELETE FROM server_sensorvaluedaily USING rollup_days
+            WHERE server_sensorvaluedaily.sensor_id = rollup_days.sensor_id
+                AND server_sensorvaluedaily.timestamp = rollup_days.day AT TIME ZONE 'UTC' ''')
+        cursor.execute('''INSERT INTO server_sensorvaluedaily (sensor_id, timestamp, value, sum, count)
+            SELECT rollup_days.sensor_id, rollup_days.day AT TIME ZONE 'UTC', avg(value), sum(value), count(*)
+                FROM rollup_days INNER JOIN server_sensorvalue ON server_sensorvalue.sensor_id = rollup_days.sensor_id
+                    AND server_sensorvalue.timestamp >= rollup_days.day AT TIME ZONE 'UTC'
+                    AND server_sensorvalue.timestamp < (rollup_days.day + INTERVAL '1 day') AT TIME ZONE 'UTC'
+                GROUP BY rollup_days.sensor_id, rollup_days.day''')
+
+        # every resolution is aggregated from the next finer one, buckets never span two days
+        cursor.execute('''DELETE FROM server_sensorvaluerollup USING rollup_days
+            WHERE server_sensorvaluerollup.sensor_id = rollup_days.sensor_id
+                AND server_sensorvaluerollup.timestamp >= rollup_days.day AT TIME ZONE 'UTC'
+                AND server_sensorvaluerollup.timestamp < (rollup_days.day + INTERVAL '1 day') AT TIME ZONE 'UTC' ''')
+        cursor.execute('''INSERT INTO server_sensorvaluerollup (sensor_id, resolution, timestamp, min, max, avg, sum, count)
+            SELECT rollup_days.sensor_id, %s, to_timestamp(floor(extract(epoch FROM timestamp) / %s) * %s),
+                    min(value), max(value), avg(value), sum(value), count(*)
+                FROM rollup_days INNER JOIN server_sensorvalue ON server_sensorvalue.sensor_id = rollup_days.sensor_id
+                    AND server_sensorvalue.timestamp >= rollup_days.day AT TIME ZONE 'UTC'
+                    AND server_sensorvalue.timestamp < (rollup_days.day + INTERVAL '1 day') AT TIME ZONE 'UTC'
+                GROUP BY rollup_days.sensor_id, 3''', [ROLLUP_RESOLUTIONS[0]] * 3)
+        for finer, resolution in zip(ROLLUP_RESOLUTIONS, ROLLUP_RESOLUTIONS[1:]):
+            cursor.execute('''INSERT INTO server_sensorvaluerollup (sensor_id, resolution, timestamp, min, max, avg, sum, count)
+                SELECT rollup_days.sensor_id, %s, to_timestamp(floor(extract(epoch FROM timestamp) / %s) * %s),
+                        min(min), max(max), sum(sum) / sum(count), sum(sum), sum(count)
+                    FROM rollup_days INNER JOIN server_sensorvaluerollup ON server_sensorvaluerollup.sensor_id = rollup_days.sensor_id
+                        AND server_sensorvaluerollup.resolution = %s
+                        AND server_sensorvaluerollup.timestamp >= rollup_days.day AT TIME ZONE 'UTC'
+                        AND server_sensorvaluerollup.timestamp < (rollup_days.day + INTERVAL '1 day') AT TIME ZONE 'UTC'
+                    GROUP BY rollup_days.sensor_id, 3''', [resolution] * 3 + [finer])
+
+        # months are aggregated from the days
+        for table, column, aggregate, flag in [
+                ('server_sensorvaluemonthlysum', 'sum', 'sum(server_sensorvaluedaily.sum)', 'aggregate_sum'),
+                ('server_sensorvaluemonthlyavg', 'avg',
+                 'sum(server_sensorvaluedaily.sum) / sum(server_sensorvaluedaily.count)', 'aggregate_avg')]:
+            cursor.execute('''DELETE FROM %s USING rollup_months
+                WHERE %s.sensor_id = rollup_months.sensor_id AND %s.timestamp = rollup_months.month''' % (table, table, table))
+            cursor.execute('''INSERT INTO %s (sensor_id, timestamp, %s)
+                SELECT rollup_months.sensor_id, rollup_months.month, %s
+                    FROM rollup_months
+                    INNER JOIN server_sensor ON server_sensor.id = rollup_months.sensor_id AND server_sensor.%s = TRUE
+                    INNER JOIN server_sensorvaluedaily ON server_sensorvaluedaily.sensor_id = rollup_months.sensor_id
+                        AND server_sensorvaluedaily.timestamp >= rollup_months.month::timestamp AT TIME ZONE 'UTC'
+                        AND server_sensorvaluedaily.timestamp < (rollup_months.month + INTERVAL '1 month') AT TIME ZONE 'UTC'
+                    GROUP BY rollup_months.sensor_id, rollup_months.month''' % (table, column, aggregate, flag))
+
+        cursor.execute('DROP TABLE rollup_days, rollup_months')
+
+        # an update doesn't send post_save, which would invalidate the configuration registry
+        Configuration.objects.filter(key=HIGH_WATER_MARK).update(value=str(new_mark))
+
+    # the monthly sums changed
+    invalidate_monthly_caches()
 
     logger.debug('Successfully refreshed views')